@@ -22,6 +22,12 @@ except ImportError:
     PlaylistUpdater = None
     logging.warning("PlaylistUpdater not available - playlist updating disabled")
 
+try:
+    from core import metadata_cache
+except ImportError:
+    metadata_cache = None
+    logging.warning("metadata_cache module not available - ffprobe results will not be cached")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -179,7 +185,7 @@ class FileRelocater:
     
     def get_file_metadata(self, filepath: Path) -> Dict[str, str]:
         """
-        Extract metadata using FFprobe
+        Extract metadata using FFprobe (cached in the shared metadata cache)
         
         Args:
             filepath: Audio file path
@@ -188,19 +194,13 @@ class FileRelocater:
             Metadata dictionary
         """
         try:
-            cmd = [
-                'ffprobe', '-v', 'quiet', 
-                '-print_format', 'json', 
-                '-show_format', str(filepath)
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            file_info = json.loads(result.stdout)
+            if metadata_cache is not None:
+                tags = metadata_cache.get_or_load(str(filepath), 'ffprobe', self._probe_tags)
+            else:
+                tags = self._probe_tags(str(filepath))
             
             metadata = {}
-            if 'format' in file_info and 'tags' in file_info['format']:
-                tags = file_info['format']['tags']
-                
+            if tags:
                 # Map pre-defined fields
                 for field_name, tag_variants in METADATA_TAG_MAPPINGS.items():
                     for tag_key in tag_variants:
@@ -226,6 +226,26 @@ class FileRelocater:
             self.metadata_error_count += 1
             return {}
     
+    def _probe_tags(self, filepath: str) -> Dict[str, str]:
+        """
+        Read the raw format tags of a file with FFprobe
+        
+        Args:
+            filepath: Audio file path
+            
+        Returns:
+            Dictionary of tags as reported by FFprobe
+        """
+        cmd = [
+            'ffprobe', '-v', 'quiet', 
+            '-print_format', 'json', 
+            '-show_format', filepath
+        ]
+        
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        file_info = json.loads(result.stdout)
+        return file_info.get('format', {}).get('tags', {})
+    
     def generate_folder_path(self, filepath: Path) -> Optional[Path]:
         """
         Generate folder path from metadata
@@ -14,6 +14,7 @@ from typing import List, Dict, Optional, Tuple
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from addons.convert import AudioConverter
 from addons.resize_album_art import resize_album_art
+from core import m3u
 
 # Define supported formats (from AudioConverter.FORMATS)
 SUPPORTED_OUTPUT_FORMATS = {
@@ -106,25 +107,9 @@ class PlaylistCloner:
             List[str]: List of absolute file paths
         """
         paths = []
-        playlist_dir = os.path.dirname(os.path.abspath(self.playlist_path))
         
         try:
-            with open(self.playlist_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            for line in lines:
-                line = line.strip()
-                
-                # Skip empty lines and comments
-                if not line or line.startswith('#'):
-                    continue
-                
-                # Convert relative paths to absolute
-                if not os.path.isabs(line):
-                    file_path = os.path.abspath(os.path.join(playlist_dir, line))
-                else:
-                    file_path = line
-                
+            for file_path in m3u.iter_m3u_paths(self.playlist_path):
                 # Check if file exists
                 if os.path.isfile(file_path):
                     paths.append(file_path)
@@ -9,6 +9,10 @@ import logging
 from pathlib import Path
 from typing import List, Tuple
 
+# Add parent directory to path for module imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from core import m3u
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -63,29 +67,8 @@ class PlaylistDeleter:
         Returns:
             List[str]: List of absolute file paths
         """
-        paths = []
-        playlist_dir = os.path.dirname(os.path.abspath(self.playlist_path))
-        
         try:
-            with open(self.playlist_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            for line in lines:
-                line = line.strip()
-                
-                # Skip empty lines and comments
-                if not line or line.startswith('#'):
-                    continue
-                
-                # Convert relative paths to absolute
-                if not os.path.isabs(line):
-                    file_path = os.path.abspath(os.path.join(playlist_dir, line))
-                else:
-                    file_path = line
-                
-                paths.append(file_path)
-            
-            return paths
+            return list(m3u.iter_m3u_paths(self.playlist_path))
         except Exception as e:
             logger.error(f"Error loading playlist: {str(e)}")
             return []
@@ -8,63 +8,9 @@ import shutil
 import argparse
 from pathlib import Path
 
-
-def parse_m3u_playlist(playlist_path):
-    """
-    Parse an M3U playlist file and extract all entries.
-    
-    Args:
-        playlist_path (str): Path to the M3U playlist file.
-        
-    Returns:
-        tuple: (metadata_lines, file_paths) where metadata_lines is a list of
-               tuples (line_number, content) for metadata lines, and file_paths
-               is a list of tuples (line_number, path) for file paths.
-    """
-    metadata_lines = []
-    file_paths = []
-    
-    try:
-        with open(playlist_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            
-            # Empty lines
-            if not stripped:
-                metadata_lines.append((i, line))
-                continue
-            
-            # Metadata/comment lines
-            if stripped.startswith('#'):
-                metadata_lines.append((i, line))
-            else:
-                # This is a file path
-                file_paths.append((i, stripped))
-                
-        return metadata_lines, file_paths
-        
-    except Exception as e:
-        print(f"Error parsing playlist '{playlist_path}': {e}")
-        return [], []
-
-
-def convert_path_to_absolute(relative_path, playlist_dir):
-    """
-    Convert a relative path to an absolute path based on playlist directory.
-    
-    Args:
-        relative_path (str): The relative path from the playlist file.
-        playlist_dir (str): Directory containing the playlist file.
-        
-    Returns:
-        str: Absolute path to the audio file.
-    """
-    if os.path.isabs(relative_path):
-        return relative_path
-    
-    return os.path.abspath(os.path.join(playlist_dir, relative_path))
+# Add parent directory to path for module imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from core import m3u
 
 
 def convert_absolute_to_relative(absolute_path, new_playlist_dir):
@@ -98,48 +44,46 @@ def update_playlist_paths(playlist_path, source_dir, dest_dir, dry_run=False):
     Returns:
         list: Updated lines for the playlist file.
     """
-    metadata_lines, file_paths = parse_m3u_playlist(playlist_path)
-    
-    if not file_paths:
-        print(f"  Warning: No file paths found in '{os.path.basename(playlist_path)}'")
-        return None
-    
-    # Reconstruct the playlist
-    all_lines = {}
-    
-    # Add metadata lines
-    for line_num, content in metadata_lines:
-        all_lines[line_num] = content
-    
-    # Process file paths
-    source_playlist_dir = os.path.dirname(playlist_path)
+    # Reconstruct the playlist, keeping metadata/comment lines as they are
+    updated_lines = []
+    path_count = 0
     updated_count = 0
     error_count = 0
     
-    for line_num, relative_path in file_paths:
-        # Convert to absolute path first
-        absolute_path = convert_path_to_absolute(relative_path, source_playlist_dir)
-        
-        # Check if file exists
-        if not os.path.exists(absolute_path):
-            print(f"  Warning: File not found: {absolute_path}")
-            error_count += 1
-            # Keep the original path even if file doesn't exist
-            all_lines[line_num] = relative_path + '\n'
-        else:
-            # Convert to relative path from new location
-            new_relative_path = convert_absolute_to_relative(absolute_path, dest_dir)
-            
-            # Use forward slashes for cross-platform compatibility
-            new_relative_path = new_relative_path.replace('\\', '/')
+    try:
+        for line, entry in m3u.iter_m3u_lines(playlist_path):
+            if entry is None:
+                updated_lines.append(line)
+                continue
             
-            all_lines[line_num] = new_relative_path + '\n'
+            path_count += 1
+            relative_path = entry.line
+            absolute_path = entry.path
             
-            if not dry_run and new_relative_path != relative_path:
-                updated_count += 1
+            # Check if file exists
+            if not os.path.exists(absolute_path):
+                print(f"  Warning: File not found: {absolute_path}")
+                error_count += 1
+                # Keep the original path even if file doesn't exist
+                updated_lines.append(relative_path + '\n')
+            else:
+                # Convert to relative path from new location
+                new_relative_path = convert_absolute_to_relative(absolute_path, dest_dir)
+                
+                # Use forward slashes for cross-platform compatibility
+                new_relative_path = new_relative_path.replace('\\', '/')
+                
+                updated_lines.append(new_relative_path + '\n')
+                
+                if not dry_run and new_relative_path != relative_path:
+                    updated_count += 1
+    except Exception as e:
+        print(f"Error parsing playlist '{playlist_path}': {e}")
+        path_count = 0
     
-    # Sort by line number and reconstruct file
-    sorted_lines = [all_lines[i] for i in sorted(all_lines.keys())]
+    if not path_count:
+        print(f"  Warning: No file paths found in '{os.path.basename(playlist_path)}'")
+        return None
     
     if not dry_run:
         if updated_count > 0:
@@ -147,7 +91,7 @@ def update_playlist_paths(playlist_path, source_dir, dest_dir, dry_run=False):
         if error_count > 0:
             print(f"  Found {error_count} missing file(s)")
     
-    return sorted_lines
+    return updated_lines
 
 
 def move_playlist(playlist_path, source_dir, dest_dir, dry_run=False, overwrite=False, delete_original=False):
@@ -7,7 +7,7 @@ import sys
 import argparse
 import logging
 from pathlib import Path
-from typing import List, Set, Dict, Tuple
+from typing import Iterator, List, Set, Dict, Tuple
 
 # Configure logging
 logging.basicConfig(
@@ -31,6 +31,13 @@ except ImportError:
         PLAYLIST_MODULE_AVAILABLE = False
         logger.warning("Playlist module not available, playlists will be created in basic format")
 
+# Shared streaming M3U parser (no external dependencies)
+try:
+    from ..core import m3u
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from core import m3u
+
 
 class PlaylistOverlapFinder:
     """
@@ -41,59 +48,20 @@ class PlaylistOverlapFinder:
         """Initialize the PlaylistOverlapFinder."""
         pass
     
-    def _load_m3u_paths(self, playlist_path: str) -> List[str]:
+    def _load_m3u_paths(self, playlist_path: str) -> Iterator[str]:
         """
-        Load file paths from an M3U playlist (without metadata extraction).
+        Stream file paths from an M3U playlist (without metadata extraction).
         
         Args:
             playlist_path (str): Path to the M3U playlist file
             
-        Returns:
-            list: List of file paths from the playlist
+        Yields:
+            str: Absolute, normalized path of each track in the playlist
         """
-        paths = []
-        playlist_dir = os.path.dirname(os.path.abspath(playlist_path))
-        
         try:
-            with open(playlist_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    
-                    # Skip empty lines and comment lines (but not EXTINF)
-                    if not line or (line.startswith('#') and not line.startswith('#EXTINF')):
-                        continue
-                    
-                    # Skip EXTINF lines (metadata)
-                    if line.startswith('#EXTINF'):
-                        continue
-                    
-                    # This is a file path
-                    file_path = line
-                    
-                    # Convert relative paths to absolute
-                    if not os.path.isabs(file_path):
-                        file_path = os.path.normpath(os.path.join(playlist_dir, file_path))
-                    
-                    paths.append(file_path)
-            
-            logger.debug(f"Loaded {len(paths)} paths from {os.path.basename(playlist_path)}")
-            return paths
-            
+            yield from m3u.iter_m3u_paths(playlist_path)
         except Exception as e:
             logger.error(f"Error loading playlist {playlist_path}: {str(e)}")
-            return []
-    
-    def _normalize_path(self, path: str) -> str:
-        """
-        Normalize a file path for comparison.
-        
-        Args:
-            path (str): File path to normalize
-            
-        Returns:
-            str: Normalized absolute path
-        """
-        return os.path.normpath(os.path.abspath(path))
     
     def find_overlap(self, playlist_paths: List[str]) -> Set[str]:
         """
@@ -116,8 +84,8 @@ class PlaylistOverlapFinder:
                 logger.error(f"Playlist not found: {playlist_path}")
                 return set()
             
-            paths = self._load_m3u_paths(playlist_path)
-            normalized_paths = set(self._normalize_path(p) for p in paths)
+            # Paths come out of the parser already normalized
+            normalized_paths = set(self._load_m3u_paths(playlist_path))
             all_paths.append(normalized_paths)
             
             logger.info(f"Loaded {len(normalized_paths)} songs from {os.path.basename(playlist_path)}")
@@ -151,8 +119,8 @@ class PlaylistOverlapFinder:
                 logger.error(f"Playlist not found: {playlist_path}")
                 return set()
             
-            paths = self._load_m3u_paths(playlist_path)
-            normalized_paths = set(self._normalize_path(p) for p in paths)
+            # Paths come out of the parser already normalized
+            normalized_paths = set(self._load_m3u_paths(playlist_path))
             all_paths.append(normalized_paths)
             
             logger.info(f"Loaded {len(normalized_paths)} songs from {os.path.basename(playlist_path)}")
@@ -186,8 +154,8 @@ class PlaylistOverlapFinder:
                 logger.error(f"Playlist not found: {playlist_path}")
                 return set()
             
-            paths = self._load_m3u_paths(playlist_path)
-            normalized_paths = set(self._normalize_path(p) for p in paths)
+            # Paths come out of the parser already normalized
+            normalized_paths = set(self._load_m3u_paths(playlist_path))
             all_paths.append(normalized_paths)
             
             logger.info(f"Loaded {len(normalized_paths)} songs from {os.path.basename(playlist_path)}")
@@ -230,8 +198,8 @@ class PlaylistOverlapFinder:
                 logger.error(f"Playlist not found: {playlist_path}")
                 return set()
             
-            paths = self._load_m3u_paths(playlist_path)
-            normalized_paths = set(self._normalize_path(p) for p in paths)
+            # Paths come out of the parser already normalized
+            normalized_paths = set(self._load_m3u_paths(playlist_path))
             included_songs = included_songs.union(normalized_paths)
             
             logger.info(f"Loaded {len(normalized_paths)} songs from {os.path.basename(playlist_path)} (include)")
@@ -249,8 +217,8 @@ class PlaylistOverlapFinder:
                 logger.error(f"Playlist not found: {playlist_path}")
                 return set()
             
-            paths = self._load_m3u_paths(playlist_path)
-            normalized_paths = set(self._normalize_path(p) for p in paths)
+            # Paths come out of the parser already normalized
+            normalized_paths = set(self._load_m3u_paths(playlist_path))
             excluded_songs = excluded_songs.union(normalized_paths)
             
             logger.info(f"Loaded {len(normalized_paths)} songs from {os.path.basename(playlist_path)} (exclude)")
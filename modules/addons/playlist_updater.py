@@ -4,10 +4,15 @@ updates file paths in playlists when the new path is known (unlike fixer which t
 """
 import logging
 import os
+import sys
 from pathlib import Path
 from typing import Dict, List, Optional, Set
 import difflib
 
+# Add parent directory to path for module imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from core import m3u
+
 logger = logging.getLogger('PlaylistUpdater')
 
 # Pre-compiled audio extensions for efficiency
@@ -46,32 +51,19 @@ class PlaylistUpdater:
             playlist_path: Path to the M3U playlist file
             
         Returns:
-            List of dicts with 'url' and optional 'extinf'
+            List of dicts with 'url' (as written), 'path' (resolved absolute path)
+            and optional 'extinf'
         """
         tracks = []
         try:
-            with open(playlist_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            current_extinf = None
-            for line in lines:
-                line = line.strip()
-                
-                # Skip empty lines and non-EXTINF comments
-                if not line or (line.startswith('#') and not line.startswith('#EXTINF')):
-                    continue
+            for entry in m3u.iter_m3u_entries(str(playlist_path)):
+                track = {'url': entry.line, 'path': entry.path}
                 
                 # Store EXTINF line to write back later
-                if line.startswith('#EXTINF:'):
-                    current_extinf = line
-                else:
-                    # This is a file path
-                    track = {'url': line}
-                    if current_extinf:
-                        track['extinf'] = current_extinf
-                    
-                    tracks.append(track)
-                    current_extinf = None
+                if entry.extinf:
+                    track['extinf'] = entry.extinf
+                
+                tracks.append(track)
             
             return tracks
         except Exception as e:
@@ -197,11 +189,8 @@ class PlaylistUpdater:
                 for idx, track in enumerate(playlist_data, 1):
                     track_url = track.get('url', '')
                     
-                    # Convert relative paths to absolute based on playlist location
-                    if not os.path.isabs(track_url):
-                        old_url = os.path.normpath((playlist_path.parent / track_url).resolve())
-                    else:
-                        old_url = os.path.normpath(Path(track_url).resolve())
+                    # Absolute path with symlinks resolved, like the path mapping keys
+                    old_url = os.path.realpath(track['path'])
                     
                     # Debug: Show first few tracks being checked
                     if idx <= 3:
@@ -336,11 +325,7 @@ def auto_detect_renamed_files(music_dir: str, playlist_paths: List[str],
         tracks = updater._load_m3u_paths_only(playlist_path)
         
         for track in tracks:
-            track_url = track.get('url', '')
-            if not os.path.isabs(track_url):
-                abs_path = os.path.normpath((playlist_path.parent / track_url).resolve())
-            else:
-                abs_path = os.path.normpath(Path(track_url).resolve())
+            abs_path = os.path.realpath(track['path'])
             
             # Only add entries that don't exist (likely renamed)
             if not Path(abs_path).exists():
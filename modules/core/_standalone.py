@@ -0,0 +1,24 @@
+"""
+sys.path setup for core modules run directly as scripts
+"""
+import os
+import sys
+
+# Directory of the core modules
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def setup_path():
+    """
+    Make the core package importable for a core module run as a script.
+
+    Running a file in modules/core directly puts that directory first on
+    sys.path, where core/queue.py shadows the standard library queue module
+    (used by asyncio, concurrent.futures and the connection pools). This
+    swaps it for modules/, so `from core import ...` works instead. Call it
+    before importing anything that needs the standard library queue.
+    """
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or '.') != CORE_DIR]
+    modules_dir = os.path.dirname(CORE_DIR)
+    if modules_dir not in sys.path:
+        sys.path.insert(0, modules_dir)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+check which queued audio files are reachable in the background, a directory or mount at a time
+"""
+import os
+import sys
+import time
+import errno
+import argparse
+import threading
+from typing import Dict, Iterable, Optional
+
+# Run as a script, core/queue.py would shadow the standard library queue module
+if not __package__:
+    import _standalone
+    _standalone.setup_path()
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds a check result stays valid before the directory is looked at again
+DEFAULT_TTL = 30.0
+
+# Worker threads doing filesystem checks
+DEFAULT_WORKERS = 4
+
+# Songs ahead of the current one that queues have checked in the background
+PREFETCH_AHEAD = 32
+
+# Seconds playback waits for the check of the song it is about to load
+PLAYBACK_WAIT = 2.0
+
+# Errors meaning the path simply isn't there
+NOT_FOUND_ERRNOS = frozenset({errno.ENOENT, errno.ENOTDIR})
+
+# Errors meaning the filesystem itself is gone (unplugged drive, dead NFS server)
+MOUNT_FAILURE_ERRNOS = frozenset(
+    getattr(errno, name) for name in ('EIO', 'ESTALE', 'ETIMEDOUT', 'ENOTCONN', 'EHOSTDOWN', 'ENODEV')
+    if hasattr(errno, name)
+)
+
+
+def mount_point(path: str) -> Optional[str]:
+    """
+    Find the mount point a path lives on, even when its filesystem is failing.
+
+    os.path.ismount() reports False for a mount whose filesystem can't be
+    stat'ed (stale NFS handle, pulled USB drive), so instead the walk stops
+    at the first ancestor that is on a different device than its parent,
+    or that can't be stat'ed while its parent can.
+
+    Args:
+        path: Absolute path (doesn't need to exist).
+
+    Returns:
+        str: The closest ancestor of path that is a mount point, or None if
+        nothing up to / could be stat'ed.
+    """
+    path = os.path.abspath(path)
+    try:
+        device = os.lstat(path).st_dev
+    except OSError:
+        device = None
+
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path:
+            return path if device is not None else None
+        try:
+            parent_device = os.lstat(parent).st_dev
+        except OSError:
+            # The parent is missing or on the failing filesystem as well
+            path, device = parent, None
+            continue
+        if device is None or parent_device != device:
+            return path
+        path = parent
+
+
+class _DirectoryState:
+    """Result of listing one directory."""
+
+    __slots__ = ('checked_at', 'names', 'extra')
+
+    def __init__(self, checked_at, names):
+        """
+        Initialize _DirectoryState.
+
+        Args:
+            checked_at: time.monotonic() of the listing.
+            names: frozenset of the directory's entries, or None if it couldn't be read.
+        """
+        self.checked_at = checked_at
+        self.names = names  # frozenset of entries, or None if unreadable
+        self.extra = {}  # name -> bool for names only found by os.path.exists
+
+
+class AvailabilityIndex:
+    """
+    Cache of which audio files exist, filled by a worker thread pool.
+
+    Files are checked a directory at a time: one listing answers every
+    queued song in that directory. When a directory can't be read, the
+    topmost missing ancestor (or the whole mount, for I/O errors like a
+    stale NFS handle) is marked unavailable, so every other song below it
+    is answered without touching the filesystem again. Results expire
+    after ttl seconds.
+
+    Lookups never do I/O themselves; unknown paths are scheduled and
+    reported as unknown (None) until a worker has checked them.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_workers: int = DEFAULT_WORKERS):
+        """
+        Initialize AvailabilityIndex.
+
+        Args:
+            ttl: Seconds before a result is checked again.
+            max_workers: Number of worker threads.
+        """
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._condition = threading.Condition()
+        self._directories: Dict[str, _DirectoryState] = {}
+        self._unavailable_roots: Dict[str, float] = {}
+        self._pending = {}  # directory -> set of names waiting for a check
+        self._executor = None
+        self._futures = set()  # Submitted checks that haven't finished
+
+    def _fresh(self, checked_at: float, now: float) -> bool:
+        """Check whether a result taken at checked_at is still valid."""
+        return now - checked_at < self.ttl
+
+    def _unavailable_root(self, directory: str, now: float) -> Optional[str]:
+        """Get the known unavailable root containing directory, if any."""
+        for root, checked_at in self._unavailable_roots.items():
+            if self._fresh(checked_at, now) and (directory == root or directory.startswith(root.rstrip(os.sep) + os.sep)):
+                return root
+        return None
+
+    def _lookup(self, directory: str, name: str, now: float) -> Optional[bool]:
+        """Answer from the cache without I/O; the condition must be held."""
+        if self._unavailable_root(directory, now) is not None:
+            return False
+
+        state = self._directories.get(directory)
+        if state is None or not self._fresh(state.checked_at, now):
+            return None
+        if state.names is None:
+            return False
+        if name in state.names:
+            return True
+        return state.extra.get(name)
+
+    def _schedule(self, directory: str, names: Iterable[str]):
+        """Queue a check of names in directory; the condition must be held."""
+        pending = self._pending.get(directory)
+        if pending is not None:
+            pending.update(names)
+            return
+
+        self._pending[directory] = set(names)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='walrio-availability')
+        future = self._executor.submit(self._check_directory, directory)
+        self._futures.add(future)
+        future.add_done_callback(self._forget_future)
+
+    def _forget_future(self, future):
+        """Stop tracking a finished or cancelled check."""
+        with self._condition:
+            self._futures.discard(future)
+
+    def _check_directory(self, directory: str):
+        """Worker: list a directory and record which pending names exist."""
+        with self._condition:
+            if self._unavailable_root(directory, time.monotonic()) is not None:
+                # Another worker already found the root gone
+                self._pending.pop(directory, None)
+                self._condition.notify_all()
+                return
+
+        unavailable_root = None
+        try:
+            names = frozenset(os.listdir(directory))
+        except OSError as e:
+            names = None
+            unavailable_root = self._find_unavailable_root(directory, e)
+
+        # Names not in the listing may still exist (case-insensitive
+        # filesystems, unicode normalization), so confirm those one by one
+        extra = {}
+        if names is not None:
+            with self._condition:
+                wanted = set(self._pending.get(directory, ()))
+            for name in wanted - names:
+                extra[name] = os.path.exists(os.path.join(directory, name))
+
+        with self._condition:
+            now = time.monotonic()
+            state = _DirectoryState(now, names)
+            state.extra = extra
+            self._directories[directory] = state
+            if unavailable_root is not None:
+                self._unavailable_roots[unavailable_root] = now
+
+            # Names requested while this check ran get a fresh check
+            leftover = self._pending.pop(directory, set())
+            if names is None:
+                leftover = set()
+            else:
+                leftover -= names | extra.keys()
+            if leftover:
+                self._schedule(directory, leftover)
+            self._condition.notify_all()
+
+    def _find_unavailable_root(self, directory: str, error: OSError) -> str:
+        """
+        Find the topmost path that explains why directory can't be read.
+
+        Args:
+            directory: Directory whose listing failed.
+            error: The error raised by the listing.
+
+        Returns:
+            str: The root to mark unavailable.
+        """
+        if error.errno in MOUNT_FAILURE_ERRNOS:
+            # The filesystem itself is failing, so give up on the whole mount
+            return mount_point(directory) or directory
+        if error.errno not in NOT_FOUND_ERRNOS:
+            return directory
+
+        # Walk up to the highest ancestor that's missing
+        root = directory
+        parent = os.path.dirname(root)
+        while parent != root and not os.path.isdir(parent):
+            root = parent
+            parent = os.path.dirname(root)
+        return root
+
+    def prefetch(self, paths: Iterable[str]):
+        """
+        Schedule checks for paths that aren't known yet.
+
+        Args:
+            paths: File paths expected to be needed soon.
+        """
+        groups = {}
+        with self._condition:
+            now = time.monotonic()
+            for path in paths:
+                directory, name = os.path.split(os.path.abspath(path))
+                if self._lookup(directory, name, now) is None:
+                    groups.setdefault(directory, set()).add(name)
+            for directory, names in groups.items():
+                self._schedule(directory, names)
+
+    def is_available(self, path: str, timeout: float = 0) -> Optional[bool]:
+        """
+        Check whether a file is reachable.
+
+        Args:
+            path: Path of the file.
+            timeout: Seconds to wait for a worker if the answer isn't cached (0 = don't wait).
+
+        Returns:
+            True or False once known, None if still unknown after timeout.
+        """
+        directory, name = os.path.split(os.path.abspath(path))
+        with self._condition:
+            result = self._lookup(directory, name, time.monotonic())
+            if result is not None:
+                return result
+
+            self._schedule(directory, [name])
+            if timeout > 0:
+                self._condition.wait_for(
+                    lambda: self._lookup(directory, name, time.monotonic()) is not None, timeout)
+                result = self._lookup(directory, name, time.monotonic())
+            return result
+
+    def is_missing(self, path: str) -> bool:
+        """
+        Check whether a file is known to be unreachable, without waiting.
+
+        Args:
+            path: Path of the file.
+
+        Returns:
+            bool: True only if a worker found the file missing.
+        """
+        return self.is_available(path) is False
+
+    def invalidate(self):
+        """Forget all results, e.g. after a drive was plugged back in."""
+        with self._condition:
+            self._directories.clear()
+            self._unavailable_roots.clear()
+
+    def shutdown(self):
+        """Stop the worker threads without waiting for running checks."""
+        with self._condition:
+            executor, self._executor = self._executor, None
+            futures, self._futures = self._futures, set()
+            # Checks that never start must not block new requests for their directory
+            self._pending.clear()
+            self._condition.notify_all()
+        if executor is not None:
+            # Executor.shutdown(cancel_futures=True) needs Python 3.9
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+def main():
+    """
+    Main function for command-line usage.
+
+    Returns:
+        int: Exit code (0 if every file is available, 1 otherwise)
+    """
+    parser = argparse.ArgumentParser(
+        description='Report which files referenced by playlists or paths are unreachable',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # List missing tracks of a playlist
+  python availability.py playlist.m3u
+
+  # Check files directly, giving slow mounts up to 10 seconds
+  python availability.py --timeout 10 /mnt/nas/music/*.flac
+        """
+    )
+    parser.add_argument('inputs', nargs='+', help='M3U playlists or audio file paths')
+    parser.add_argument('--timeout', type=float, default=5.0,
+                        help='Seconds to wait for each unanswered check (default: 5)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of worker threads (default: {DEFAULT_WORKERS})')
+
+    args = parser.parse_args()
+
+    # Handle imports for both package and standalone execution
+    try:
+        from . import m3u
+    except ImportError:
+        from core import m3u
+
+    paths = []
+    for item in args.inputs:
+        if item.lower().endswith(('.m3u', '.m3u8')):
+            try:
+                paths.extend(m3u.iter_m3u_paths(item))
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Error reading playlist '{item}': {e}", file=sys.stderr)
+                return 1
+        else:
+            paths.append(os.path.abspath(item))
+
+    index = AvailabilityIndex(max_workers=args.workers)
+    index.prefetch(paths)
+
+    status = 0
+    for path in paths:
+        available = index.is_available(path, timeout=args.timeout)
+        if available is None:
+            print(f"timeout\t{path}")
+            status = 1
+        elif not available:
+            print(f"missing\t{path}")
+            status = 1
+
+    index.shutdown()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,25 +8,197 @@ import sqlite3
 import argparse
 import hashlib
 import time
+import random
+import re
+from array import array
+from collections import deque
 from pathlib import Path
 
 # Handle imports for both package and standalone execution
 try:
-    from . import metadata
+    from . import metadata, library_db
     from .playlist import load_m3u_playlist
 except ImportError:
     # Add parent directory to path for standalone execution
-    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from core import metadata
+    import _standalone
+    _standalone.setup_path()
+    from core import metadata, library_db
     try:
         from core.playlist import load_m3u_playlist
     except ImportError:
         print("Warning: playlist.py not found. Playlist loading functionality will be disabled.")
         load_m3u_playlist = None
 
+# Needs the standard library queue module, so import after the path setup
+from concurrent.futures import ProcessPoolExecutor
+
 # Supported audio file extensions
 AUDIO_EXTENSIONS = {'.mp3', '.flac', '.ogg', '.wav', '.m4a', '.aac', '.wma', '.opus', '.ape', '.mpc'}
 
+# Weights available for weighted random sampling; the +1 keeps unrated and
+# never played songs in the running
+SAMPLE_WEIGHTS = {
+    'rating': 'MAX(rating, 0) + 1',
+    'playcount': 'MAX(playcount, 0) + 1',
+}
+
+# Random ids probed in the first sampling round, per song wanted
+SAMPLE_OVERDRAW = 4
+
+# Probing rounds, and random ids per round, before sampling reads every matching id instead
+SAMPLE_MAX_ROUNDS = 8
+SAMPLE_MAX_PROBES = 20000
+
+# Song columns written by scans and playlist imports (user data excluded)
+SONG_VALUE_COLUMNS = (
+    'title', 'album', 'artist', 'albumartist', 'track', 'disc', 'year', 'originalyear',
+    'genre', 'composer', 'performer', 'grouping',
+    'url', 'directory_id', 'basefilename', 'filetype', 'filesize', 'mtime', 'ctime',
+    'length', 'bitrate', 'samplerate', 'bitdepth',
+    'compilation', 'art_embedded', 'lastseen',
+)
+
+# song_details columns written by scans and playlist imports
+SONG_DETAIL_VALUE_COLUMNS = ('comment', 'lyrics', 'fingerprint', 'song_id', 'artist_id', 'album_id')
+
+# Columns kept in song_details instead of songs (schema version 1 moved them)
+SONG_DETAIL_COLUMNS = SONG_DETAIL_VALUE_COLUMNS + (
+    'art_automatic', 'art_manual',
+    'musicbrainz_album_artist_id', 'musicbrainz_artist_id', 'musicbrainz_original_artist_id',
+    'musicbrainz_album_id', 'musicbrainz_original_album_id', 'musicbrainz_recording_id',
+    'musicbrainz_track_id', 'musicbrainz_disc_id', 'musicbrainz_release_group_id',
+    'musicbrainz_work_id', 'cue_path',
+)
+
+# Rows written per executemany() call during scans
+INGEST_BATCH_SIZE = 500
+
+# Page cache used while scanning, in KiB
+INGEST_CACHE_KIB = 65536
+
+# Seconds between commits during scans, so other writers (playback stats,
+# smart playlists) get the write lock between batches instead of waiting
+# for the whole scan
+INGEST_COMMIT_INTERVAL = 0.5
+
+# Text columns in the full-text search index
+FTS_COLUMNS = ('title', 'artist', 'album', 'albumartist', 'genre')
+
+# Columns searched by default (what the library search used to LIKE across)
+SEARCH_COLUMNS = ('title', 'artist', 'album', 'albumartist')
+
+# Words of a search, as the unicode61 tokenizer splits them
+SEARCH_TOKEN_RE = re.compile(r'\w+')
+
+# Highest bit of a song change mask; columns past it share this bit
+CHANGE_MASK_BITS = 62
+
+# Rows read per query when streaming songs (see iter_songs())
+QUERY_PAGE_SIZE = 1000
+
+# Browse tables by the songs column they aggregate
+BROWSE_TABLES = {'artist': 'browse_artists', 'album': 'browse_albums', 'genre': 'browse_genres'}
+
+# Version of the library schema, kept in PRAGMA user_version; create_database()
+# upgrades older libraries with SCHEMA_MIGRATIONS
+SCHEMA_VERSION = 2
+
+# Bytes hashed from each of the start, middle and end of a file for its
+# content fingerprint (see get_file_hash())
+FINGERPRINT_SAMPLE_SIZE = 65536
+
+# Main songs table heavily based on Strawberry Music Player schema. Only the
+# columns browsing, playback and scans read are kept here, so table scans
+# stay small; bulky or rarely read ones live in song_details.
+SONGS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        -- Basic metadata
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        album TEXT,
+        artist TEXT,
+        albumartist TEXT,
+        track INTEGER,
+        disc INTEGER,
+        year INTEGER,
+        originalyear INTEGER,
+        genre TEXT,
+        composer TEXT,
+        performer TEXT,
+        grouping TEXT,
+        
+        -- File information
+        url TEXT UNIQUE,
+        directory_id INTEGER,
+        basefilename TEXT,
+        filetype TEXT,
+        filesize INTEGER,
+        mtime INTEGER,
+        ctime INTEGER,
+        unavailable INTEGER DEFAULT 0,
+        
+        -- Audio properties
+        length INTEGER,  -- duration in seconds
+        bitrate INTEGER,
+        samplerate INTEGER,
+        bitdepth INTEGER,
+        
+        -- User data
+        playcount INTEGER DEFAULT 0,
+        skipcount INTEGER DEFAULT 0,
+        lastplayed INTEGER DEFAULT 0,
+        lastseen INTEGER,
+        rating REAL DEFAULT 0.0,
+        
+        -- Compilation handling
+        compilation INTEGER DEFAULT 0,
+        compilation_detected INTEGER DEFAULT 0,
+        compilation_on INTEGER DEFAULT 0,
+        compilation_off INTEGER DEFAULT 0,
+        
+        -- Album art
+        art_embedded INTEGER DEFAULT 0,
+        art_unset INTEGER DEFAULT 0,
+        
+        -- Other
+        source INTEGER DEFAULT 1  -- 1 = LocalFile, 2 = Collection
+    )
+'''
+
+# One row per song, sharing its id, for the columns moved out of songs
+SONG_DETAILS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS song_details (
+        id INTEGER PRIMARY KEY,
+        comment TEXT,
+        lyrics TEXT,
+        
+        -- Identifiers
+        fingerprint TEXT,
+        song_id TEXT,
+        artist_id TEXT,
+        album_id TEXT,
+        
+        -- Album art
+        art_automatic TEXT,
+        art_manual TEXT,
+        
+        -- MusicBrainz IDs
+        musicbrainz_album_artist_id TEXT,
+        musicbrainz_artist_id TEXT,
+        musicbrainz_original_artist_id TEXT,
+        musicbrainz_album_id TEXT,
+        musicbrainz_original_album_id TEXT,
+        musicbrainz_recording_id TEXT,
+        musicbrainz_track_id TEXT,
+        musicbrainz_disc_id TEXT,
+        musicbrainz_release_group_id TEXT,
+        musicbrainz_work_id TEXT,
+        
+        -- Other
+        cue_path TEXT
+    )
+'''
+
 def create_database(db_path):
     """
     Create a new SQLite database with tables for music library.
@@ -41,87 +213,13 @@ def create_database(db_path):
         bool: True if database created successfully, False otherwise.
     """
     # Create the SQLite database with music library schema
-    conn = sqlite3.connect(db_path)
+    conn = library_db.connect(db_path)
     cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'songs'")
+    existing = cursor.fetchone() is not None
     
-    # Create main songs table heavily based on Strawberry Music Player schema
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS songs (
-            -- Basic metadata
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            album TEXT,
-            artist TEXT,
-            albumartist TEXT,
-            track INTEGER,
-            disc INTEGER,
-            year INTEGER,
-            originalyear INTEGER,
-            genre TEXT,
-            composer TEXT,
-            performer TEXT,
-            grouping TEXT,
-            comment TEXT,
-            lyrics TEXT,
-            
-            -- File information
-            url TEXT UNIQUE,
-            directory_id INTEGER,
-            basefilename TEXT,
-            filetype TEXT,
-            filesize INTEGER,
-            mtime INTEGER,
-            ctime INTEGER,
-            unavailable INTEGER DEFAULT 0,
-            
-            -- Audio properties
-            length INTEGER,  -- duration in seconds
-            bitrate INTEGER,
-            samplerate INTEGER,
-            bitdepth INTEGER,
-            
-            -- User data
-            playcount INTEGER DEFAULT 0,
-            skipcount INTEGER DEFAULT 0,
-            lastplayed INTEGER DEFAULT 0,
-            lastseen INTEGER,
-            rating REAL DEFAULT 0.0,
-            
-            -- Compilation handling
-            compilation INTEGER DEFAULT 0,
-            compilation_detected INTEGER DEFAULT 0,
-            compilation_on INTEGER DEFAULT 0,
-            compilation_off INTEGER DEFAULT 0,
-            
-            -- Album art
-            art_embedded INTEGER DEFAULT 0,
-            art_automatic TEXT,
-            art_manual TEXT,
-            art_unset INTEGER DEFAULT 0,
-            
-            -- Identifiers
-            artist_id TEXT,
-            album_id TEXT,
-            song_id TEXT,
-            fingerprint TEXT,
-            
-            -- MusicBrainz IDs
-            musicbrainz_album_artist_id TEXT,
-            musicbrainz_artist_id TEXT,
-            musicbrainz_original_artist_id TEXT,
-            musicbrainz_album_id TEXT,
-            musicbrainz_original_album_id TEXT,
-            musicbrainz_recording_id TEXT,
-            musicbrainz_track_id TEXT,
-            musicbrainz_disc_id TEXT,
-            musicbrainz_release_group_id TEXT,
-            musicbrainz_work_id TEXT,
-            
-            -- Other
-            source INTEGER DEFAULT 1,  -- 1 = LocalFile, 2 = Collection
-            cue_path TEXT
-        )
-    ''')
+    cursor.execute(SONGS_TABLE_SQL.format(table='songs'))
+    cursor.execute(SONG_DETAILS_TABLE_SQL)
     
     # Create directories table
     cursor.execute('''
@@ -137,25 +235,955 @@ def create_database(db_path):
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_songs_artist ON songs(artist)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_songs_album ON songs(album)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_songs_title ON songs(title)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_songs_url ON songs(url)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_songs_directory_id ON songs(directory_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_song_details_fingerprint ON song_details(fingerprint)')
     
     conn.commit()
+    if existing:
+        migrate_schema(conn)
+    else:
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS song_details_delete AFTER DELETE ON songs BEGIN
+            DELETE FROM song_details WHERE id = old.id;
+        END
+    ''')
+    conn.commit()
+    ensure_search_index(conn)
+    ensure_browse_tables(conn)
+    ensure_change_tracking(conn)
     return conn
 
-def get_file_hash(filepath):
+def _migrate_song_details(conn):
+    """
+    Schema version 1: move SONG_DETAIL_COLUMNS out of songs into song_details.
+    
+    songs is rebuilt without them in a single pass (dropping the columns
+    one by one would rewrite the table once per column), keeping its ids,
+    indexes and triggers; the change tracking triggers, which list every
+    column, are rebuilt by ensure_change_tracking(). The idx_songs_url
+    index is dropped as well, since the UNIQUE constraint on url already
+    indexes it.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+    """
+    cursor = conn.cursor()
+    columns = get_song_columns(conn)
+    moved = [column for column in SONG_DETAIL_COLUMNS if column in columns]
+    cursor.execute('DROP INDEX IF EXISTS idx_songs_url')
+    if not moved:
+        return
+    
+    cursor.execute('DROP TABLE IF EXISTS songs_migrated')
+    conn.commit()
+    cursor.execute('BEGIN')
+    cursor.execute(f"INSERT OR REPLACE INTO song_details (id, {', '.join(moved)}) SELECT id, {', '.join(moved)} FROM songs")
+    
+    # Indexes and triggers to recreate on the new table, leaving out the
+    # ones reading moved columns
+    moved_re = re.compile(r'\b(' + '|'.join(moved) + r')\b')
+    cursor.execute('''
+        SELECT name, sql FROM sqlite_master
+        WHERE tbl_name = 'songs' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    ''')
+    recreated = [sql for name, sql in cursor.fetchall()
+                 if not name.startswith('songs_changes_') and not moved_re.search(sql)]
+    
+    cursor.execute(SONGS_TABLE_SQL.format(table='songs_migrated'))
+    kept = [row[1] for row in cursor.execute('PRAGMA table_info(songs_migrated)') if row[1] in columns]
+    cursor.execute(f"INSERT INTO songs_migrated ({', '.join(kept)}) SELECT {', '.join(kept)} FROM songs")
+    cursor.execute('DROP TABLE songs')
+    cursor.execute('ALTER TABLE songs_migrated RENAME TO songs')
+    for sql in recreated:
+        cursor.execute(sql)
+
+def _migrate_content_fingerprints(conn):
+    """
+    Schema version 2: forget the path-based fingerprints of older versions.
+    
+    They hashed the file's path, so they could never match a moved file.
+    Scans fill in content fingerprints (see get_file_hash()) for songs
+    without one as they visit them.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+    """
+    conn.execute('UPDATE song_details SET fingerprint = NULL, song_id = NULL')
+
+# Upgrades from each schema version to the next, in order (see migrate_schema())
+SCHEMA_MIGRATIONS = (_migrate_song_details, _migrate_content_fingerprints)
+
+def migrate_schema(conn):
+    """
+    Upgrade a library created by an older version to SCHEMA_VERSION.
+    
+    Each migration still due (PRAGMA user_version below its version) runs
+    and is committed together with the new version, so an interrupted
+    upgrade resumes where it stopped.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        
+    Returns:
+        int: Schema version of the library.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target, migration in enumerate(SCHEMA_MIGRATIONS, start=1):
+        if version >= target:
+            continue
+        print(f"Upgrading library schema to version {target}...")
+        migration(conn)
+        conn.execute(f'PRAGMA user_version = {target}')
+        conn.commit()
+        version = target
+    return version
+
+def get_song_details(conn, song_id):
+    """
+    Get the song_details columns of a song (lyrics, comment, identifiers, ...).
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        song_id (int): ID of the song.
+        
+    Returns:
+        dict: SONG_DETAIL_COLUMNS values, or None if the song has none.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(f"SELECT {', '.join(SONG_DETAIL_COLUMNS)} FROM song_details WHERE id = ?", (song_id,))
+    row = cursor.fetchone()
+    return dict(zip(SONG_DETAIL_COLUMNS, row)) if row else None
+
+def ensure_search_index(conn):
+    """
+    Create the full-text search index of the songs table if it's missing.
+    
+    songs_fts is an external-content FTS5 table over FTS_COLUMNS, so the
+    text is stored once in songs and the index only holds tokens. Triggers
+    keep it in sync with every insert, delete and text change, whoever
+    writes the row; playcount and rating updates don't touch it. An index
+    added to an existing library is built from the songs already there.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        
+    Returns:
+        bool: True if the index is usable, False if this SQLite lacks FTS5
+              or the database is read-only and has no index yet.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'songs_fts'")
+    if cursor.fetchone():
+        return True
+    
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+    changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in FTS_COLUMNS)
+    try:
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE songs_fts USING fts5(
+                {columns},
+                content='songs', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS songs_fts_insert AFTER INSERT ON songs BEGIN
+                INSERT INTO songs_fts (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS songs_fts_delete AFTER DELETE ON songs BEGIN
+                INSERT INTO songs_fts (songs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS songs_fts_update AFTER UPDATE OF {columns} ON songs
+            WHEN {changed} BEGIN
+                INSERT INTO songs_fts (songs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO songs_fts (rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        cursor.execute("INSERT INTO songs_fts (songs_fts) VALUES ('rebuild')")
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Warning: full-text search unavailable, falling back to slow searches: {e}")
+        return False
+
+def get_song_columns(conn):
+    """
+    Get the column names of the songs table, in table order.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+    
+    Returns:
+        list: Column names.
+    """
+    return [row[1] for row in conn.execute('PRAGMA table_info(songs)')]
+
+def change_mask(conn, columns=None):
+    """
+    Get the bit mask standing for changes to some songs columns.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        columns (iterable): Column names, or None for any column.
+    
+    Returns:
+        int: Mask to test song_changes.mask against.
+    """
+    if columns is None:
+        return -1
+    song_columns = get_song_columns(conn)
+    mask = 0
+    for column in columns:
+        if column in song_columns:
+            mask |= 1 << min(song_columns.index(column), CHANGE_MASK_BITS)
+    return mask
+
+def ensure_change_tracking(conn):
+    """
+    Set up the log of which songs changed, for caches built from the library.
+    
+    library_version holds a counter that triggers on songs bump on every
+    insert, delete and real change of a row. song_changes keeps one row
+    per changed song: the version of its latest change and a mask of the
+    columns changed (one bit per column, see change_mask()), so it never
+    grows past the size of the library. A cache remembers the version it
+    was built at and asks changed_song_ids() what changed since.
+    
+    The triggers are rebuilt when columns are added to songs.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+    """
+    columns = get_song_columns(conn)
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS library_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0,
+            tracked_columns INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS song_changes (
+            song_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            mask INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_song_changes_seq ON song_changes(seq)')
+    cursor.execute('INSERT OR IGNORE INTO library_version (id) VALUES (1)')
+    cursor.execute('SELECT tracked_columns FROM library_version')
+    if cursor.fetchone()[0] == len(columns):
+        conn.commit()
+        return
+    
+    mask = ' | '.join(
+        f'((old.{column} IS NOT new.{column}) << {min(i, CHANGE_MASK_BITS)})' for i, column in enumerate(columns)
+    )
+    bump = 'UPDATE library_version SET version = version + 1;'
+    log = ('INSERT INTO song_changes (song_id, seq, mask) VALUES ({id}, (SELECT version FROM library_version), {mask}) '
+           'ON CONFLICT(song_id) DO UPDATE SET seq = excluded.seq, mask = song_changes.mask | excluded.mask;')
+    for name in ('songs_changes_insert', 'songs_changes_update', 'songs_changes_delete'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    cursor.execute(f'CREATE TRIGGER songs_changes_insert AFTER INSERT ON songs BEGIN {bump} {log.format(id="new.id", mask=-1)} END')
+    cursor.execute(f'CREATE TRIGGER songs_changes_delete AFTER DELETE ON songs BEGIN {bump} {log.format(id="old.id", mask=-1)} END')
+    cursor.execute(f'''
+        CREATE TRIGGER songs_changes_update AFTER UPDATE ON songs WHEN ({mask}) != 0 BEGIN
+            {bump} {log.format(id="new.id", mask=f"({mask})")}
+        END
+    ''')
+    
+    # Changes to columns untracked until now went unseen, so every cache is stale;
+    # song id 0 marks the reset for changed_song_ids()
+    cursor.execute('UPDATE library_version SET version = version + 1, tracked_columns = ?', (len(columns),))
+    cursor.execute('DELETE FROM song_changes')
+    cursor.execute('INSERT INTO song_changes (song_id, seq, mask) VALUES (0, (SELECT version FROM library_version), -1)')
+    conn.commit()
+
+def get_library_version(conn):
+    """
+    Get the current library version (see ensure_change_tracking()).
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+    
+    Returns:
+        int: Version, bumped by every change to songs.
+    """
+    return conn.execute('SELECT version FROM library_version').fetchone()[0]
+
+def changed_song_ids(conn, since, columns=None, limit=None):
+    """
+    Find songs changed after a library version.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        since (int): Library version a cache was built at.
+        columns (iterable): Only report changes to these columns (None for any).
+        limit (int): Stop after this many ids.
+    
+    Returns:
+        list or None: Ids of songs inserted, deleted or changed since then;
+                      None if the whole library must be treated as changed.
+    """
+    query = 'SELECT song_id FROM song_changes WHERE seq > ? AND (mask & ?) != 0'
+    if limit:
+        query += f' LIMIT {int(limit)}'
+    song_ids = [row[0] for row in conn.execute(query, (since, change_mask(conn, columns)))]
+    return None if 0 in song_ids else song_ids
+
+def _browse_add(table, column, row, where):
+    """SQL adding one song's row values (new or old) to its entry in a browse table."""
+    return (f"INSERT INTO {table} (name, tracks, length, playcount, lastplayed) "
+            f"SELECT {row}.{column}, 1, ifnull({row}.length, 0), ifnull({row}.playcount, 0), ifnull({row}.lastplayed, 0) "
+            f"WHERE {where} AND {row}.{column} != '' "
+            f"ON CONFLICT(name) DO UPDATE SET tracks = tracks + 1, length = length + excluded.length, "
+            f"playcount = playcount + excluded.playcount, lastplayed = max(lastplayed, excluded.lastplayed);")
+
+def _browse_remove(table, column, where):
+    """SQL taking a deleted or moved song (old) out of its entry in a browse table."""
+    # The latest play only has to be looked up again if the song held it
+    return (f"UPDATE {table} SET tracks = tracks - 1, length = length - ifnull(old.length, 0), "
+            f"playcount = playcount - ifnull(old.playcount, 0), "
+            f"lastplayed = CASE WHEN ifnull(old.lastplayed, 0) < lastplayed THEN lastplayed "
+            f"ELSE (SELECT ifnull(max(lastplayed), 0) FROM songs WHERE {column} = old.{column}) END "
+            f"WHERE name = old.{column} AND {where}; "
+            f"DELETE FROM {table} WHERE name = old.{column} AND tracks <= 0;")
+
+def ensure_browse_tables(conn):
+    """
+    Create the browse tables of the songs table if they're missing.
+    
+    Each BROWSE_TABLES table has one row per artist, album or genre (empty
+    names left out), keyed by name, with the number of tracks, their total
+    length and play count and the latest time one was played. Triggers on
+    songs keep the rows up to date with every insert, delete and change,
+    whether a scan or the stats journal writes it, so listing artists or
+    counting albums reads a small table instead of the whole library.
+    library_totals holds the same numbers for the whole library. Tables
+    added to an existing library are filled from the songs already there.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        
+    Returns:
+        bool: True if the tables are usable, False if the database is
+              read-only and has none yet.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'library_totals'")
+    if cursor.fetchone():
+        return True
+    
+    values = ('length', 'playcount', 'lastplayed')
+    changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in values)
+    try:
+        for column, table in BROWSE_TABLES.items():
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    name TEXT PRIMARY KEY,
+                    tracks INTEGER NOT NULL DEFAULT 0,
+                    length INTEGER NOT NULL DEFAULT 0,
+                    playcount INTEGER NOT NULL DEFAULT 0,
+                    lastplayed INTEGER NOT NULL DEFAULT 0
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_songs_{column} ON songs({column})')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON songs BEGIN
+                    {_browse_add(table, column, 'new', '1')}
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON songs BEGIN
+                    {_browse_remove(table, column, '1')}
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF {column}, {', '.join(values)} ON songs
+                WHEN old.{column} IS NOT new.{column} OR {changed} BEGIN
+                    UPDATE {table} SET length = length + ifnull(new.length, 0) - ifnull(old.length, 0),
+                        playcount = playcount + ifnull(new.playcount, 0) - ifnull(old.playcount, 0),
+                        lastplayed = CASE
+                            WHEN ifnull(new.lastplayed, 0) >= lastplayed THEN ifnull(new.lastplayed, 0)
+                            WHEN ifnull(old.lastplayed, 0) < lastplayed THEN lastplayed
+                            ELSE (SELECT ifnull(max(lastplayed), 0) FROM songs WHERE {column} = new.{column})
+                        END
+                    WHERE name = new.{column} AND old.{column} IS new.{column};
+                    {_browse_remove(table, column, f'old.{column} IS NOT new.{column}')}
+                    {_browse_add(table, column, 'new', f'old.{column} IS NOT new.{column}')}
+                END
+            ''')
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO {table} (name, tracks, length, playcount, lastplayed)
+                SELECT {column}, COUNT(*), ifnull(SUM(length), 0), ifnull(SUM(playcount), 0), ifnull(MAX(lastplayed), 0)
+                FROM songs WHERE {column} != '' GROUP BY {column}
+            ''')
+        
+        cursor.execute('''
+            CREATE TABLE library_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                tracks INTEGER NOT NULL DEFAULT 0,
+                length INTEGER NOT NULL DEFAULT 0,
+                playcount INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS library_totals_insert AFTER INSERT ON songs BEGIN
+                UPDATE library_totals SET tracks = tracks + 1, length = length + ifnull(new.length, 0),
+                    playcount = playcount + ifnull(new.playcount, 0);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS library_totals_delete AFTER DELETE ON songs BEGIN
+                UPDATE library_totals SET tracks = tracks - 1, length = length - ifnull(old.length, 0),
+                    playcount = playcount - ifnull(old.playcount, 0);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS library_totals_update AFTER UPDATE OF length, playcount ON songs
+            WHEN old.length IS NOT new.length OR old.playcount IS NOT new.playcount BEGIN
+                UPDATE library_totals SET length = length + ifnull(new.length, 0) - ifnull(old.length, 0),
+                    playcount = playcount + ifnull(new.playcount, 0) - ifnull(old.playcount, 0);
+            END
+        ''')
+        cursor.execute('''
+            INSERT INTO library_totals (id, tracks, length, playcount)
+            SELECT 1, COUNT(*), ifnull(SUM(length), 0), ifnull(SUM(playcount), 0) FROM songs
+        ''')
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Warning: browse tables unavailable, falling back to slow listings: {e}")
+        return False
+
+def browse_names(conn, column):
+    """
+    List the artists, albums or genres in the library.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        column (str): 'artist', 'album' or 'genre' (a BROWSE_TABLES key).
+        
+    Returns:
+        list: Names, sorted, without empty ones.
+    """
+    if ensure_browse_tables(conn):
+        query = f"SELECT name FROM {BROWSE_TABLES[column]} ORDER BY name"
+    else:
+        query = f"SELECT DISTINCT {column} FROM songs WHERE {column} != '' ORDER BY {column}"
+    return [row[0] for row in conn.execute(query)]
+
+def browse_entries(conn, column, order_by='name', limit=None):
+    """
+    Get the artists, albums or genres in the library with their aggregates.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        column (str): 'artist', 'album' or 'genre' (a BROWSE_TABLES key).
+        order_by (str): ORDER BY clause on name, tracks, length, playcount
+                        or lastplayed (e.g. 'playcount DESC').
+        limit (int): Maximum number of entries to return.
+        
+    Returns:
+        list: Dictionaries with name, tracks, length, playcount and lastplayed.
+    """
+    limit_clause = f" LIMIT {int(limit)}" if limit else ""
+    if ensure_browse_tables(conn):
+        query = f"SELECT name, tracks, length, playcount, lastplayed FROM {BROWSE_TABLES[column]}"
+    else:
+        query = f'''SELECT {column} AS name, COUNT(*) AS tracks, ifnull(SUM(length), 0) AS length,
+                           ifnull(SUM(playcount), 0) AS playcount, ifnull(MAX(lastplayed), 0) AS lastplayed
+                    FROM songs WHERE {column} != '' GROUP BY {column}'''
+    cursor = conn.execute(f"{query} ORDER BY {order_by}{limit_clause}")
+    names = [description[0] for description in cursor.description]
+    return [dict(zip(names, row)) for row in cursor]
+
+def library_summary(conn):
+    """
+    Count the songs, artists, albums and genres in the library.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        
+    Returns:
+        dict: songs, length (seconds), playcount, artists, albums and genres.
+    """
+    cursor = conn.cursor()
+    summary = {}
+    if ensure_browse_tables(conn):
+        cursor.execute('SELECT tracks, length, playcount FROM library_totals')
+        summary['songs'], summary['length'], summary['playcount'] = cursor.fetchone()
+        for column, table in BROWSE_TABLES.items():
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+            summary[f'{column}s'] = cursor.fetchone()[0]
+    else:
+        cursor.execute('SELECT COUNT(*), ifnull(SUM(length), 0), ifnull(SUM(playcount), 0) FROM songs')
+        summary['songs'], summary['length'], summary['playcount'] = cursor.fetchone()
+        for column in BROWSE_TABLES:
+            cursor.execute(f"SELECT COUNT(DISTINCT {column}) FROM songs WHERE {column} != ''")
+            summary[f'{column}s'] = cursor.fetchone()[0]
+    return summary
+
+class SongRow:
+    """
+    One songs row from iter_songs() or iter_songs_by_id().
+    
+    Holds the row's values as the tuple sqlite3 returned, with the column
+    positions shared by every row of the query, instead of building a dict
+    per row. Reads like a read-only dict (row['title'], row.get('artist'),
+    'url' in row, dict(row)).
+    """
+    
+    __slots__ = ('_values', '_columns')
+    
+    def __init__(self, values, columns):
+        """
+        Initialize SongRow.
+        
+        Args:
+            values (tuple): Row values.
+            columns (dict): Column name -> position in values, shared across rows.
+        """
+        self._values = values
+        self._columns = columns
+    
+    def __getitem__(self, key):
+        """
+        Get a column like a dict.
+        
+        Args:
+            key: Column name.
+            
+        Returns:
+            The column value.
+            
+        Raises:
+            KeyError: If the query didn't select the column.
+        """
+        return self._values[self._columns[key]]
+    
+    def get(self, key, default=None):
+        """Get a column like dict.get()."""
+        index = self._columns.get(key)
+        return default if index is None else self._values[index]
+    
+    def __contains__(self, key):
+        """
+        Check whether the query selected a column.
+        
+        Args:
+            key: Column name.
+            
+        Returns:
+            bool: True if the row has the column.
+        """
+        return key in self._columns
+    
+    def __iter__(self):
+        """
+        Iterate over the column names like a dict.
+        
+        Returns:
+            Iterator over the column names.
+        """
+        return iter(self._columns)
+    
+    def __len__(self):
+        """
+        Get the number of columns.
+        
+        Returns:
+            int: Number of columns in the row.
+        """
+        return len(self._columns)
+    
+    def keys(self):
+        """Get the column names."""
+        return self._columns.keys()
+    
+    def items(self):
+        """Get (column, value) pairs."""
+        return [(key, self._values[index]) for key, index in self._columns.items()]
+    
+    def to_dict(self):
+        """
+        Convert the row to a plain song dict.
+        
+        Returns:
+            dict: Column values by name.
+        """
+        return dict(self.items())
+    
+    def __repr__(self):
+        """
+        Return a debugging representation of the row.
+        
+        Returns:
+            str: The row's values by column name.
+        """
+        return f"SongRow({self.to_dict()!r})"
+
+def _song_projection(conn, columns):
+    """Check the columns of a songs query, returning them as a tuple (all columns if None)."""
+    song_columns = get_song_columns(conn)
+    if columns is None:
+        return tuple(song_columns)
+    columns = tuple(columns)
+    unknown = [column for column in columns if column not in song_columns]
+    if unknown:
+        raise ValueError(f"Unknown songs columns: {', '.join(map(str, unknown))}")
+    return columns
+
+def parse_order_by(conn, order_by):
+    """
+    Parse an ORDER BY clause on songs columns into keyset order.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        order_by (str): Comma-separated columns, each optionally followed by
+                        ASC or DESC (e.g. "artist, album, disc, track"), or None.
+        
+    Returns:
+        tuple: (column, descending) pairs, always ending with ('id', ...) so
+               the order is total.
+        
+    Raises:
+        ValueError: If a column is unknown or a direction malformed.
+    """
+    song_columns = get_song_columns(conn)
+    order = []
+    for part in (order_by or '').split(','):
+        words = part.split()
+        if not words:
+            continue
+        if words[0] not in song_columns or len(words) > 2 or (len(words) == 2 and words[1].upper() not in ('ASC', 'DESC')):
+            raise ValueError(f"Bad sort: {part.strip()!r} (expected '<songs column> [ASC|DESC]')")
+        order.append((words[0], len(words) == 2 and words[1].upper() == 'DESC'))
+        if words[0] == 'id':
+            break
+    if not order or order[-1][0] != 'id':
+        order.append(('id', False))
+    return tuple(order)
+
+def _keyset_condition(order, last):
+    """
+    Build the condition selecting the rows after a row in keyset order.
+    
+    NULLs sort first ascending and last descending, as in SQLite's ORDER BY,
+    so columns holding NULL in last are compared with IS (NOT) NULL.
+    
+    Args:
+        order (tuple): parse_order_by() pairs.
+        last (tuple): The row's values of the order columns.
+        
+    Returns:
+        tuple: (SQL condition, parameters)
+    """
+    condition, params = None, []
+    for (column, descending), value in reversed(list(zip(order, last))):
+        beyond = f"{column} {'<' if descending else '>'} ?"
+        if condition is None:
+            # The last column is id, unique and never NULL
+            condition, params = beyond, [value]
+        elif value is None:
+            condition = f"({column} IS NULL AND {condition})" if descending else f"({column} IS NOT NULL OR {condition})"
+        else:
+            if descending:
+                beyond = f"({beyond} OR {column} IS NULL)"
+            condition = f"({beyond} OR ({column} = ? AND {condition}))"
+            params = [value, value] + params
+    
+    column, descending = order[0]
+    if last[0] is not None and not descending:
+        # Lets an index on the first column seek straight to the page
+        condition = f"{column} >= ? AND {condition}"
+        params = [last[0]] + params
+    return condition, params
+
+def fetch_song_page(conn, columns=None, where="1=1", params=(), order_by=None, after=None, page_size=QUERY_PAGE_SIZE):
+    """
+    Read one page of songs, continuing from a cursor.
+    
+    Pages are found by keyset: each query starts right after the last row
+    of the previous page, so reading page 1000 costs the same as page 1 and
+    rows changing between pages are neither skipped nor repeated.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        columns (sequence): Songs columns to read (None for all of them).
+        where (str): SQL condition on the songs table.
+        params (sequence): Parameters of the condition.
+        order_by (str): Sort (see parse_order_by()); id order if None.
+        after (tuple): Cursor returned with the previous page, None for the first.
+        page_size (int): Maximum number of rows in the page.
+        
+    Returns:
+        tuple: (list of SongRow, cursor of the next page or None at the end)
+    """
+    columns = _song_projection(conn, columns)
+    order = parse_order_by(conn, order_by)
+    selected = columns + tuple(column for column, _ in order if column not in columns)
+    positions = {column: i for i, column in enumerate(selected)}
+    shown = {column: positions[column] for column in columns}
+    
+    query = f"SELECT {', '.join(selected)} FROM songs WHERE ({where})"
+    params = list(params)
+    if after is not None:
+        condition, condition_params = _keyset_condition(order, after)
+        query += f" AND {condition}"
+        params += condition_params
+    query += " ORDER BY " + ", ".join(f"{column} DESC" if descending else column for column, descending in order)
+    query += " LIMIT ?"
+    params.append(int(page_size))
+    
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(query, params)
+    rows = [SongRow(values, shown) for values in cursor.fetchall()]
+    if len(rows) < page_size:
+        return rows, None
+    last = rows[-1]._values
+    return rows, tuple(last[positions[column]] for column, _ in order)
+
+def iter_songs(conn, columns=None, where="1=1", params=(), order_by=None, limit=None, page_size=QUERY_PAGE_SIZE):
+    """
+    Stream songs a page at a time (see fetch_song_page()).
+    
+    Only one page of rows is held at once, and only the columns asked for
+    are read, so callers needing a few columns of a big result stay small.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        columns (sequence): Songs columns to read (None for all of them).
+        where (str): SQL condition on the songs table.
+        params (sequence): Parameters of the condition.
+        order_by (str): Sort (see parse_order_by()); id order if None.
+        limit (int): Stop after this many songs.
+        page_size (int): Rows read per query.
+        
+    Yields:
+        SongRow: Each matching song, in order.
+    """
+    after = None
+    remaining = limit
+    while True:
+        size = min(page_size, remaining) if remaining else page_size
+        rows, after = fetch_song_page(conn, columns, where, params, order_by, after, size)
+        yield from rows
+        if remaining:
+            remaining -= len(rows)
+            if remaining <= 0:
+                return
+        if after is None:
+            return
+
+def iter_songs_by_id(conn, song_ids, columns=None):
+    """
+    Stream songs in the order of a list of ids (e.g. ranked search results).
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        song_ids (sequence): Song ids; ids no longer in the database are skipped.
+        columns (sequence): Songs columns to read (None for all of them).
+        
+    Yields:
+        SongRow: Each song, in the order of song_ids.
+    """
+    columns = _song_projection(conn, columns)
+    selected = columns if 'id' in columns else columns + ('id',)
+    shown = {column: i for i, column in enumerate(columns)}
+    id_position = selected.index('id')
+    
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    for start in range(0, len(song_ids), QUERY_PAGE_SIZE):
+        chunk = list(song_ids[start:start + QUERY_PAGE_SIZE])
+        cursor.execute(f"SELECT {', '.join(selected)} FROM songs WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+        rows = {values[id_position]: values for values in cursor.fetchall()}
+        for song_id in chunk:
+            if song_id in rows:
+                yield SongRow(rows[song_id], shown)
+
+def build_search_query(text, columns=SEARCH_COLUMNS):
+    """
+    Turn what a user typed into an FTS5 query.
+    
+    Every word must match the start of a word in one of the columns, so
+    "beat abb" finds "Abbey Road" by the Beatles. FTS5 operators and
+    punctuation in the text are taken literally.
+    
+    Args:
+        text (str): Search text.
+        columns (sequence): Columns of FTS_COLUMNS to search.
+        
+    Returns:
+        str or None: FTS5 MATCH expression, or None if text has no words.
+    """
+    tokens = SEARCH_TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    terms = ' '.join(f'"{token}"*' for token in tokens)
+    return f"{{{' '.join(columns)}}} : ({terms})"
+
+def _like_search_condition(text, columns):
+    """Build the LIKE equivalent of build_search_query() for databases without FTS5."""
+    conditions = []
+    params = []
+    for token in SEARCH_TOKEN_RE.findall(text or ''):
+        conditions.append('(' + ' OR '.join(f'{column} LIKE ?' for column in columns) + ')')
+        params.extend([f'%{token}%'] * len(columns))
+    return ' AND '.join(conditions) or '1=1', params
+
+def search_condition(conn, text, columns=SEARCH_COLUMNS):
+    """
+    Build a condition on the songs table matching a search.
+    
+    The condition can be combined with any other condition on songs. It
+    uses the full-text index when there is one and LIKE otherwise.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        text (str): Search text (see build_search_query()).
+        columns (sequence): Columns of FTS_COLUMNS to search.
+        
+    Returns:
+        tuple: (SQL condition, parameters); "1=1" if text has no words.
+    """
+    query = build_search_query(text, columns)
+    if query is None:
+        return '1=1', []
+    if ensure_search_index(conn):
+        return 'id IN (SELECT rowid FROM songs_fts WHERE songs_fts MATCH ?)', [query]
+    return _like_search_condition(text, columns)
+
+def search_song_ids(conn, text, columns=SEARCH_COLUMNS, where="1=1", params=(), order_by=None, limit=None):
+    """
+    Find songs matching a search, best matches first.
+    
+    Matches are ranked by bm25 relevance from the full-text index, so only
+    matching rows are read however big the library is.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        text (str): Search text (see build_search_query()).
+        columns (sequence): Columns of FTS_COLUMNS to search.
+        where (str): Further SQL condition on the songs table.
+        params (sequence): Parameters of the condition.
+        order_by (str): ORDER BY clause on songs columns instead of relevance.
+        limit (int): Maximum number of ids to return.
+        
+    Returns:
+        list: Matching song ids.
+    """
+    query = build_search_query(text, columns)
+    if query is None:
+        return []
+    
+    params = list(params)
+    limit_clause = f" LIMIT {int(limit)}" if limit else ""
+    cursor = conn.cursor()
+    if ensure_search_index(conn):
+        if order_by:
+            # No relevance needed, so skip computing it
+            cursor.execute(
+                f"""SELECT id FROM songs WHERE id IN (SELECT rowid FROM songs_fts WHERE songs_fts MATCH ?)
+                   AND ({where}) ORDER BY {order_by}{limit_clause}""",
+                [query] + params
+            )
+        elif where == "1=1":
+            cursor.execute(f"SELECT rowid FROM songs_fts WHERE songs_fts MATCH ? ORDER BY rank{limit_clause}", [query])
+        else:
+            cursor.execute(
+                f"""SELECT songs.id FROM (
+                       SELECT rowid AS match_id, rank AS match_rank FROM songs_fts WHERE songs_fts MATCH ?
+                   ) JOIN songs ON songs.id = match_id
+                   WHERE {where} ORDER BY match_rank{limit_clause}""",
+                [query] + params
+            )
+    else:
+        condition, like_params = _like_search_condition(text, columns)
+        cursor.execute(
+            f"SELECT id FROM songs WHERE ({condition}) AND ({where}) ORDER BY {order_by or 'artist, album, disc, track'}{limit_clause}",
+            like_params + params
+        )
+    return [row[0] for row in cursor]
+
+def get_file_hash(filepath, stat=None):
     """
-    Generate a simple hash for the file based on path and size.
+    Generate a content fingerprint for the file.
+    
+    Hashes the file size and FINGERPRINT_SAMPLE_SIZE bytes from the start,
+    middle and end of the file (all of it when it is smaller than three
+    samples), so the fingerprint costs three short reads however large the
+    file is. It doesn't depend on the path or modification time, so a
+    moved or renamed file keeps its fingerprint, while tag edits (at the
+    start or end of the file) and re-encodes change it.
     
     Args:
         filepath (str): Path to the file to hash.
+        stat (os.stat_result, optional): Already known stat of the file.
+        
+    Returns:
+        str: 32 hex digit BLAKE2b digest of the size and sampled content.
+        
+    Raises:
+        OSError: If the file can't be read.
+    """
+    if stat is None:
+        stat = os.stat(filepath)
+    size = stat.st_size
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(filepath, 'rb') as f:
+        if size <= 3 * FINGERPRINT_SAMPLE_SIZE:
+            digest.update(f.read())
+        else:
+            for offset in (0, (size - FINGERPRINT_SAMPLE_SIZE) // 2, size - FINGERPRINT_SAMPLE_SIZE):
+                f.seek(offset)
+                digest.update(f.read(FINGERPRINT_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+def find_moved_song(cursor, filepath, stat, claimed_ids=()):
+    """
+    Find the song a new file was moved or renamed from.
+    
+    A song matches when its content fingerprint equals the file's and its
+    own file is gone, so copies of a file that is still in place are left
+    to be added as songs of their own.
+    
+    Args:
+        cursor (sqlite3.Cursor): Database cursor.
+        filepath (str): Absolute path to the new file.
+        stat (os.stat_result): Result of os.stat() on the file.
+        claimed_ids (collection): Song ids already matched to another file.
         
     Returns:
-        str: MD5 hash based on file path, size, and modification time.
+        tuple or None: (id, url, filesize, mtime, unavailable) of the song,
+            or None if the file isn't a known song in a new place.
     """
-    stat = os.stat(filepath)
-    hash_string = f"{filepath}:{stat.st_size}:{stat.st_mtime}"
-    return hashlib.md5(hash_string.encode()).hexdigest()
+    try:
+        fingerprint = get_file_hash(filepath, stat)
+    except OSError:
+        return None
+    cursor.execute('''
+        SELECT s.id, s.url, s.filesize, s.mtime, s.unavailable
+        FROM song_details d JOIN songs s ON s.id = d.id
+        WHERE d.fingerprint = ?
+    ''', (fingerprint,))
+    for row in cursor.fetchall():
+        if row[0] not in claimed_ids and not os.path.exists(row[1][7:]):
+            return row
+    return None
 
 def extract_metadata(filepath):
     """
@@ -176,6 +1204,74 @@ def extract_metadata(filepath):
         print(f"Error extracting metadata from {filepath}: {e}")
         return None
 
+def read_audio_file(filepath, known_size=None, known_mtime=None, need_fingerprint=False):
+    """
+    Stat an audio file and extract its metadata unless it is unchanged.
+    
+    This is the per-file work of a scan. It only touches the filesystem,
+    never the database, so it can run in scan worker processes.
+    
+    Args:
+        filepath (str): Path to the audio file.
+        known_size (int, optional): File size stored in the database.
+        known_mtime (int, optional): Modification time stored in the database.
+        need_fingerprint (bool): Fingerprint the file even if it is unchanged.
+        
+    Returns:
+        tuple: (stat, changed, metadata_dict, fingerprint, error). stat is
+            None and error holds a message if the file could not be read.
+            changed is False when size and mtime match the known values, in
+            which case no metadata is extracted, and the fingerprint (see
+            get_file_hash()) is only computed if asked for.
+    """
+    try:
+        stat = os.stat(filepath)
+    except OSError as e:
+        return None, False, None, None, str(e)
+    
+    changed = known_size != stat.st_size or known_mtime != int(stat.st_mtime)
+    metadata_dict = extract_metadata(filepath) if changed else None
+    fingerprint = None
+    if changed or need_fingerprint:
+        try:
+            fingerprint = get_file_hash(filepath, stat)
+        except OSError as e:
+            return None, False, None, None, str(e)
+    return stat, changed, metadata_dict, fingerprint, None
+
+def map_in_order(function, tasks, jobs=1):
+    """
+    Apply a function to scan tasks, optionally in a pool of worker processes.
+    
+    Results are yielded in the same order as the tasks regardless of the
+    number of jobs, so a parallel scan writes exactly what a serial scan
+    would. Only a bounded number of tasks is in flight at once.
+    
+    Args:
+        function (callable): Picklable function to run for each task.
+        tasks (iterable): (context, args) pairs. context is passed through
+            untouched; if args is None the function is not called for it.
+        jobs (int): Number of worker processes (1 runs in this process).
+        
+    Yields:
+        tuple: (context, result) with result None for tasks without args.
+    """
+    if jobs <= 1:
+        for context, args in tasks:
+            yield context, (function(*args) if args is not None else None)
+        return
+    
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for context, args in tasks:
+            pending.append((context, executor.submit(function, *args) if args is not None else None))
+            while len(pending) > jobs * 4:
+                done_context, future = pending.popleft()
+                yield done_context, (future.result() if future is not None else None)
+        while pending:
+            done_context, future = pending.popleft()
+            yield done_context, (future.result() if future is not None else None)
+
 def update_playcount(conn, song_id):
     """
     Increment playcount and update last played timestamp for a song.
@@ -285,118 +1381,775 @@ def update_rating(conn, song_id, rating):
         print(f"Error updating rating: {e}")
         return False
 
-def scan_directory(directory_path, conn):
+class AliasSampler:
+    """
+    Weighted random choice in O(1) per draw using Vose's alias method.
+    
+    Building the tables is O(n); each draw then costs one random index
+    and one coin flip, however skewed the weights are.
+    """
+    
+    def __init__(self, items, weights):
+        """
+        Initialize AliasSampler.
+        
+        Args:
+            items: Sequence of items to draw from.
+            weights: Non-negative weight of each item (all zero means uniform).
+        """
+        count = len(items)
+        total = float(sum(weights))
+        if total <= 0:
+            weights = [1.0] * count
+            total = float(count)
+        
+        self.items = items
+        self.probability = array('d', bytes(8 * count))
+        self.alias = array('q', bytes(8 * count))
+        
+        scaled = [weight * count / total for weight in weights]
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        
+        # Leftovers are 1.0 up to rounding error
+        for i in small + large:
+            self.probability[i] = 1.0
+    
+    def __len__(self):
+        """
+        Get the number of items that can be drawn.
+        
+        Returns:
+            int: Number of items.
+        """
+        return len(self.items)
+    
+    def sample(self):
+        """
+        Draw one item.
+        
+        Returns:
+            An item, chosen with probability proportional to its weight.
+        """
+        i = random.randrange(len(self.items))
+        if random.random() < self.probability[i]:
+            return self.items[i]
+        return self.items[self.alias[i]]
+
+def sample_song_ids(conn, count, where="1=1", params=(), weight=None):
+    """
+    Pick random songs without reading the whole library.
+    
+    Uniform sampling probes random ids between the smallest and largest
+    song id and keeps those that exist and match where, so it touches
+    only a few index pages however big the table is. Songs are picked
+    uniformly among the matching rows. If the filter matches too few of
+    the id range for probing to find enough songs, the matching ids are
+    read and sampled directly.
+    
+    Weighted sampling reads the id and weight of every matching song
+    into compact arrays and draws from an AliasSampler.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        count (int): Number of songs wanted.
+        where (str): SQL condition on the songs table (default: every song).
+        params (sequence): Parameters of the condition.
+        weight (str): Key of SAMPLE_WEIGHTS to favour songs by, or None for uniform.
+        
+    Returns:
+        list: Up to count distinct song ids, in random order.
+        
+    Raises:
+        ValueError: If weight is not a key of SAMPLE_WEIGHTS.
+    """
+    if count <= 0:
+        return []
+    params = list(params)
+    cursor = conn.cursor()
+    chosen = {}  # Ordered set of picked ids
+    
+    if weight is not None:
+        if weight not in SAMPLE_WEIGHTS:
+            raise ValueError(f"Unknown sample weight: {weight} (expected one of {', '.join(SAMPLE_WEIGHTS)})")
+        
+        ids = array('q')
+        weights = array('d')
+        cursor.execute(f"SELECT id, {SAMPLE_WEIGHTS[weight]} FROM songs WHERE {where}", params)
+        for song_id, song_weight in cursor:
+            ids.append(song_id)
+            weights.append(song_weight or 0)
+        if not ids:
+            return []
+        
+        count = min(count, len(ids))
+        sampler = AliasSampler(ids, weights)
+        # Repeats are redrawn; give up on very skewed weights and fill up uniformly below
+        for _ in range(count * SAMPLE_OVERDRAW * SAMPLE_MAX_ROUNDS):
+            if len(chosen) >= count:
+                break
+            chosen[sampler.sample()] = None
+        if len(chosen) < count:
+            remaining = [song_id for song_id in ids if song_id not in chosen]
+            chosen.update(dict.fromkeys(random.sample(remaining, count - len(chosen))))
+        return list(chosen)
+    
+    # Separate subqueries so each is a single index lookup rather than a scan
+    cursor.execute("SELECT (SELECT MIN(id) FROM songs), (SELECT MAX(id) FROM songs)")
+    low, high = cursor.fetchone()
+    if low is None:
+        return []
+    
+    probed = found = 0
+    for _ in range(SAMPLE_MAX_ROUNDS):
+        needed = count - len(chosen)
+        if needed <= 0:
+            return list(chosen)
+        
+        # Probe enough ids for the hit rate seen so far to find about twice what's needed
+        if probed:
+            draws = int(needed * 2 * (probed + 1) / (found + 1))
+        else:
+            draws = needed * SAMPLE_OVERDRAW
+        draws = min(draws, SAMPLE_MAX_PROBES)
+        probes = list({random.randint(low, high) for _ in range(draws)} - chosen.keys())
+        probed += len(probes)
+        hits = []
+        for start in range(0, len(probes), INGEST_BATCH_SIZE):
+            chunk = probes[start:start + INGEST_BATCH_SIZE]
+            cursor.execute(
+                f"SELECT id FROM songs WHERE id IN ({', '.join('?' * len(chunk))}) AND ({where})",
+                chunk + params
+            )
+            hits.extend(row[0] for row in cursor)
+        found += len(hits)
+        random.shuffle(hits)
+        chosen.update(dict.fromkeys(hits[:needed]))
+    
+    if len(chosen) < count:
+        # Sparse match: sample the matching ids themselves
+        cursor.execute(f"SELECT id FROM songs WHERE {where}", params)
+        remaining = [row[0] for row in cursor if row[0] not in chosen]
+        chosen.update(dict.fromkeys(random.sample(remaining, min(count - len(chosen), len(remaining)))))
+    return list(chosen)
+
+def set_ingest_pragmas(conn):
+    """
+    Tune a connection for writing large numbers of songs.
+    
+    Switches the database to write-ahead logging, relaxes syncing to the
+    end of each transaction and enlarges the page cache so bulk scans
+    don't pay for an fsync or a cache miss on every row.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+    """
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = -{INGEST_CACHE_KIB}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+
+def commit_if_due(conn, writer, last_commit):
+    """
+    Commit a scan's progress once INGEST_COMMIT_INTERVAL has passed.
+    
+    Short transactions let a playing queue save its stats and smart
+    playlists refresh while a long scan runs. Directory mtimes are only
+    stored when a scan ends, so an interrupted scan picks up the rest of
+    the tree next time.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        writer (SongBatchWriter): The scan's buffered writer.
+        last_commit (float): time.monotonic() of the previous commit.
+        
+    Returns:
+        float: time.monotonic() of the latest commit.
+    """
+    now = time.monotonic()
+    if now - last_commit < INGEST_COMMIT_INTERVAL:
+        return last_commit
+    writer.flush()
+    conn.commit()
+    return now
+
+def load_directory_ids(cursor):
+    """
+    Load the IDs of all known directories.
+    
+    Args:
+        cursor (sqlite3.Cursor): Database cursor.
+        
+    Returns:
+        dict: Directory paths mapped to their IDs.
+    """
+    cursor.execute('SELECT path, id FROM directories')
+    return dict(cursor.fetchall())
+
+def get_directory_id(cursor, dir_path, directory_ids=None):
+    """
+    Get the ID of a directory, adding it to the directories table if needed.
+    
+    Args:
+        cursor (sqlite3.Cursor): Database cursor.
+        dir_path (str): Absolute path of the directory.
+        directory_ids (dict, optional): Cache from load_directory_ids(),
+            consulted first and updated with new directories.
+        
+    Returns:
+        int: ID of the directory row.
+    """
+    dir_path = str(dir_path)
+    if directory_ids is not None and dir_path in directory_ids:
+        return directory_ids[dir_path]
+    
+    cursor.execute('INSERT OR IGNORE INTO directories (path) VALUES (?)', (dir_path,))
+    cursor.execute('SELECT id FROM directories WHERE path = ?', (dir_path,))
+    directory_id = cursor.fetchone()[0]
+    
+    if directory_ids is not None:
+        directory_ids[dir_path] = directory_id
+    return directory_id
+
+def find_known_urls(cursor, urls):
+    """
+    Find which of the given URLs are already in the songs table.
+    
+    Args:
+        cursor (sqlite3.Cursor): Database cursor.
+        urls (list): file:// URLs to look up.
+        
+    Returns:
+        set: URLs that already have a song row.
+    """
+    known = set()
+    for start in range(0, len(urls), INGEST_BATCH_SIZE):
+        chunk = urls[start:start + INGEST_BATCH_SIZE]
+        cursor.execute(f"SELECT url FROM songs WHERE url IN ({', '.join('?' * len(chunk))})", chunk)
+        known.update(row[0] for row in cursor.fetchall())
+    return known
+
+def build_song_values(metadata_dict, filepath, stat, directory_id, fingerprint=None):
+    """
+    Build the file and metadata column values stored for a song.
+    
+    User data (playcount, rating, etc.) is not included so the same values
+    can be used both for inserting new songs and refreshing changed ones.
+    The keys are always SONG_VALUE_COLUMNS followed by
+    SONG_DETAIL_VALUE_COLUMNS, in that order.
+    
+    Args:
+        metadata_dict (dict): Metadata returned by extract_metadata().
+        filepath (str): Absolute path to the audio file.
+        stat (os.stat_result): Result of os.stat() on the file.
+        directory_id (int): ID of the file's directory in the directories table.
+        fingerprint (str, optional): The file's get_file_hash(), if already known.
+        
+    Returns:
+        dict: Column names mapped to their values.
+    """
+    fingerprint = fingerprint or get_file_hash(filepath, stat)
+    artist_id = hashlib.md5(metadata_dict['artist'].encode()).hexdigest() if metadata_dict['artist'] else ''
+    album_id = hashlib.md5(f"{metadata_dict['albumartist'] or metadata_dict['artist']}:{metadata_dict['album']}".encode()).hexdigest() if metadata_dict['album'] else ''
+    
+    return {
+        'title': metadata_dict['title'], 'album': metadata_dict['album'],
+        'artist': metadata_dict['artist'], 'albumartist': metadata_dict['albumartist'],
+        'track': metadata_dict['track'], 'disc': metadata_dict['disc'],
+        'year': metadata_dict['year'], 'originalyear': metadata_dict['originalyear'],
+        'genre': metadata_dict['genre'], 'composer': metadata_dict['composer'],
+        'performer': metadata_dict['performer'], 'grouping': metadata_dict['grouping'],
+        'url': f"file://{filepath}", 'directory_id': directory_id,
+        'basefilename': Path(filepath).name, 'filetype': Path(filepath).suffix.lower()[1:],
+        'filesize': stat.st_size, 'mtime': int(stat.st_mtime), 'ctime': int(stat.st_ctime),
+        'length': metadata_dict['length'], 'bitrate': metadata_dict['bitrate'],
+        'samplerate': metadata_dict['samplerate'], 'bitdepth': metadata_dict['bitdepth'],
+        'compilation': metadata_dict['compilation'], 'art_embedded': metadata_dict['art_embedded'],
+        'lastseen': int(time.time()),
+        'comment': metadata_dict['comment'], 'lyrics': metadata_dict['lyrics'],
+        'fingerprint': fingerprint, 'song_id': fingerprint,
+        'artist_id': artist_id, 'album_id': album_id,
+    }
+
+class SongBatchWriter:
+    """
+    Buffer song inserts and updates and write them with executemany.
+    
+    All rows share SONG_VALUE_COLUMNS, so a single prepared statement is
+    reused for every batch instead of one round trip per song. The
+    SONG_DETAIL_VALUE_COLUMNS go to song_details once the songs rows are
+    written, matched by url. Songs moved to a new path only have their
+    file columns rewritten. Nothing is committed here; the caller owns
+    the transaction.
+    """
+    
+    def __init__(self, cursor, batch_size=None):
+        """
+        Initialize SongBatchWriter.
+        
+        Args:
+            cursor (sqlite3.Cursor): Database cursor to write with.
+            batch_size (int, optional): Rows buffered before a flush
+                (default: INGEST_BATCH_SIZE).
+        """
+        self.cursor = cursor
+        self.batch_size = batch_size or INGEST_BATCH_SIZE
+        self.pending_inserts = []
+        self.pending_updates = []
+        self.pending_details = []
+        self.pending_moves = []
+        self.pending_fingerprints = []
+        columns = SONG_VALUE_COLUMNS + ('source',)
+        self.insert_sql = f"INSERT INTO songs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        self.update_sql = f"UPDATE songs SET {', '.join(f'{column} = ?' for column in SONG_VALUE_COLUMNS)}, unavailable = 0 WHERE id = ?"
+        self.details_sql = (
+            f"INSERT INTO song_details (id, {', '.join(SONG_DETAIL_VALUE_COLUMNS)}) "
+            f"SELECT id, {', '.join('?' * len(SONG_DETAIL_VALUE_COLUMNS))} FROM songs WHERE url = ? "
+            f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in SONG_DETAIL_VALUE_COLUMNS)}"
+        )
+        self.move_sql = '''
+            UPDATE songs SET url = ?, directory_id = ?, basefilename = ?, filetype = ?,
+                             mtime = ?, ctime = ?, lastseen = ?, unavailable = 0
+            WHERE id = ?
+        '''
+        self.fingerprint_sql = '''
+            INSERT INTO song_details (id, fingerprint, song_id) VALUES (?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET fingerprint = excluded.fingerprint, song_id = excluded.song_id
+        '''
+    
+    def insert(self, values, source):
+        """
+        Queue a new song row.
+        
+        Args:
+            values (dict): Column values from build_song_values().
+            source (int): Source of the song (2 = Collection, 3 = Playlist).
+        """
+        self.pending_inserts.append(tuple(values[column] for column in SONG_VALUE_COLUMNS) + (source,))
+        self.pending_details.append(tuple(values[column] for column in SONG_DETAIL_VALUE_COLUMNS) + (values['url'],))
+        if len(self.pending_inserts) >= self.batch_size:
+            self.flush()
+    
+    def update(self, song_row_id, values):
+        """
+        Queue a refresh of an existing song's file and metadata columns.
+        
+        Playback statistics and ratings are left untouched, and the song is
+        marked as available again.
+        
+        Args:
+            song_row_id (int): ID of the song row to update.
+            values (dict): Column values from build_song_values().
+        """
+        self.pending_updates.append(tuple(values[column] for column in SONG_VALUE_COLUMNS) + (song_row_id,))
+        self.pending_details.append(tuple(values[column] for column in SONG_DETAIL_VALUE_COLUMNS) + (values['url'],))
+        if len(self.pending_updates) >= self.batch_size:
+            self.flush()
+    
+    def move(self, song_row_id, filepath, stat, directory_id):
+        """
+        Queue pointing an existing song at the new path of its unchanged file.
+        
+        Metadata, details and user data stay as they are, and the song is
+        marked as available again.
+        
+        Args:
+            song_row_id (int): ID of the song row to move.
+            filepath (str): Absolute path the file now has.
+            stat (os.stat_result): Result of os.stat() on the file.
+            directory_id (int): ID of the file's new directory.
+        """
+        path = Path(filepath)
+        self.pending_moves.append((
+            f"file://{filepath}", directory_id, path.name, path.suffix.lower()[1:],
+            int(stat.st_mtime), int(stat.st_ctime), int(time.time()), song_row_id
+        ))
+        if len(self.pending_moves) >= self.batch_size:
+            self.flush()
+    
+    def set_fingerprint(self, song_row_id, fingerprint):
+        """
+        Queue storing the content fingerprint of a song that has none yet.
+        
+        Args:
+            song_row_id (int): ID of the song row.
+            fingerprint (str): The file's get_file_hash().
+        """
+        self.pending_fingerprints.append((song_row_id, fingerprint, fingerprint))
+        if len(self.pending_fingerprints) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write all buffered rows."""
+        if self.pending_moves:
+            self.cursor.executemany(self.move_sql, self.pending_moves)
+            self.pending_moves = []
+        if self.pending_inserts:
+            self.cursor.executemany(self.insert_sql, self.pending_inserts)
+            self.pending_inserts = []
+        if self.pending_updates:
+            self.cursor.executemany(self.update_sql, self.pending_updates)
+            self.pending_updates = []
+        if self.pending_details:
+            self.cursor.executemany(self.details_sql, self.pending_details)
+            self.pending_details = []
+        if self.pending_fingerprints:
+            self.cursor.executemany(self.fingerprint_sql, self.pending_fingerprints)
+            self.pending_fingerprints = []
+
+def scan_directory(directory_path, conn, incremental=False, jobs=1):
     """
     Scan directory for audio files and add to database.
     
     Recursively scans the specified directory for audio files,
-    extracts metadata, and adds them to the database.
+    extracts metadata, and adds them to the database. Files that are
+    already in the database are only re-read when their size or
+    modification time changed, and songs whose files vanished from the
+    directory are marked as unavailable.
+    
+    A new file with the same content fingerprint as a song whose file is
+    gone (see find_moved_song()) was moved or renamed: that song is
+    pointed at the new path, keeping its id, playback statistics and
+    rating, and its metadata is only read again if the file changed too.
+    Songs from older versions get their fingerprint the first time a
+    scan sees their files.
+    
+    In incremental mode, directories whose modification time matches the
+    one stored by the previous scan are skipped entirely (their
+    subdirectories are still visited). A directory's mtime only changes
+    when entries are added, removed or renamed, so tags edited in place
+    inside an otherwise unchanged directory are picked up by a normal
+    (non-incremental) scan.
+    
+    With more than one job, stat calls and metadata extraction run in a
+    pool of worker processes while this thread stays the only database
+    writer. Results are applied in walk order, so the database ends up
+    identical to a serial scan.
     
     Args:
         directory_path (str): Path to the directory to scan.
         conn (sqlite3.Connection): Database connection object.
+        incremental (bool): Skip directories unchanged since the last scan.
+        jobs (int): Number of worker processes used to read files.
         
     Returns:
         tuple: (files_added, files_updated, errors) - counts of operation results.
     """
+    set_ingest_pragmas(conn)
     cursor = conn.cursor()
+    writer = SongBatchWriter(cursor)
+    directory_path = str(directory_path)
     
-    # Add directory to directories table
-    dir_stat = os.stat(directory_path)
+    # Load what previous scans know about this tree in one pass
+    url_prefix = f"file://{os.path.join(directory_path, '')}"
     cursor.execute('''
-        INSERT OR IGNORE INTO directories (path, mtime) 
-        VALUES (?, ?)
-    ''', (str(directory_path), int(dir_stat.st_mtime)))
+        SELECT s.id, s.url, s.filesize, s.mtime, s.unavailable, d.fingerprint IS NULL
+        FROM songs s LEFT JOIN song_details d ON d.id = s.id
+        WHERE substr(s.url, 1, ?) = ?
+    ''', (len(url_prefix), url_prefix))
+    known_songs = {row[1]: row for row in cursor.fetchall()}
     
-    # Get directory ID
-    cursor.execute('SELECT id FROM directories WHERE path = ?', (str(directory_path),))
-    directory_id = cursor.fetchone()[0]
+    # Only new files as large as some song can be one of them moved
+    cursor.execute('SELECT DISTINCT filesize FROM songs WHERE filesize IS NOT NULL')
+    known_sizes = {row[0] for row in cursor.fetchall()}
     
+    cursor.execute('SELECT path, mtime FROM directories')
+    known_dir_mtimes = dict(cursor.fetchall())
+    directory_ids = load_directory_ids(cursor)
+    
+    known_urls_by_dir = {}
+    if incremental:
+        for file_url in known_songs:
+            known_urls_by_dir.setdefault(os.path.dirname(file_url[7:]), []).append(file_url)
+    
+    seen_urls = set()
+    restored_ids = []
+    moved_ids = set()
+    dir_states = {}  # directory_id -> [mtime, errors]
     audio_files_found = 0
-    audio_files_processed = 0
+    files_added = 0
+    files_updated = 0
+    files_unchanged = 0
+    files_moved = 0
+    dirs_skipped = 0
+    errors = 0
     
-    print(f"Scanning directory: {directory_path}")
+    def find_move(filepath):
+        """
+        Find the song a new file was moved from, fingerprinting only files of a known size.
+        
+        Args:
+            filepath (str): Absolute path to the new file.
+            
+        Returns:
+            tuple or None: As find_moved_song(); None if no song of that size exists.
+        """
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None  # Reported when the file is read
+        if stat.st_size not in known_sizes:
+            return None
+        return find_moved_song(cursor, filepath, stat, moved_ids)
     
-    # Walk through directory recursively
-    for root, dirs, files in os.walk(directory_path):
-        for file in files:
-            filepath = os.path.join(root, file)
-            file_ext = Path(filepath).suffix.lower()
+    def scan_tasks():
+        """Walk the tree and yield a read task for every audio file."""
+        nonlocal audio_files_found, dirs_skipped, errors
+        
+        for root, dirs, files in os.walk(directory_path):
+            try:
+                dir_mtime = int(os.stat(root).st_mtime)
+            except OSError as e:
+                print(f"Error reading directory {root}: {e}")
+                errors += 1
+                continue
             
-            # Check if it's an audio file
-            if file_ext in AUDIO_EXTENSIONS:
-                audio_files_found += 1
+            if incremental and known_dir_mtimes.get(root) == dir_mtime:
+                # Nothing was added, removed or renamed here since the last scan
+                seen_urls.update(known_urls_by_dir.get(root, ()))
+                dirs_skipped += 1
+                continue
+            
+            directory_id = get_directory_id(cursor, root, directory_ids)
+            dir_states[directory_id] = [dir_mtime, 0]
+            
+            for file in files:
+                filepath = os.path.join(root, file)
                 
-                # Get file stats
-                try:
-                    stat = os.stat(filepath)
-                    file_url = f"file://{filepath}"
-                    
-                    # Check if file already exists in database
-                    cursor.execute('SELECT id FROM songs WHERE url = ?', (file_url,))
-                    existing = cursor.fetchone()
-                    
-                    if existing:
-                        print(f"Skipping (already in database): {filepath}")
-                        continue
-                    
-                    print(f"Processing: {filepath}")
-                    
-                    # Extract metadata
-                    metadata_dict = extract_metadata(filepath)
-                    if metadata_dict is None:
-                        print(f"Warning: Could not extract metadata from {filepath}")
-                        continue
-                    
-                    # Generate IDs
-                    fingerprint = get_file_hash(filepath)
-                    song_id = fingerprint
-                    artist_id = hashlib.md5(metadata_dict['artist'].encode()).hexdigest() if metadata_dict['artist'] else ''
-                    album_id = hashlib.md5(f"{metadata_dict['albumartist'] or metadata_dict['artist']}:{metadata_dict['album']}".encode()).hexdigest() if metadata_dict['album'] else ''
-                    
-                    # Insert into database
-                    cursor.execute('''
-                        INSERT INTO songs (
-                            title, album, artist, albumartist, track, disc, year, originalyear,
-                            genre, composer, performer, grouping, comment, lyrics,
-                            url, directory_id, basefilename, filetype, filesize, mtime, ctime,
-                            length, bitrate, samplerate, bitdepth,
-                            compilation, art_embedded, fingerprint, song_id, artist_id, album_id,
-                            lastseen, source
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        metadata_dict['title'], metadata_dict['album'], metadata_dict['artist'], metadata_dict['albumartist'],
-                        metadata_dict['track'], metadata_dict['disc'], metadata_dict['year'], metadata_dict['originalyear'],
-                        metadata_dict['genre'], metadata_dict['composer'], metadata_dict['performer'], metadata_dict['grouping'],
-                        metadata_dict['comment'], metadata_dict['lyrics'],
-                        file_url, directory_id, Path(filepath).name, file_ext[1:], stat.st_size,
-                        int(stat.st_mtime), int(stat.st_ctime),
-                        metadata_dict['length'], metadata_dict['bitrate'], metadata_dict['samplerate'], metadata_dict['bitdepth'],
-                        metadata_dict['compilation'], metadata_dict['art_embedded'], fingerprint, song_id, artist_id, album_id,
-                        int(time.time()), 2  # source = 2 (Collection)
-                    ))
-                    
-                    audio_files_processed += 1
-                    
-                except Exception as e:
-                    print(f"Error processing {filepath}: {e}")
-                    continue
+                # Check if it's an audio file
+                if Path(filepath).suffix.lower() in AUDIO_EXTENSIONS:
+                    audio_files_found += 1
+                    existing = known_songs.get(f"file://{filepath}")
+                    moved = find_move(filepath) if existing is None and known_sizes else None
+                    if moved:
+                        moved_ids.add(moved[0])
+                        existing = moved
+                    known_size, known_mtime = (existing[2], existing[3]) if existing else (None, None)
+                    # Songs from before content fingerprints get one while we're here
+                    need_fingerprint = bool(existing and not moved and existing[5])
+                    yield ((filepath, directory_id, existing, moved is not None),
+                           (filepath, known_size, known_mtime, need_fingerprint))
+    
+    print(f"Scanning directory: {directory_path}")
+    
+    last_commit = time.monotonic()
+    for (filepath, directory_id, existing, moved), result in map_in_order(read_audio_file, scan_tasks(), jobs):
+        last_commit = commit_if_due(conn, writer, last_commit)
+        stat, changed, metadata_dict, fingerprint, error = result
+        
+        if stat is None:
+            print(f"Error processing {filepath}: {error}")
+            dir_states[directory_id][1] += 1
+            continue
+        
+        seen_urls.add(f"file://{filepath}")
+        
+        # File moved or renamed since the last scan, with unchanged contents
+        if moved and not changed:
+            writer.move(existing[0], filepath, stat, directory_id)
+            print(f"Moved: {existing[1][7:]} -> {filepath}")
+            files_moved += 1
+            continue
+        
+        # File already in database and unchanged
+        if not changed:
+            if existing[4]:
+                restored_ids.append(existing[0])
+            if fingerprint:
+                writer.set_fingerprint(existing[0], fingerprint)
+            print(f"Skipping (already in database): {filepath}")
+            files_unchanged += 1
+            continue
+        
+        if moved:
+            print(f"Moved and updating: {existing[1][7:]} -> {filepath}")
+            files_moved += 1
+        else:
+            print(f"{'Updating' if existing else 'Processing'}: {filepath}")
+        
+        if metadata_dict is None:
+            print(f"Warning: Could not extract metadata from {filepath}")
+            dir_states[directory_id][1] += 1
+            continue
+        
+        try:
+            values = build_song_values(metadata_dict, filepath, stat, directory_id, fingerprint)
+            if existing:
+                writer.update(existing[0], values)
+                files_updated += 1
+            else:
+                writer.insert(values, 2)  # source = 2 (Collection)
+                files_added += 1
+        except Exception as e:
+            print(f"Error processing {filepath}: {e}")
+            dir_states[directory_id][1] += 1
+    
+    writer.flush()
+    
+    # Only remember a directory as scanned if every file in it was read
+    cursor.executemany('UPDATE directories SET mtime = ? WHERE id = ?',
+                       [(dir_mtime, directory_id) for directory_id, (dir_mtime, dir_errors) in dir_states.items()
+                        if dir_errors == 0])
+    errors += sum(dir_errors for dir_mtime, dir_errors in dir_states.values())
+    
+    # Songs that were in the database but are no longer on disk
+    vanished_ids = [row[0] for file_url, row in known_songs.items()
+                    if file_url not in seen_urls and not row[4] and row[0] not in moved_ids]
+    cursor.executemany('UPDATE songs SET unavailable = 1 WHERE id = ?', [(song_row_id,) for song_row_id in vanished_ids])
+    cursor.executemany('UPDATE songs SET unavailable = 0 WHERE id = ?', [(song_row_id,) for song_row_id in restored_ids])
     
     conn.commit()
     
     print(f"\nScan complete!")
     print(f"Audio files found: {audio_files_found}")
-    print(f"Audio files processed: {audio_files_processed}")
-    print(f"Database updated: {audio_files_processed} songs added")
+    print(f"Audio files processed: {files_added + files_updated}")
+    if incremental:
+        print(f"Unchanged directories skipped: {dirs_skipped}")
+    print(f"Database updated: {files_added} songs added, {files_updated} updated, "
+          f"{files_moved} moved, {files_unchanged} unchanged, {len(vanished_ids)} marked unavailable")
+    
+    return files_added, files_updated, errors
+
+
+def refresh_files(filepaths, conn, jobs=1):
+    """
+    Bring the songs of some files up to date without walking any directory.
+    
+    This is how watch mode applies a batch of filesystem events. Each audio
+    file is handled as a scan would: unchanged files are skipped, changed
+    ones re-read, new ones added, or moved in place when they are a song
+    whose file is gone (see find_moved_song()). Files that no longer exist
+    mark their songs unavailable. Nothing is committed here.
+    
+    Args:
+        filepaths (iterable): Absolute paths of files that may have changed.
+        conn (sqlite3.Connection): Database connection object.
+        jobs (int): Number of worker processes used to read files.
+        
+    Returns:
+        tuple: (added, updated, moved, removed, errors) - counts of operation results.
+    """
+    cursor = conn.cursor()
+    writer = SongBatchWriter(cursor)
+    directory_ids = {}
+    moved_ids = set()
+    removed_ids = []
+    added = updated = moved_count = errors = 0
+    
+    def refresh_tasks():
+        """Yield a read task for every audio file that still exists."""
+        for filepath in sorted(set(filepaths)):
+            if Path(filepath).suffix.lower() not in AUDIO_EXTENSIONS:
+                continue
+            cursor.execute('''
+                SELECT s.id, s.url, s.filesize, s.mtime, s.unavailable, d.fingerprint IS NULL
+                FROM songs s LEFT JOIN song_details d ON d.id = s.id
+                WHERE s.url = ?
+            ''', (f"file://{filepath}",))
+            existing = cursor.fetchone()
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                if existing and not existing[4]:
+                    removed_ids.append(existing[0])
+                continue
+            
+            moved = None
+            if existing is None:
+                moved = find_moved_song(cursor, filepath, stat, moved_ids)
+                if moved:
+                    moved_ids.add(moved[0])
+                    existing = moved
+            known_size, known_mtime = (existing[2], existing[3]) if existing else (None, None)
+            need_fingerprint = bool(existing and not moved and existing[5])
+            directory_id = get_directory_id(cursor, os.path.dirname(filepath), directory_ids)
+            yield ((filepath, directory_id, existing, moved is not None),
+                   (filepath, known_size, known_mtime, need_fingerprint))
+    
+    for (filepath, directory_id, existing, moved), result in map_in_order(read_audio_file, refresh_tasks(), jobs):
+        stat, changed, metadata_dict, fingerprint, error = result
+        
+        if stat is None:
+            print(f"Error processing {filepath}: {error}")
+            errors += 1
+            continue
+        
+        if moved and not changed:
+            writer.move(existing[0], filepath, stat, directory_id)
+            print(f"Moved: {existing[1][7:]} -> {filepath}")
+            moved_count += 1
+            continue
+        
+        if not changed:
+            if existing[4]:
+                cursor.execute('UPDATE songs SET unavailable = 0 WHERE id = ?', (existing[0],))
+            if fingerprint:
+                writer.set_fingerprint(existing[0], fingerprint)
+            continue
+        
+        if metadata_dict is None:
+            print(f"Warning: Could not extract metadata from {filepath}")
+            errors += 1
+            continue
+        
+        print(f"{'Moved and updating' if moved else 'Updating' if existing else 'Adding'}: {filepath}")
+        try:
+            values = build_song_values(metadata_dict, filepath, stat, directory_id, fingerprint)
+            if existing:
+                writer.update(existing[0], values)
+                updated += 1
+                if moved:
+                    moved_count += 1
+            else:
+                writer.insert(values, 2)  # source = 2 (Collection)
+                added += 1
+        except Exception as e:
+            print(f"Error processing {filepath}: {e}")
+            errors += 1
+    
+    writer.flush()
+    
+    # A file moved within the batch is gone from its old path too
+    removed_ids = [song_row_id for song_row_id in removed_ids if song_row_id not in moved_ids]
+    cursor.executemany('UPDATE songs SET unavailable = 1 WHERE id = ?', [(song_row_id,) for song_row_id in removed_ids])
+    return added, updated, moved_count, len(removed_ids), errors
+
+def mark_tree_unavailable(conn, directory_path):
+    """
+    Mark every song under a directory that was deleted or moved away as unavailable.
+    
+    Songs moved along with it are picked up again, by fingerprint, when
+    the directory's new location is scanned. Nothing is committed here.
+    
+    Args:
+        conn (sqlite3.Connection): Database connection object.
+        directory_path (str): Absolute path of the directory.
+        
+    Returns:
+        int: Number of songs marked unavailable.
+    """
+    url_prefix = f"file://{os.path.join(directory_path, '')}"
+    cursor = conn.execute('''
+        UPDATE songs SET unavailable = 1
+        WHERE substr(url, 1, ?) = ? AND unavailable = 0
+    ''', (len(url_prefix), url_prefix))
+    return cursor.rowcount
 
 
-def load_playlist_to_database(playlist_path, conn):
+def load_playlist_to_database(playlist_path, conn, jobs=1):
     """
     Load songs from M3U playlist and add to database.
     
     Args:
         playlist_path (str): Path to the M3U playlist file.
         conn (sqlite3.Connection): Database connection object.
+        jobs (int): Number of worker processes used to read files.
         
     Returns:
         bool: True if playlist loaded successfully, False otherwise.
@@ -411,99 +2164,77 @@ def load_playlist_to_database(playlist_path, conn):
     
     print(f"Loading playlist: {playlist_path}")
     
-    # Load playlist
-    songs = load_m3u_playlist(playlist_path)
+    # Load playlist (metadata is read below, so skip reading it twice)
+    songs = load_m3u_playlist(playlist_path, lazy=True)
     if not songs:
         print("No songs found in playlist or failed to load playlist.")
         return False
     
     print(f"Found {len(songs)} songs in playlist.")
     
+    set_ingest_pragmas(conn)
     cursor = conn.cursor()
+    writer = SongBatchWriter(cursor)
+    directory_ids = load_directory_ids(cursor)
     added_count = 0
     skipped_count = 0
     
-    for i, song in enumerate(songs):
+    playlist_dir = Path(playlist_path).parent
+    file_paths = []
+    for song in songs:
         file_path = song['url']
         if file_path.startswith('file://'):
             file_path = file_path[7:]  # Remove 'file://' prefix
         
         # Convert to absolute path if relative
         if not os.path.isabs(file_path):
-            playlist_dir = Path(playlist_path).parent
             file_path = os.path.abspath(os.path.join(playlist_dir, file_path))
-        
+        file_paths.append(file_path)
+    
+    # Check which files already exist in database in a few batched queries
+    known_urls = find_known_urls(cursor, [f"file://{file_path}" for file_path in file_paths])
+    
+    def playlist_tasks():
+        """Yield a read task for every playlist entry not yet in the database."""
+        for i, file_path in enumerate(file_paths):
+            file_url = f"file://{file_path}"
+            existing = file_url in known_urls
+            # Later duplicates of this entry in the playlist count as existing
+            known_urls.add(file_url)
+            
+            yield (i, file_path, existing), (None if existing else (file_path,))
+    
+    last_commit = time.monotonic()
+    for (i, file_path, existing), result in map_in_order(read_audio_file, playlist_tasks(), jobs):
+        last_commit = commit_if_due(conn, writer, last_commit)
         print(f"Processing [{i+1}/{len(songs)}]: {os.path.basename(file_path)}")
         
+        if existing:
+            print(f"  Skipping (already in database): {os.path.basename(file_path)}")
+            skipped_count += 1
+            continue
+        
+        stat, changed, metadata_dict, fingerprint, error = result
+        
         # Check if file exists
-        if not os.path.exists(file_path):
+        if stat is None:
             print(f"  Warning: File not found: {file_path}")
             skipped_count += 1
             continue
         
+        if metadata_dict is None:
+            print(f"  Warning: Could not extract metadata from {file_path}")
+            skipped_count += 1
+            continue
+        
         try:
-            # Get file stats
-            stat = os.stat(file_path)
-            file_url = f"file://{file_path}"
-            
-            # Check if file already exists in database
-            cursor.execute('SELECT id FROM songs WHERE url = ?', (file_url,))
-            existing = cursor.fetchone()
-            
-            if existing:
-                print(f"  Skipping (already in database): {os.path.basename(file_path)}")
-                skipped_count += 1
-                continue
-            
-            # Get directory for this file
-            dir_path = str(Path(file_path).parent)
-            
-            # Add directory to directories table if not exists
-            dir_stat = os.stat(dir_path)
-            cursor.execute('''
-                INSERT OR IGNORE INTO directories (path, mtime) 
-                VALUES (?, ?)
-            ''', (str(dir_path), int(dir_stat.st_mtime)))
-            
-            # Get directory ID
-            cursor.execute('SELECT id FROM directories WHERE path = ?', (str(dir_path),))
-            directory_id = cursor.fetchone()[0]
-            
-            # Extract metadata
-            metadata_dict = extract_metadata(file_path)
-            if metadata_dict is None:
-                print(f"  Warning: Could not extract metadata from {file_path}")
-                skipped_count += 1
-                continue
-            
-            # Generate IDs
-            fingerprint = get_file_hash(file_path)
-            song_id = fingerprint
-            artist_id = hashlib.md5(metadata_dict['artist'].encode()).hexdigest() if metadata_dict['artist'] else ''
-            album_id = hashlib.md5(f"{metadata_dict['albumartist'] or metadata_dict['artist']}:{metadata_dict['album']}".encode()).hexdigest() if metadata_dict['album'] else ''
+            # Get directory for this file (its mtime is only recorded by
+            # directory scans, so incremental scans still visit it)
+            directory_id = get_directory_id(cursor, Path(file_path).parent, directory_ids)
             
             # Insert into database
-            file_ext = Path(file_path).suffix.lower()
-            cursor.execute('''
-                INSERT INTO songs (
-                    title, album, artist, albumartist, track, disc, year, originalyear,
-                    genre, composer, performer, grouping, comment, lyrics,
-                    url, directory_id, basefilename, filetype, filesize, mtime, ctime,
-                    length, bitrate, samplerate, bitdepth,
-                    compilation, art_embedded, fingerprint, song_id, artist_id, album_id,
-                    lastseen, source
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                metadata_dict['title'], metadata_dict['album'], metadata_dict['artist'], metadata_dict['albumartist'],
-                metadata_dict['track'], metadata_dict['disc'], metadata_dict['year'], metadata_dict['originalyear'],
-                metadata_dict['genre'], metadata_dict['composer'], metadata_dict['performer'], metadata_dict['grouping'],
-                metadata_dict['comment'], metadata_dict['lyrics'],
-                file_url, directory_id, Path(file_path).name, file_ext[1:], stat.st_size,
-                int(stat.st_mtime), int(stat.st_ctime),
-                metadata_dict['length'], metadata_dict['bitrate'], metadata_dict['samplerate'], metadata_dict['bitdepth'],
-                metadata_dict['compilation'], metadata_dict['art_embedded'], fingerprint, song_id, artist_id, album_id,
-                int(time.time()), 3  # source = 3 (Playlist)
-            ))
+            values = build_song_values(metadata_dict, file_path, stat, directory_id, fingerprint)
+            writer.insert(values, 3)  # source = 3 (Playlist)
             
             added_count += 1
             print(f"  Added: {metadata_dict['artist']} - {metadata_dict['title']}")
@@ -512,6 +2243,7 @@ def load_playlist_to_database(playlist_path, conn):
             print(f"  Error processing {file_path}: {e}")
             skipped_count += 1
     
+    writer.flush()
     conn.commit()
     
     print(f"\nPlaylist processing complete:")
@@ -520,13 +2252,15 @@ def load_playlist_to_database(playlist_path, conn):
     
     return True
 
-def analyze_directory(directory_path, db_path):
+def analyze_directory(directory_path, db_path, incremental=False, jobs=1):
     """
     Analyze audio files in directory and store information in SQLite database.
     
     Args:
         directory_path (str): Path to the directory to analyze.
         db_path (str): Path to the SQLite database file.
+        incremental (bool): Skip directories unchanged since the last scan.
+        jobs (int): Number of worker processes used to read files.
         
     Returns:
         bool: True if analysis completed successfully, False otherwise.
@@ -550,7 +2284,7 @@ def analyze_directory(directory_path, db_path):
         conn = create_database(db_path)
         
         # Scan directory
-        scan_directory(directory_path, conn)
+        scan_directory(directory_path, conn, incremental=incremental, jobs=jobs)
         
         # Print summary
         cursor = conn.cursor()
@@ -589,6 +2323,15 @@ def main():
         Load playlist into database:
             python database.py --playlist myplaylist.m3u --db-path ~/music.db
             
+        Rescan only directories that changed since the last scan:
+            python database.py /path/to/music --incremental
+            
+        Read files with 8 worker processes (useful for network shares):
+            python database.py /path/to/music --jobs 8
+            
+        Scan, then keep applying changes as they happen (Linux only):
+            python database.py /path/to/music --watch
+            
         Scan with test directory:
             python database.py ../../testing_files/
     """
@@ -596,6 +2339,9 @@ def main():
         description="Audio Library Analyzer - Scans directory for audio files and stores metadata in SQLite database",
         epilog="Examples:\n"
                "  python database.py /path/to/music --db-path ~/music.db\n"
+               "  python database.py /path/to/music --incremental\n"
+               "  python database.py /path/to/music --jobs 8\n"
+               "  python database.py /path/to/music --incremental --watch\n"
                "  python database.py --playlist myplaylist.m3u --db-path ~/music.db",
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
@@ -615,6 +2361,22 @@ def main():
         "--playlist",
         help="Load songs from an M3U playlist file into the database"
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip directories whose modification time hasn't changed since the last scan"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        help="Number of worker processes used to read audio files (default: 1)"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="After scanning, keep watching the directory and apply changes as they happen (Linux inotify)"
+    )
 
     # Parse arguments
     args = parser.parse_args()
@@ -624,6 +2386,9 @@ def main():
         print("Error: Either directory or --playlist must be specified.")
         parser.print_help()
         sys.exit(1)
+    if args.watch and not args.directory:
+        print("Error: --watch needs a directory to watch.")
+        sys.exit(1)
     
     success = True
     
@@ -631,7 +2396,7 @@ def main():
     if args.playlist:
         print(f"Loading playlist into database: {args.db_path}")
         conn = create_database(args.db_path)
-        success = load_playlist_to_database(args.playlist, conn)
+        success = load_playlist_to_database(args.playlist, conn, jobs=args.jobs)
         
         if success:
             # Print summary
@@ -656,8 +2421,16 @@ def main():
         else:
             print(f"Scanning directory: {args.directory}")
         
-        directory_success = analyze_directory(args.directory, args.db_path)
+        directory_success = analyze_directory(args.directory, args.db_path, incremental=args.incremental, jobs=args.jobs)
         success = success and directory_success
+        
+        if args.watch and directory_success:
+            # Imported here, as library_watch imports this module
+            try:
+                from . import library_watch
+            except ImportError:
+                from core import library_watch
+            success = library_watch.watch_directory(args.directory, args.db_path, jobs=args.jobs)
     
     # Exit with appropriate code for success or failure
     sys.exit(0 if success else 1)
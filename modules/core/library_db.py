@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+shared access to the library database: WAL mode, busy timeouts, pooled readers and one serialized writer
+"""
+import os
+import sys
+import sqlite3
+import argparse
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+# Run as a script, core/queue.py would shadow the standard library queue module
+if not __package__:
+    import _standalone
+    _standalone.setup_path()
+import queue
+
+logger = logging.getLogger('LibraryDB')
+
+# Seconds a connection waits for another connection's write lock (e.g. a
+# scan committing a batch) before failing with "database is locked"
+BUSY_TIMEOUT = 30.0
+
+# Idle read connections kept open per LibraryDatabase
+READ_POOL_SIZE = 4
+
+
+def connect(db_path: str, readonly: bool = False, row_factory=None, **kwargs) -> sqlite3.Connection:
+    """
+    Open a connection to a library database with the shared settings.
+
+    The database is switched to write-ahead logging, so readers never wait
+    for a writer and a writer never waits for readers. Writers wait up to
+    BUSY_TIMEOUT for each other instead of failing at once, and commits
+    only sync the log at checkpoints (synchronous = NORMAL), which is safe
+    in WAL mode.
+
+    Args:
+        db_path: Path to the library database.
+        readonly: Open the database read-only.
+        row_factory: Row factory for the connection (e.g. sqlite3.Row).
+        **kwargs: Extra arguments for sqlite3.connect() (e.g. check_same_thread).
+
+    Returns:
+        sqlite3.Connection: The configured connection.
+    """
+    kwargs.setdefault('timeout', BUSY_TIMEOUT)
+    if readonly:
+        conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True, **kwargs)
+    else:
+        conn = sqlite3.connect(db_path, **kwargs)
+        if conn.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+            try:
+                conn.execute('PRAGMA journal_mode = WAL')
+            except sqlite3.OperationalError as e:
+                # Another connection is mid-transaction; the next connect retries
+                logger.debug(f"Could not switch {db_path} to WAL mode: {e}")
+        conn.execute('PRAGMA synchronous = NORMAL')
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    Run a write transaction, committing it on success and rolling it back on error.
+
+    The write lock is taken up front (BEGIN IMMEDIATE), so the transaction
+    waits for other writers when it starts rather than failing part way
+    through when its first read turns out to be stale. Nested uses join
+    the transaction already open.
+
+    Args:
+        conn: Library database connection.
+
+    Returns:
+        Iterator[sqlite3.Connection]: Context manager over the transaction.
+
+    Yields:
+        The connection, inside the transaction.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+class LibraryDatabase:
+    """
+    The connections one process keeps to a library database.
+
+    - connection() gives every thread its own connection, opened on first
+      use, for threads that live as long as the process (the command loop,
+      the playback thread).
+    - reader() lends a connection from a pool of up to READ_POOL_SIZE idle
+      ones for a read that must see one snapshot of the library; it stays
+      consistent while a scan commits around it.
+    - writer() hands out the single writer connection, one thread at a
+      time, inside a write transaction.
+
+    Other processes (a scan, the stats flusher of another queue) are
+    serialized with this one by SQLite's own write lock and BUSY_TIMEOUT.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = READ_POOL_SIZE, **connect_args):
+        """
+        Initialize LibraryDatabase.
+
+        Args:
+            db_path: Path to the library database.
+            pool_size: Idle read connections to keep open.
+            **connect_args: Extra arguments for connect() (default row factory: sqlite3.Row).
+        """
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.connect_args = dict(connect_args)
+        self.connect_args.setdefault('row_factory', sqlite3.Row)
+        self._local = threading.local()
+        self._readers = queue.LifoQueue()  # Idle read connections, most recently used first
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.RLock()
+        self._opened: List[sqlite3.Connection] = []  # Every connection, so close() can reach them
+        self._opened_lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        """Open a connection that may be closed from another thread."""
+        conn = connect(self.db_path, check_same_thread=False, **self.connect_args)
+        with self._opened_lock:
+            self._opened.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Get this thread's connection, opening it on first use.
+
+        Returns:
+            sqlite3.Connection: The connection owned by the calling thread.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._open()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a pooled connection holding one read snapshot.
+
+        Returns:
+            Iterator[sqlite3.Connection]: Context manager over the read transaction.
+
+        Yields:
+            A connection inside a read transaction, returned to the pool afterwards.
+        """
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+
+        conn.execute('BEGIN')
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            if self._readers.qsize() < self.pool_size:
+                self._readers.put(conn)
+            else:
+                self._forget(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Take the writer connection inside a write transaction.
+
+        Writers of this process queue on a lock, so only one holds the
+        database's write lock at a time; the transaction commits when the
+        block ends and rolls back if it raises.
+
+        Returns:
+            Iterator[sqlite3.Connection]: Context manager over the write transaction.
+
+        Yields:
+            The writer connection.
+        """
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self._open()
+            with transaction(self._writer) as conn:
+                yield conn
+
+    def _forget(self, conn: sqlite3.Connection):
+        """Close a connection and stop tracking it."""
+        with self._opened_lock:
+            if conn in self._opened:
+                self._opened.remove(conn)
+        conn.close()
+
+    def close(self):
+        """Close every connection; later calls open new ones."""
+        with self._opened_lock:
+            opened, self._opened = self._opened, []
+        for conn in opened:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._readers = queue.LifoQueue()
+        self._writer = None
+        self._local = threading.local()
+
+
+def wal_status(conn: sqlite3.Connection) -> dict:
+    """
+    Describe how a library database is being journaled.
+
+    Args:
+        conn: Library database connection.
+
+    Returns:
+        dict: journal_mode, busy_timeout (ms) and wal_pages (frames in the
+        write-ahead log, 0 outside WAL mode). Measuring the log runs a
+        passive checkpoint, which never waits for other connections.
+    """
+    journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    wal_pages = 0
+    if journal_mode.lower() == 'wal':
+        wal_pages = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()[1]
+    return {
+        'journal_mode': journal_mode,
+        'busy_timeout': conn.execute('PRAGMA busy_timeout').fetchone()[0],
+        'wal_pages': max(wal_pages, 0),
+    }
+
+
+def main():
+    """
+    Main function for command-line usage.
+
+    Returns:
+        int: Exit code (0 for success, 1 for failure)
+    """
+    parser = argparse.ArgumentParser(
+        description='Show and maintain how the library database is shared between walrio processes',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Show the journal mode and the size of the write-ahead log
+  python library_db.py --db-path ~/music.db
+
+  # Fold the write-ahead log back into the database file
+  python library_db.py --db-path ~/music.db --checkpoint
+        """
+    )
+    parser.add_argument('--db-path', default='walrio_library.db',
+                        help='Path to database file (default: walrio_library.db)')
+    parser.add_argument('--checkpoint', action='store_true',
+                        help='Copy the write-ahead log into the database and truncate it')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        print(f"Error: Database not found: {args.db_path}")
+        return 1
+
+    try:
+        conn = connect(args.db_path)
+        if args.checkpoint:
+            busy, _, copied = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+            if busy:
+                print(f"Checkpoint incomplete: another connection is reading ({copied} pages copied)")
+            else:
+                print(f"Checkpointed {max(copied, 0)} pages")
+        status = wal_status(conn)
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error opening database: {e}")
+        return 1
+
+    print(f"Journal mode: {status['journal_mode']}")
+    print(f"Busy timeout: {status['busy_timeout'] / 1000:g}s")
+    print(f"Write-ahead log: {status['wal_pages']} pages")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
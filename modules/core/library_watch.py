@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+keep the library database current by applying file changes as Linux inotify reports them
+"""
+import os
+import sys
+import time
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import argparse
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+# Handle imports for both package and standalone execution
+try:
+    from . import database
+except ImportError:
+    import _standalone
+    _standalone.setup_path()
+    from core import database
+
+# Seconds without new events before the pending changes are applied
+DEBOUNCE_SECONDS = 1.0
+
+# Longest a change waits to be applied while events keep arriving
+MAX_BATCH_DELAY = 10.0
+
+# Seconds between checks of the stop event while nothing is pending
+IDLE_POLL_SECONDS = 1.0
+
+# Bytes read from the inotify descriptor at a time
+READ_BUFFER_SIZE = 65536
+
+# inotify(7) event flags
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Events watched on every directory of the library. Files are picked up
+# when closed after writing rather than on every write (IN_MODIFY).
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+# An inotify event: (watch descriptor, mask, cookie, name)
+Event = Tuple[int, int, int, str]
+
+
+class Inotify:
+    """
+    Minimal ctypes binding of Linux inotify (see inotify(7)).
+
+    Only what the watcher needs: adding and removing watches and reading
+    the queued events without blocking longer than a timeout.
+    """
+
+    # struct inotify_event header: wd, mask, cookie, len (name follows)
+    _HEADER = struct.Struct('iIII')
+
+    def __init__(self):
+        """
+        Initialize Inotify.
+
+        Raises:
+            OSError: If inotify isn't available (not Linux, or no instances left).
+        """
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available on this system")
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._libc = libc
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """
+        Watch a directory, or update the mask of its existing watch.
+
+        Args:
+            path: Directory to watch.
+            mask: Events to report (IN_* flags).
+
+        Returns:
+            int: Watch descriptor; the same one again for an already watched directory.
+
+        Raises:
+            OSError: If the watch can't be added (e.g. ENOSPC when
+                fs.inotify.max_user_watches is reached).
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        """Stop watching a directory; its watch may already be gone."""
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: Optional[float]) -> List[Event]:
+        """
+        Read the queued events, waiting up to timeout seconds for the first one.
+
+        Args:
+            timeout: Seconds to wait (None waits until an event arrives).
+
+        Returns:
+            List of (wd, mask, cookie, name) events, in the order they happened.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, READ_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = self._HEADER.unpack_from(data, offset)
+                offset += self._HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        """Close the inotify descriptor, dropping every watch."""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class LibraryWatcher:
+    """
+    Apply changes under a library directory to its database as they happen.
+
+    Every directory of the tree is watched. Events are not applied one by
+    one: they only mark files and directories as pending, and once no new
+    event has arrived for DEBOUNCE_SECONDS (or MAX_BATCH_DELAY has passed)
+    the pending set is applied as one batch. A file written, renamed and
+    tagged in quick succession is therefore read once. How a batch is
+    applied:
+
+    - changed, created and moved-in files go through database.refresh_files(),
+      which also matches moved files to their songs by content fingerprint
+    - deleted and moved-away files mark their songs unavailable
+    - new and moved-in directories are watched and scanned
+    - deleted and moved-away directories mark their songs unavailable
+
+    The tree is only walked when watching starts, for new directories and
+    after the kernel's event queue overflowed, never periodically.
+    """
+
+    def __init__(self, directory_path: str, db_path: str, jobs: int = 1,
+                 debounce: float = DEBOUNCE_SECONDS, max_delay: float = MAX_BATCH_DELAY):
+        """
+        Initialize LibraryWatcher.
+
+        Args:
+            directory_path: Library directory to watch.
+            db_path: Path to the library database.
+            jobs: Number of worker processes used to read files.
+            debounce: Quiet seconds before pending changes are applied.
+            max_delay: Longest a pending change waits.
+
+        Raises:
+            OSError: If inotify isn't available.
+        """
+        self.directory_path = os.path.abspath(directory_path)
+        self.db_path = db_path
+        self.jobs = jobs
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.inotify = Inotify()
+        self.conn = None  # Opened by run()
+        self._paths: Dict[int, str] = {}  # Watch descriptor -> directory path
+        self._dropped: Set[int] = set()  # Watches of directories deleted or moved away
+        self._watch_limit_reported = False
+        self.stopped = False
+
+        # Pending changes
+        self._files: Set[str] = set()
+        self._new_dirs: Set[str] = set()
+        self._gone_dirs: Set[str] = set()
+        self._first_pending: Optional[float] = None
+        self._last_event = 0.0
+
+    def _watch_tree(self, top: str) -> int:
+        """Watch a directory and every directory below it; returns how many were watched."""
+        count = 0
+        for root, dirs, files in os.walk(top):
+            try:
+                wd = self.inotify.add_watch(root, WATCH_MASK)
+            except OSError as e:
+                if e.errno == errno.ENOSPC and not self._watch_limit_reported:
+                    print("Warning: inotify watch limit reached; raise fs.inotify.max_user_watches. "
+                          "Changes in unwatched directories are picked up by the next scan.")
+                    self._watch_limit_reported = True
+                elif e.errno != errno.ENOSPC:
+                    print(f"Warning: Could not watch {root}: {e}")
+                continue
+            self._paths[wd] = root
+            self._dropped.discard(wd)
+            count += 1
+        return count
+
+    def _forget_tree(self, top: str):
+        """Stop mapping the watches of a directory and its subdirectories to paths."""
+        prefix = os.path.join(top, '')
+        for wd, path in list(self._paths.items()):
+            if path == top or path.startswith(prefix):
+                del self._paths[wd]
+                self._dropped.add(wd)
+
+    def _handle(self, event: Event):
+        """Record what one event changed as pending."""
+        wd, mask, cookie, name = event
+
+        if mask & IN_Q_OVERFLOW:
+            print("Warning: inotify queue overflowed, rescanning the library")
+            self._new_dirs.add(self.directory_path)
+            return
+
+        directory = self._paths.get(wd)
+        if directory is None:
+            return  # Watch of a directory that went away
+        if mask & IN_IGNORED:
+            del self._paths[wd]
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            if directory == self.directory_path:
+                print(f"Library directory {directory} was removed or moved, stopping")
+                self.stopped = True
+            return
+
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._gone_dirs.discard(path)
+                self._new_dirs.add(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget_tree(path)
+                self._new_dirs.discard(path)
+                self._gone_dirs.add(path)
+        elif os.path.splitext(name)[1].lower() in database.AUDIO_EXTENSIONS:
+            self._files.add(path)
+
+    def _apply(self):
+        """
+        Apply the pending changes to the database.
+
+        If that fails, the changes are rolled back and kept pending, to be
+        applied again once the debounce delay has passed. Every step is
+        safe to repeat.
+
+        Raises:
+            Exception: Whatever applying the changes raised.
+        """
+        files, self._files = self._files, set()
+        new_dirs, self._new_dirs = self._new_dirs, set()
+        gone_dirs, self._gone_dirs = self._gone_dirs, set()
+        self._first_pending = None
+
+        try:
+            self._apply_changes(files, new_dirs, gone_dirs)
+        except Exception:
+            self.conn.rollback()
+            self._files |= files
+            self._new_dirs |= new_dirs
+            self._gone_dirs |= gone_dirs
+            self._first_pending = self._last_event = time.monotonic()
+            raise
+
+    def _apply_changes(self, files: Set[str], new_dirs: Set[str], gone_dirs: Set[str]):
+        """
+        Write one batch of changes to the database.
+
+        Args:
+            files: Audio files created, changed, moved or deleted.
+            new_dirs: Directories created or moved into the library.
+            gone_dirs: Directories deleted or moved out of the library.
+        """
+        # Watch new directories before scanning them, so nothing written
+        # meanwhile is missed; a directory moved within the library keeps
+        # its watch. Watches of directories moved away for good go.
+        new_dirs = sorted(path for path in new_dirs if os.path.isdir(path))
+        for path in new_dirs:
+            self._watch_tree(path)
+        for wd in self._dropped:
+            self.inotify.rm_watch(wd)
+        self._dropped.clear()
+
+        conn = self.conn
+        for path in gone_dirs:
+            database.mark_tree_unavailable(conn, path)
+        added, updated, moved, removed, errors = database.refresh_files(files, conn, jobs=self.jobs)
+        conn.commit()
+
+        # Scanned last, so songs of a directory moved here are matched to
+        # the songs its old location just marked unavailable
+        for path in new_dirs:
+            database.scan_directory(path, conn, jobs=self.jobs)
+
+        stamp = time.strftime('%H:%M:%S')
+        print(f"[{stamp}] {added} added, {updated} updated, {moved} moved, {removed} marked unavailable; "
+              f"{len(gone_dirs)} directories removed, {len(new_dirs)} scanned"
+              + (f"; {errors} errors" if errors else ""))
+
+    def run(self, stop_event: Optional[threading.Event] = None):
+        """
+        Watch the library until interrupted, stop_event is set or its directory goes away.
+
+        Args:
+            stop_event: Optional threading.Event that stops watching.
+        """
+        self.conn = database.create_database(self.db_path)
+        count = self._watch_tree(self.directory_path)
+        print(f"Watching {count} directories under {self.directory_path} (Ctrl+C to stop)")
+
+        try:
+            while not self.stopped and not (stop_event is not None and stop_event.is_set()):
+                now = time.monotonic()
+                if self._first_pending is None:
+                    timeout = IDLE_POLL_SECONDS
+                else:
+                    due = min(self._last_event + self.debounce, self._first_pending + self.max_delay)
+                    timeout = max(0.0, due - now)
+
+                events = self.inotify.read(timeout)
+                if events:
+                    now = time.monotonic()
+                    self._last_event = now
+                    if self._first_pending is None:
+                        self._first_pending = now
+                    for event in events:
+                        self._handle(event)
+                    if not (self._files or self._new_dirs or self._gone_dirs):
+                        self._first_pending = None  # Nothing that touches the library
+
+                if self._first_pending is not None and (
+                        now - self._last_event >= self.debounce
+                        or now - self._first_pending >= self.max_delay):
+                    try:
+                        self._apply()
+                    except Exception as e:
+                        print(f"Error applying library changes, retrying in {self.debounce:g}s: {e}")
+        finally:
+            self.inotify.close()
+            self.conn.close()
+
+
+def watch_directory(directory_path: str, db_path: str, jobs: int = 1,
+                    debounce: float = DEBOUNCE_SECONDS) -> bool:
+    """
+    Watch a library directory and keep its database current until interrupted.
+
+    Args:
+        directory_path: Library directory to watch.
+        db_path: Path to the library database.
+        jobs: Number of worker processes used to read files.
+        debounce: Quiet seconds before pending changes are applied.
+
+    Returns:
+        bool: False if watching couldn't start, True once it stops.
+    """
+    if not os.path.isdir(directory_path):
+        print(f"Error: '{directory_path}' is not a directory.")
+        return False
+
+    try:
+        watcher = LibraryWatcher(directory_path, db_path, jobs=jobs, debounce=debounce)
+    except OSError as e:
+        print(f"Error: Watch mode needs Linux inotify: {e}")
+        return False
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    return True
+
+
+def main():
+    """
+    Main function for command-line usage.
+
+    Returns:
+        int: Exit code (0 for success, 1 for failure)
+    """
+    parser = argparse.ArgumentParser(
+        description='Keep the library database current by watching the library directory',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Apply changes under ~/Music to the database as they happen
+  python library_watch.py ~/Music --db-path ~/music.db
+
+  # Catch up with changes made while nothing was watching, then watch
+  python database.py ~/Music --db-path ~/music.db --incremental --watch
+        """
+    )
+    parser.add_argument('directory', help='Library directory to watch')
+    parser.add_argument('--db-path', default='walrio_library.db',
+                        help='Path to database file (default: walrio_library.db)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Number of worker processes used to read audio files (default: 1)')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS,
+                        help=f'Quiet seconds before changes are applied (default: {DEBOUNCE_SECONDS:g})')
+
+    args = parser.parse_args()
+
+    return 0 if watch_directory(args.directory, args.db_path, jobs=args.jobs, debounce=args.debounce) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
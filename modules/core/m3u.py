@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+stream entries out of M3U/Extended M3U playlists without loading whole files
+"""
+import os
+import sys
+import argparse
+from typing import Iterator, Optional, Tuple
+
+
+class M3UEntry:
+    """
+    A single track reference read from an M3U playlist.
+
+    Attributes:
+        path: Absolute, normalized path of the track.
+        line: The path exactly as written in the playlist (stripped).
+        line_number: 0-based line number of the path in the playlist.
+        extinf: The preceding #EXTINF line as written, or None.
+        duration: Duration in seconds from #EXTINF, or None.
+        artist: Artist from "#EXTINF:duration,artist - title", or None.
+        title: Title from #EXTINF, or None.
+    """
+
+    __slots__ = ('path', 'line', 'line_number', 'extinf', 'duration', 'artist', 'title')
+
+    def __init__(self, path, line, line_number, extinf=None, duration=None, artist=None, title=None):
+        """
+        Initialize M3UEntry.
+
+        Args:
+            path: Absolute, normalized path of the track.
+            line: The path exactly as written in the playlist.
+            line_number: 0-based line number of the path in the playlist.
+            extinf: The preceding #EXTINF line, if any.
+            duration: Duration in seconds from #EXTINF.
+            artist: Artist from #EXTINF.
+            title: Title from #EXTINF.
+        """
+        self.path = path
+        self.line = line
+        self.line_number = line_number
+        self.extinf = extinf
+        self.duration = duration
+        self.artist = artist
+        self.title = title
+
+    def __repr__(self):
+        """
+        Return a debugging representation of the entry.
+
+        Returns:
+            str: The entry's path and line number.
+        """
+        return f"M3UEntry({self.path!r}, line_number={self.line_number})"
+
+
+def parse_extinf(line: str) -> Tuple[Optional[int], Optional[str], Optional[str]]:
+    """
+    Parse an "#EXTINF:duration,artist - title" line.
+
+    Args:
+        line: The #EXTINF line (stripped).
+
+    Returns:
+        tuple: (duration, artist, title); parts that are missing are None and
+               an unreadable duration is 0.
+    """
+    parts = line[8:].split(',', 1)
+    if len(parts) != 2:
+        return None, None, None
+
+    try:
+        duration = int(parts[0])
+    except ValueError:
+        duration = 0
+
+    # Try to parse artist - title
+    if ' - ' in parts[1]:
+        artist, title = parts[1].split(' - ', 1)
+        return duration, artist.strip(), title.strip()
+    return duration, None, parts[1].strip()
+
+
+def resolve_path(path: str, playlist_dir: str) -> str:
+    """
+    Resolve a playlist path the way every walrio module reads it.
+
+    Args:
+        path: Path as written in the playlist.
+        playlist_dir: Absolute directory containing the playlist.
+
+    Returns:
+        str: Absolute, normalized path (relative paths are relative to the playlist).
+    """
+    return os.path.normpath(os.path.join(playlist_dir, path))
+
+
+def iter_m3u_lines(playlist_path: str) -> Iterator[Tuple[str, Optional[M3UEntry]]]:
+    """
+    Stream every line of a playlist along with its parsed entry.
+
+    Useful for tools rewriting a playlist while keeping comments and
+    blank lines intact. The file is read line by line, so memory use does
+    not depend on the playlist size.
+
+    Args:
+        playlist_path: Path to the M3U playlist file.
+
+    Returns:
+        Iterator[Tuple[str, Optional[M3UEntry]]]: Generator over the playlist's lines.
+
+    Yields:
+        tuple: (line, entry) where line is the raw line including its newline
+               and entry is an M3UEntry for track lines, None for anything else.
+
+    Raises:
+        OSError: If the playlist can't be read.
+    """
+    playlist_dir = os.path.dirname(os.path.abspath(playlist_path))
+    extinf = None
+
+    with open(playlist_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f):
+            stripped = line.strip()
+
+            if not stripped or stripped.startswith('#'):
+                # EXTINF applies to the next track line
+                if stripped.startswith('#EXTINF:'):
+                    extinf = stripped
+                yield line, None
+                continue
+
+            if extinf:
+                duration, artist, title = parse_extinf(extinf)
+            else:
+                duration = artist = title = None
+
+            entry = M3UEntry(resolve_path(stripped, playlist_dir), stripped, line_number,
+                             extinf, duration, artist, title)
+            extinf = None
+            yield line, entry
+
+
+def iter_m3u_entries(playlist_path: str) -> Iterator[M3UEntry]:
+    """
+    Stream the track entries of an M3U/Extended M3U playlist.
+
+    Args:
+        playlist_path: Path to the M3U playlist file.
+
+    Returns:
+        Iterator[M3UEntry]: Generator over the playlist's track entries.
+
+    Yields:
+        M3UEntry: One entry per track line, in playlist order.
+
+    Raises:
+        OSError: If the playlist can't be read.
+    """
+    for _, entry in iter_m3u_lines(playlist_path):
+        if entry is not None:
+            yield entry
+
+
+def iter_m3u_paths(playlist_path: str) -> Iterator[str]:
+    """
+    Stream the resolved track paths of an M3U/Extended M3U playlist.
+
+    Args:
+        playlist_path: Path to the M3U playlist file.
+
+    Returns:
+        Iterator[str]: Generator over the playlist's track paths.
+
+    Yields:
+        str: Absolute, normalized path of each track, in playlist order.
+
+    Raises:
+        OSError: If the playlist can't be read.
+    """
+    for entry in iter_m3u_entries(playlist_path):
+        yield entry.path
+
+
+def main():
+    """
+    Main function for command-line usage.
+
+    Returns:
+        int: Exit code (0 for success, 1 for failure)
+    """
+    parser = argparse.ArgumentParser(
+        description='List the tracks referenced by M3U playlists',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Print the resolved path of every track
+  python m3u.py playlist.m3u
+
+  # Show only tracks whose files are missing
+  python m3u.py --missing playlists/*.m3u
+        """
+    )
+    parser.add_argument('playlists', nargs='+', help='M3U playlist files')
+    parser.add_argument('--missing', action='store_true', help='Only list tracks whose files do not exist')
+    parser.add_argument('--extinf', action='store_true', help='Show #EXTINF duration, artist and title')
+
+    args = parser.parse_args()
+
+    status = 0
+    for playlist_path in args.playlists:
+        try:
+            for entry in iter_m3u_entries(playlist_path):
+                if args.missing and os.path.exists(entry.path):
+                    continue
+                if args.extinf and entry.extinf:
+                    print(f"{entry.path}\t{entry.duration}\t{entry.artist or ''}\t{entry.title or ''}")
+                else:
+                    print(entry.path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error reading playlist '{playlist_path}': {e}", file=sys.stderr)
+            status = 1
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,13 @@ import logging
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 
+# Handle imports for both package and standalone execution
+try:
+    from . import metadata_cache
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from core import metadata_cache
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -65,7 +72,24 @@ class MetadataEditor:
     
     def get_metadata(self, filepath: str) -> Dict[str, Any]:
         """
-        Get all metadata from an audio file using mutagen library directly.
+        Get all metadata from an audio file.
+        
+        Results are served from the shared metadata cache while the file's
+        size and modification time are unchanged, and read with mutagen
+        otherwise.
+        
+        Args:
+            filepath (str): Path to the audio file to extract metadata from
+            
+        Returns:
+            Dict[str, Any]: Dictionary with standardized tag names and metadata values,
+                          or empty dict if extraction fails
+        """
+        return metadata_cache.get_or_load(str(filepath), 'mutagen', self._read_metadata) or {}
+    
+    def _read_metadata(self, filepath: str) -> Dict[str, Any]:
+        """
+        Read all metadata from an audio file using mutagen library directly.
         
         Args:
             filepath (str): Path to the audio file to extract metadata from
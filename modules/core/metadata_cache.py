@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+persistent on-disk cache of audio file metadata shared by all walrio modules
+"""
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger('MetadataCache')
+
+# Environment variable overriding the cache location ("off" disables caching)
+CACHE_ENV_VAR = 'WALRIO_METADATA_CACHE'
+
+# Values of CACHE_ENV_VAR that disable the cache
+DISABLED_VALUES = frozenset({'0', 'off', 'no', 'false', 'none'})
+
+# Seconds to wait for another process writing to the cache
+BUSY_TIMEOUT_MS = 5000
+
+
+def get_default_cache_path() -> Optional[str]:
+    """
+    Get the location of the shared metadata cache.
+
+    Uses $WALRIO_METADATA_CACHE if set, otherwise metadata_cache.db in
+    the user's cache directory ($XDG_CACHE_HOME/walrio or ~/.cache/walrio).
+
+    Returns:
+        Path to the cache database, or None if caching is disabled.
+    """
+    override = os.environ.get(CACHE_ENV_VAR)
+    if override is not None:
+        if override.strip().lower() in DISABLED_VALUES:
+            return None
+        return os.path.expanduser(override)
+
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'walrio', 'metadata_cache.db')
+
+
+class MetadataCache:
+    """
+    SQLite-backed metadata cache keyed by file path, size and mtime.
+
+    Each entry belongs to a namespace (e.g. 'mutagen' or 'ffprobe') so
+    different extractors can share the same file without clashing. An
+    entry is only returned while the file's size and modification time
+    still match, so edited files are re-read automatically.
+
+    Connections are opened per thread and per process, which makes the
+    cache safe to use from scan worker pools.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        """
+        Initialize MetadataCache.
+
+        Args:
+            cache_path: Path to the cache database (default: get_default_cache_path()).
+        """
+        self.cache_path = cache_path or get_default_cache_path()
+        self.enabled = self.cache_path is not None
+        self._local = threading.local()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Get this thread's connection, opening it on first use."""
+        if not self.enabled:
+            return None
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        try:
+            Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.cache_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS metadata_cache (
+                    path TEXT NOT NULL,
+                    namespace TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (path, namespace)
+                ) WITHOUT ROWID
+            ''')
+        except (sqlite3.Error, OSError) as e:
+            logger.debug(f"Metadata cache disabled ({self.cache_path}): {e}")
+            self.enabled = False
+            return None
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, filepath: str, namespace: str, stat: Optional[os.stat_result] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up cached metadata for a file.
+
+        Args:
+            filepath: Path to the audio file.
+            namespace: Extractor the data belongs to.
+            stat: Already known stat of the file (saves a stat call).
+
+        Returns:
+            The cached metadata dictionary, or None on a miss or stale entry.
+        """
+        conn = self._connect()
+        if conn is None:
+            return None
+
+        try:
+            if stat is None:
+                stat = os.stat(filepath)
+            row = conn.execute(
+                'SELECT size, mtime_ns, data FROM metadata_cache WHERE path = ? AND namespace = ?',
+                (os.path.abspath(filepath), namespace)
+            ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.debug(f"Metadata cache lookup failed for {filepath}: {e}")
+            return None
+
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return json.loads(row[2])
+
+    def put(self, filepath: str, namespace: str, data: Dict[str, Any],
+            stat: Optional[os.stat_result] = None):
+        """
+        Store metadata for a file, replacing any older entry.
+
+        Args:
+            filepath: Path to the audio file.
+            namespace: Extractor the data belongs to.
+            data: JSON-serializable metadata dictionary.
+            stat: Stat of the file taken before the metadata was read.
+        """
+        conn = self._connect()
+        if conn is None:
+            return
+
+        try:
+            if stat is None:
+                stat = os.stat(filepath)
+            conn.execute(
+                'INSERT OR REPLACE INTO metadata_cache (path, namespace, size, mtime_ns, data) VALUES (?, ?, ?, ?, ?)',
+                (os.path.abspath(filepath), namespace, stat.st_size, stat.st_mtime_ns, json.dumps(data))
+            )
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            logger.debug(f"Metadata cache store failed for {filepath}: {e}")
+
+    def get_or_load(self, filepath: str, namespace: str,
+                    loader: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Return cached metadata, reading and caching it with loader on a miss.
+
+        Empty or None results are returned but not cached, so files that
+        failed to parse are retried next time.
+
+        Args:
+            filepath: Path to the audio file.
+            namespace: Extractor the data belongs to.
+            loader: Function reading the metadata from the file.
+
+        Returns:
+            Metadata dictionary as returned by loader.
+        """
+        if not self.enabled:
+            return loader(filepath)
+
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return loader(filepath)
+
+        data = self.get(filepath, namespace, stat)
+        if data is not None:
+            return data
+
+        data = loader(filepath)
+        if data:
+            self.put(filepath, namespace, data, stat)
+        return data
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Count cached entries per namespace.
+
+        Returns:
+            Dictionary mapping namespace to number of entries.
+        """
+        conn = self._connect()
+        if conn is None:
+            return {}
+        return dict(conn.execute('SELECT namespace, COUNT(*) FROM metadata_cache GROUP BY namespace').fetchall())
+
+    def prune(self) -> int:
+        """
+        Remove entries whose files no longer exist or have changed.
+
+        Returns:
+            Number of entries removed.
+        """
+        conn = self._connect()
+        if conn is None:
+            return 0
+
+        stale = []
+        for path, namespace, size, mtime_ns in conn.execute('SELECT path, namespace, size, mtime_ns FROM metadata_cache'):
+            try:
+                stat = os.stat(path)
+                if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+                    continue
+            except OSError:
+                pass
+            stale.append((path, namespace))
+
+        conn.execute('BEGIN')
+        conn.executemany('DELETE FROM metadata_cache WHERE path = ? AND namespace = ?', stale)
+        conn.execute('COMMIT')
+        return len(stale)
+
+    def clear(self):
+        """Remove every cached entry."""
+        conn = self._connect()
+        if conn is not None:
+            conn.execute('DELETE FROM metadata_cache')
+            conn.execute('VACUUM')
+
+
+# Global instance for convenience functions - lazy initialization
+_cache = None
+
+def get_cache() -> MetadataCache:
+    """
+    Get or create the global MetadataCache instance.
+
+    Returns:
+        MetadataCache: The shared cache.
+    """
+    global _cache
+    if _cache is None:
+        _cache = MetadataCache()
+    return _cache
+
+def get_or_load(filepath: str, namespace: str,
+                loader: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    Convenience function to read metadata through the shared cache.
+
+    Args:
+        filepath: Path to the audio file.
+        namespace: Extractor the data belongs to (e.g. 'mutagen', 'ffprobe').
+        loader: Function reading the metadata from the file on a cache miss.
+
+    Returns:
+        Metadata dictionary as returned by loader.
+    """
+    return get_cache().get_or_load(filepath, namespace, loader)
+
+
+def main():
+    """
+    Main function for command-line usage.
+
+    Returns:
+        int: Exit code (0 for success, 1 for failure)
+    """
+    parser = argparse.ArgumentParser(
+        description='Inspect and maintain the shared metadata cache',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+Examples:
+  # Show cache location and entry counts
+  python metadata_cache.py --stats
+
+  # Drop entries for deleted or modified files
+  python metadata_cache.py --prune
+
+  # Empty the cache
+  python metadata_cache.py --clear
+
+Set {CACHE_ENV_VAR} to another path to relocate the cache, or to "off" to disable it.
+        """
+    )
+    parser.add_argument('--cache-path', help='Path to the cache database (default: user cache directory)')
+    parser.add_argument('--stats', action='store_true', help='Show cache location and entry counts')
+    parser.add_argument('--prune', action='store_true', help='Remove entries for missing or changed files')
+    parser.add_argument('--clear', action='store_true', help='Remove all entries')
+
+    args = parser.parse_args()
+
+    cache = MetadataCache(args.cache_path)
+    if not cache.enabled:
+        print(f"Metadata cache is disabled ({CACHE_ENV_VAR}={os.environ.get(CACHE_ENV_VAR)})")
+        return 1
+
+    if args.clear:
+        cache.clear()
+        print("Metadata cache cleared")
+    elif args.prune:
+        print(f"Removed {cache.prune()} stale entries")
+    elif args.stats:
+        stats = cache.get_stats()
+        print(f"Cache: {cache.cache_path}")
+        if not stats:
+            print("No entries")
+        for namespace, count in sorted(stats.items()):
+            print(f"  {namespace}: {count} entries")
+    else:
+        parser.print_help()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
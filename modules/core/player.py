@@ -10,6 +10,14 @@ import threading
 import time
 import socket
 import tempfile
+from collections import deque
+
+# Run as a script, core/queue.py would shadow the standard library queue module
+if not __package__:
+    import _standalone
+    _standalone.setup_path()
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 # Try to import GStreamer - it's optional for non-playback operations
 try:
@@ -23,6 +31,23 @@ except (ImportError, AttributeError, ValueError):
     GLib = None
     GSTREAMER_AVAILABLE = False
 
+# Daemon protocol limits
+READ_CHUNK_BYTES = 4096
+MAX_REQUEST_BYTES = 65536
+
+# Events where only the newest one matters; older unsent ones are replaced
+COALESCED_EVENTS = frozenset({'position'})
+
+# Unsent lifecycle events a subscriber may fall behind before it is disconnected
+MAX_PENDING_EVENTS = 256
+
+# Seconds between position events while playing
+POSITION_EVENT_INTERVAL = 1.0
+
+# Daemon commands that wait for GStreamer state changes or read the file's
+# metadata; they run on a worker thread so the event loop keeps serving clients
+BLOCKING_COMMANDS = frozenset({'play', 'stop', 'load', 'quit'})
+
 
 def _init_gstreamer():
     """Initialize GStreamer if not already initialized."""
@@ -32,6 +57,109 @@ def _init_gstreamer():
         Gst.init(None)
 
 
+def _describe_state(state):
+    """Get a one-word status (Finished/Playing/Paused/Stopped) from get_state() output."""
+    if state['is_finished']:
+        return 'Finished'
+    elif state['is_playing']:
+        return 'Playing'
+    elif state['is_paused']:
+        return 'Paused'
+    return 'Stopped'
+
+
+class EventSubscriber:
+    """
+    Bounded, non-blocking event buffer for one daemon subscriber.
+    
+    Events are queued by push() and written by a task of their own, so a
+    slow client never holds up playback or other subscribers. Coalesced
+    events (position updates) keep only the newest unsent one. Lifecycle
+    events (song_starting, song_finished, ...) are never dropped; a client
+    falling more than MAX_PENDING_EVENTS of them behind is disconnected
+    instead of buffering without limit.
+    
+    Once a connection has subscribed, its responses are queued here too, so
+    this task is the only one writing to it (asyncio streams allow a single
+    drain() at a time). Unsubscribing stops the events but keeps the task.
+    """
+    
+    def __init__(self, writer, max_pending=MAX_PENDING_EVENTS):
+        """
+        Start the sender task for a subscriber (call on the daemon event loop).
+        
+        Args:
+            writer: asyncio StreamWriter of the subscribed connection.
+            max_pending: Maximum number of queued lifecycle events.
+        """
+        self.writer = writer
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.latest = {}
+        self.ready = asyncio.Event()
+        self.flushed = asyncio.Event()  # Set while nothing but coalesced events is unsent
+        self.flushed.set()
+        self.subscribed = True
+        self.finishing = False
+        self.task = asyncio.get_running_loop().create_task(self._send_loop())
+    
+    def push(self, event_type, message):
+        """
+        Queue an encoded event or response without blocking.
+        
+        Args:
+            event_type: Event name, used to pick the buffering policy (None for responses).
+            message: Encoded event or response line.
+            
+        Returns:
+            bool: False if the subscriber fell too far behind and was dropped.
+        """
+        if event_type in COALESCED_EVENTS:
+            self.latest[event_type] = message
+        elif event_type is not None and len(self.pending) >= self.max_pending:
+            self.close()
+            return False
+        else:
+            # Responses aren't limited: the connection's reader waits for them to flush
+            self.pending.append(message)
+            self.flushed.clear()
+        
+        self.ready.set()
+        return True
+    
+    async def _send_loop(self):
+        """Write queued messages as fast as the client reads them."""
+        try:
+            while not self.finishing:
+                await self.ready.wait()
+                self.ready.clear()
+                
+                while self.pending or self.latest:
+                    if self.pending:
+                        message = self.pending.popleft()
+                    else:
+                        _, message = self.latest.popitem()
+                    self.writer.write(message)
+                    await self.writer.drain()
+                    if not self.pending:
+                        self.flushed.set()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.flushed.set()
+    
+    async def finish(self):
+        """Wait until everything queued has been sent, then stop the task."""
+        self.finishing = True
+        self.ready.set()
+        await asyncio.wait([self.task])
+    
+    def close(self):
+        """Stop sending and close the connection."""
+        self.task.cancel()
+        self.writer.close()
+
+
 class AudioPlayer:
     """GStreamer-based audio player with real-time control."""
     
@@ -49,6 +177,8 @@ class AudioPlayer:
         self.pipeline = None
         self.bus = None
         self.bus_watch_thread = None
+        self.main_loop = None
+        self.state_condition = threading.Condition()
         self.current_file = None
         self.is_playing = False
         self.is_paused = False
@@ -59,23 +189,60 @@ class AudioPlayer:
         self.repeat_count = 0
         self.should_quit = False
         self.interactive_mode = False
-        self.event_listeners = []
+        self.event_listeners = {}
+        self.daemon_loop = None
+        self.command_executor = None
+        self.next_track_callback = None
+        self.pending_file = None
+        self.pending_duration = 0
     
     def _log(self, message):
         """Log debug messages if debug mode is enabled."""
         if self.debug:
             print(f"DEBUG: {message}")
     
-    def _bus_watch_loop(self):
-        """Poll the bus for messages in a background thread."""
-        while not self.should_quit and self.pipeline:
-            if self.bus:
-                # Poll for messages with 100ms timeout
-                message = self.bus.timed_pop(100000000)  # 100ms in nanoseconds
-                if message:
-                    self._process_bus_message(message)
-            else:
-                time.sleep(0.1)
+    def _on_bus_message(self, bus, message):
+        """Dispatch a bus message delivered by the GLib main loop."""
+        self._process_bus_message(message)
+    
+    def _notify_state(self):
+        """Wake up every thread waiting in wait_until()."""
+        with self.state_condition:
+            self.state_condition.notify_all()
+        
+        if self.daemon_loop:
+            try:
+                self.daemon_loop.call_soon_threadsafe(self._update_playing_event)
+            except RuntimeError:
+                # Event loop already closed
+                pass
+    
+    def wake(self):
+        """
+        Wake up threads blocked in wait_until() so they re-check their condition.
+        
+        Call this after changing state the player doesn't know about, such as
+        flags that a waiting playback thread also watches.
+        """
+        self._notify_state()
+    
+    def wait_until(self, predicate, timeout=None):
+        """
+        Block until predicate() is true.
+        
+        The predicate is re-checked whenever the player state changes (song
+        finished, track switched, play/pause/stop, load) or wake() is called,
+        so no polling is needed.
+        
+        Args:
+            predicate: Function returning True when waiting should stop.
+            timeout: Maximum number of seconds to wait (default: no limit).
+            
+        Returns:
+            The last result of predicate().
+        """
+        with self.state_condition:
+            return self.state_condition.wait_for(predicate, timeout)
     
     def _process_bus_message(self, message):
         """Process a GStreamer bus message."""
@@ -83,6 +250,9 @@ class AudioPlayer:
         
         if msg_type == Gst.MessageType.EOS:
             self._handle_eos()
+        elif msg_type == Gst.MessageType.STREAM_START:
+            if self.pending_file:
+                self._handle_track_change()
         elif msg_type == Gst.MessageType.ERROR:
             err, debug_info = message.parse_error()
             print(f"Error: {err.message}")
@@ -127,10 +297,76 @@ class AudioPlayer:
             # Mark as finished but don't stop the pipeline yet (allows position queries)
             self.is_playing = False
             self.is_finished = True
+            self._notify_state()
             print("Playback finished")
             if self.interactive_mode:
                 print("player> ", end="", flush=True)
     
+    def _on_about_to_finish(self, playbin):
+        """
+        Hand the next track to the running playbin for gapless playback.
+        
+        Called from a GStreamer streaming thread when the current track has
+        been read completely. Looping the current song is left to the EOS
+        handler.
+        
+        Args:
+            playbin: The playbin element emitting the signal.
+        """
+        if not self.next_track_callback or self.should_quit or self.loop_mode != 'none':
+            return
+        
+        next_track = self.next_track_callback()
+        if not next_track:
+            return
+        
+        # The callback already checked the file; no I/O on the streaming thread
+        next_file, duration = next_track
+        absolute_path = os.path.abspath(next_file)
+        self.pending_duration = duration or 0
+        self.pending_file = absolute_path
+        playbin.set_property("uri", f"file://{absolute_path}")
+        self._log(f"Queued next track: {absolute_path}")
+    
+    def _handle_track_change(self):
+        """Switch the player state over to the gaplessly queued track."""
+        self._send_event("song_finished", {
+            "file": self.current_file,
+            "repeat_count": self.repeat_count,
+            "loop_mode": self.loop_mode
+        })
+        
+        self.current_file = self.pending_file
+        self.duration = self.pending_duration
+        self.pending_file = None
+        if not self.duration:
+            # Length unknown to the queue; ask the stream instead of reading the file
+            self.get_duration()
+        self.repeat_count = 0
+        self._log(f"Gapless switch to: {self.current_file}")
+        self._notify_state()
+        
+        self._send_event("song_starting", {
+            "file": self.current_file,
+            "duration": self.duration,
+            "seek_position": 0,
+            "is_repeat": False
+        })
+    
+    def set_next_track_callback(self, callback):
+        """
+        Enable gapless playback.
+        
+        Args:
+            callback: Function called shortly before the current track ends.
+                It returns (path, duration) of the track to play next, with
+                duration 0 if unknown, or None to let playback finish
+                normally. The file must already be known to exist. It runs on
+                a GStreamer streaming thread and must not block or do file
+                I/O. Pass None to disable gapless playback.
+        """
+        self.next_track_callback = callback
+    
     def load_file(self, filepath):
         """Load an audio file for playback."""
         absolute_path = os.path.abspath(filepath)
@@ -139,24 +375,36 @@ class AudioPlayer:
             return False
         
         if self.pipeline:
-            self.stop()
+            # Reuse the existing playbin instead of building a new pipeline per track
+            self.pipeline.set_state(Gst.State.NULL)
+            self.is_playing = False
+            self.is_paused = False
+            self.is_finished = False
+        else:
+            self.pipeline = Gst.ElementFactory.make("playbin", None)
+            
+            if not self.pipeline:
+                print("ERROR: Failed to create playbin element!")
+                return False
+            
+            self.pipeline.connect("about-to-finish", self._on_about_to_finish)
         
         self.current_file = absolute_path
-        self.pipeline = Gst.ElementFactory.make("playbin", None)
-        
-        if not self.pipeline:
-            print("ERROR: Failed to create playbin element!")
-            return False
-        
+        self.pending_file = None
         self.pipeline.set_property("uri", f"file://{absolute_path}")
         self.pipeline.set_property("volume", self.volume_value)
         
-        # Setup bus message handling with polling thread
-        self.bus = self.pipeline.get_bus()
+        # Bus messages are dispatched by a GLib main loop in a background thread
+        if self.bus is None:
+            self.bus = self.pipeline.get_bus()
+            self.bus.add_signal_watch()
+            self.bus.connect("message", self._on_bus_message)
         if not self.bus_watch_thread or not self.bus_watch_thread.is_alive():
-            self.bus_watch_thread = threading.Thread(target=self._bus_watch_loop, daemon=True)
+            self.main_loop = GLib.MainLoop()
+            self.bus_watch_thread = threading.Thread(target=self.main_loop.run, daemon=True)
             self.bus_watch_thread.start()
         
+        self._notify_state()
         self.duration = self._get_file_duration(absolute_path)
         print(f"Loaded: {filepath}")
         if self.duration > 0:
@@ -186,6 +434,7 @@ class AudioPlayer:
         self.pipeline.set_state(Gst.State.PLAYING)
         self.is_playing = True
         self.is_paused = False
+        self._notify_state()
         
         if seek_position is not None:
             self.seek(seek_position)
@@ -212,6 +461,7 @@ class AudioPlayer:
         self.pipeline.set_state(Gst.State.PAUSED)
         self.is_playing = False
         self.is_paused = True
+        self._notify_state()
         print("Playback paused")
         return True
     
@@ -224,19 +474,21 @@ class AudioPlayer:
         self.pipeline.set_state(Gst.State.PLAYING)
         self.is_playing = True
         self.is_paused = False
+        self._notify_state()
         print("Playback resumed")
         return True
     
     def stop(self):
         """Stop playback."""
         if self.pipeline:
+            # Keep the playbin around so the next load_file() can reuse it
             self.pipeline.set_state(Gst.State.NULL)
-            self.pipeline = None
-            self.bus = None
         
+        self.pending_file = None
         self.is_playing = False
         self.is_paused = False
         self.is_finished = False
+        self._notify_state()
         print("Playback stopped")
         return True
     
@@ -415,14 +667,7 @@ class AudioPlayer:
     def _print_status(self):
         """Print current player status."""
         state = self.get_state()
-        if state['is_finished']:
-            status_str = 'Finished'
-        elif state['is_playing']:
-            status_str = 'Playing'
-        elif state['is_paused']:
-            status_str = 'Paused'
-        else:
-            status_str = 'Stopped'
+        status_str = _describe_state(state)
         
         print(f"File: {state['current_file'] or 'None'}")
         print(f"Status: {status_str}")
@@ -443,67 +688,302 @@ class AudioPlayer:
         if os.path.exists(self.socket_path):
             os.unlink(self.socket_path)
         
-        self.daemon_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self.daemon_socket.bind(self.socket_path)
-        self.daemon_socket.listen(5)
+        try:
+            asyncio.run(self._serve_daemon())
+        except KeyboardInterrupt:
+            print("\nStopping daemon...")
+        finally:
+            self._cleanup_daemon()
+    
+    async def _serve_daemon(self):
+        """Serve all daemon clients from a single asyncio event loop."""
+        self.daemon_loop = asyncio.get_running_loop()
+        # One worker, so blocking commands from different clients still run one at a time
+        self.command_executor = ThreadPoolExecutor(max_workers=1)
+        stop_event = asyncio.Event()
         
+        def wait_for_quit():
+            """Wait for should_quit off the event loop and stop the server."""
+            self.wait_until(lambda: self.should_quit)
+            self.daemon_loop.call_soon_threadsafe(stop_event.set)
+        
+        # Quit can also come from other threads (e.g. the bus), so watch the player state
+        threading.Thread(target=wait_for_quit, daemon=True).start()
+        
+        self.playing_event = asyncio.Event()
+        self._update_playing_event()
+        ticker = asyncio.create_task(self._position_ticker())
+        
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path,
+                                                 limit=MAX_REQUEST_BYTES)
         print(f"Daemon mode started. Socket: {self.socket_path}")
         
-        command_thread = threading.Thread(target=self._command_server, daemon=True)
-        command_thread.start()
+        try:
+            async with server:
+                await stop_event.wait()
+        finally:
+            self.daemon_loop = None
+            self.command_executor.shutdown(wait=False)
+            ticker.cancel()
+            for subscriber in list(self.event_listeners.values()):
+                subscriber.close()
+            self.event_listeners.clear()
+    
+    def _update_playing_event(self):
+        """Mirror is_playing into the daemon's asyncio event (runs on the event loop)."""
+        if self.is_playing:
+            self.playing_event.set()
+        else:
+            self.playing_event.clear()
+    
+    async def _position_ticker(self):
+        """Send position events to subscribers while playing; sleeps while stopped."""
+        while True:
+            await self.playing_event.wait()
+            await asyncio.sleep(POSITION_EVENT_INTERVAL)
+            if self.is_playing and self.event_listeners:
+                self._send_event("position", {
+                    "file": self.current_file,
+                    "position": self.get_position(),
+                    "duration": self.duration
+                })
+    
+    async def _handle_client(self, reader, writer):
+        """
+        Serve one client connection.
+        
+        Lines starting with '{' are JSON requests; any number of them can be
+        sent on one connection without waiting for the responses, which come
+        back in order, tagged with the request id. Anything else is a legacy
+        text command: it is answered in the old format and the connection is
+        closed (except for 'subscribe', which keeps it open for events).
         
+        Args:
+            reader: asyncio StreamReader of the connection.
+            writer: asyncio StreamWriter of the connection.
+        """
+        buffer = b''
+        first_chunk = True
         try:
             while not self.should_quit:
-                time.sleep(0.1)
-        except KeyboardInterrupt:
-            print("\nStopping daemon...")
+                data = await reader.read(READ_CHUNK_BYTES)
+                if not data:
+                    break
+                
+                buffer += data
+                *lines, buffer = buffer.split(b'\n')
+                
+                # Legacy clients send a single command without a newline and wait for the reply
+                if first_chunk and not lines and not buffer.lstrip().startswith(b'{'):
+                    lines, buffer = [buffer], b''
+                first_chunk = False
+                
+                if len(buffer) > MAX_REQUEST_BYTES:
+                    self._send_to_client(writer, self._encode_response(
+                        None, {"ok": False, "error": "Request too large"}))
+                    break
+                
+                for line in lines:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    
+                    if line.startswith(b'{'):
+                        self._send_to_client(writer, await self._handle_json_request(line, writer))
+                        continue
+                    
+                    command = line.decode('utf-8', errors='replace')
+                    if command.lower() == 'subscribe':
+                        self._set_subscribed(writer, True)
+                        self._send_to_client(writer, b"OK: Subscribed to events\n")
+                        continue
+                    
+                    response = await asyncio.get_running_loop().run_in_executor(
+                        self.command_executor, self._process_daemon_command, command)
+                    self._send_to_client(writer, response.encode('utf-8'))
+                    await self._drain_client(writer, closing=True)
+                    return
+                
+                await self._drain_client(writer)
+            
+            await self._drain_client(writer, closing=True)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self._log(f"Connection error: {e}")
+        except asyncio.CancelledError:
+            # Daemon shutting down with the client still connected
+            pass
         finally:
-            self._cleanup_daemon()
+            subscriber = self.event_listeners.pop(writer, None)
+            if subscriber is not None:
+                subscriber.task.cancel()
+            writer.close()
     
-    def _command_server(self):
-        """Handle incoming commands in daemon mode."""
-        while not self.should_quit:
-            try:
-                self.daemon_socket.settimeout(0.5)
-                try:
-                    conn, _ = self.daemon_socket.accept()
-                except socket.timeout:
-                    continue
-                
-                threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
-            except Exception as e:
-                if not self.should_quit:
-                    self._log(f"Error in command server: {e}")
-                break
+    def _send_to_client(self, writer, message):
+        """
+        Send a message to a client without waiting for it to be written.
+        
+        Args:
+            writer: StreamWriter of the client.
+            message: Encoded message line.
+        """
+        subscriber = self.event_listeners.get(writer)
+        if subscriber is None:
+            writer.write(message)
+        else:
+            subscriber.push(None, message)
+    
+    async def _drain_client(self, writer, closing=False):
+        """
+        Wait until a client has taken what was sent to it.
+        
+        A subscribed connection is drained by its EventSubscriber task alone,
+        so this waits for the task to send the queued responses and events
+        instead (or to finish, when the connection is about to close).
+        
+        Args:
+            writer: StreamWriter of the client.
+            closing: Flush everything queued before the connection is closed.
+        """
+        subscriber = self.event_listeners.get(writer)
+        if subscriber is None:
+            await writer.drain()
+        elif closing:
+            await subscriber.finish()
+        else:
+            await subscriber.flushed.wait()
+    
+    def _encode_response(self, request_id, response):
+        """Frame a JSON response as a single line."""
+        return (json.dumps({"type": "response", "id": request_id, **response}) + "\n").encode('utf-8')
     
-    def _handle_connection(self, conn):
-        """Handle a single client connection."""
-        is_subscription = False
+    async def _handle_json_request(self, line, writer):
+        """
+        Execute a JSON request and return the encoded response line.
+        
+        A request is {"id": 1, "cmd": "seek", "args": [30]} or a batch
+        {"id": 2, "batch": [{"cmd": "load", "args": ["song.flac"]}, {"cmd": "play"}]}.
+        Batch commands run in order and stop at the first failure.
+        
+        Args:
+            line: Raw request line.
+            writer: StreamWriter of the requesting client.
+            
+        Returns:
+            bytes: The response line.
+        """
         try:
-            data = conn.recv(1024).decode('utf-8').strip()
-            if not data:
-                return
+            request = json.loads(line)
+        except ValueError as e:
+            return self._encode_response(None, {"ok": False, "error": f"Invalid JSON: {e}"})
+        
+        if not isinstance(request, dict):
+            return self._encode_response(None, {"ok": False, "error": "Request must be a JSON object"})
+        
+        request_id = request.get('id')
+        batch = request.get('batch')
+        if batch is None:
+            return self._encode_response(request_id, await self._execute_command(request, writer))
+        
+        if not isinstance(batch, list):
+            return self._encode_response(request_id, {"ok": False, "error": "batch must be a list"})
+        
+        results = []
+        for command in batch:
+            result = await self._execute_command(command, writer)
+            results.append(result)
+            if not result['ok']:
+                break
+        
+        ok = len(results) == len(batch) and all(result['ok'] for result in results)
+        return self._encode_response(request_id, {"ok": ok, "results": results})
+    
+    async def _execute_command(self, command, writer=None):
+        """
+        Execute one structured daemon command.
+        
+        Commands in BLOCKING_COMMANDS run on the command executor, the rest
+        directly on the event loop.
+        
+        Args:
+            command: Dict with 'cmd' and optional 'args' list.
+            writer: StreamWriter of the requesting client (for subscribe).
             
-            if data.lower() == 'subscribe':
-                is_subscription = True
-                self.event_listeners.append(conn)
-                conn.send(b"OK: Subscribed to events\n")
-                while not self.should_quit:
-                    time.sleep(0.1)
+        Returns:
+            dict: {"ok": True, "result": value} or {"ok": False, "error": message}.
+        """
+        if not isinstance(command, dict):
+            return {"ok": False, "error": "Command must be a JSON object"}
+        
+        cmd = str(command.get('cmd', '')).lower()
+        args = command.get('args', [])
+        if not isinstance(args, list):
+            args = [args]
+        
+        commands = {
+            'play': lambda: self.resume() if self.is_paused else self.play(),
+            'pause': self.pause,
+            'resume': self.resume,
+            'stop': self.stop,
+            'status': self.get_state,
+            'position': self.get_position,
+            'duration': self.get_duration,
+            'volume': lambda: self.set_volume(float(args[0])) if args else self.get_volume(),
+            'seek': lambda: self.seek(float(args[0])),
+            'loop': lambda: self.set_loop_mode(str(args[0])) if args else self.get_loop_mode(),
+            'load': lambda: self._load_from_daemon(str(args[0])),
+            'quit': self._quit_from_daemon,
+            'subscribe': lambda: self._set_subscribed(writer, True),
+            'unsubscribe': lambda: self._set_subscribed(writer, False),
+            'ping': lambda: "pong",
+        }
+        
+        if cmd not in commands:
+            return {"ok": False, "error": f"Unknown command '{cmd}'"}
+        
+        try:
+            if cmd in BLOCKING_COMMANDS:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.command_executor, commands[cmd])
             else:
-                response = self._process_daemon_command(data)
-                conn.send(response.encode('utf-8'))
+                result = commands[cmd]()
+        except IndexError:
+            return {"ok": False, "error": f"Missing argument for '{cmd}'"}
+        except (ValueError, TypeError) as e:
+            return {"ok": False, "error": f"Invalid argument for '{cmd}': {e}"}
         except Exception as e:
-            if not self.should_quit:
-                self._log(f"Connection error: {e}")
-        finally:
-            if not is_subscription:
-                if conn in self.event_listeners:
-                    self.event_listeners.remove(conn)
-                try:
-                    conn.close()
-                except:
-                    pass
+            return {"ok": False, "error": str(e)}
+        
+        if result is False:
+            return {"ok": False, "error": f"Failed to {cmd}"}
+        return {"ok": True, "result": result}
+    
+    def _load_from_daemon(self, filepath):
+        """Load a file on behalf of a daemon client."""
+        self.stop()
+        if not self.load_file(filepath):
+            return False
+        self._send_event("song_loaded", {"file": filepath})
+        return True
+    
+    def _quit_from_daemon(self):
+        """Stop playback and shut the daemon down."""
+        self.should_quit = True
+        self.stop()
+        return True
+    
+    def _set_subscribed(self, writer, subscribed):
+        """Add or remove a client connection from the event listeners."""
+        if writer is None:
+            return False
+        subscriber = self.event_listeners.get(writer)
+        if subscriber is None:
+            if subscribed:
+                self.event_listeners[writer] = EventSubscriber(writer)
+        else:
+            # The subscriber task stays the connection's only writer
+            subscriber.subscribed = subscribed
+            subscriber.latest.clear()
+        return True
     
     def _process_daemon_command(self, command):
         """Process a daemon command and return response."""
@@ -529,18 +1009,9 @@ class AudioPlayer:
                 result = commands[cmd]()
                 return f"OK: {cmd.title()}" if result else f"ERROR: Failed to {cmd}"
             elif cmd == 'status':
-                if self.is_finished:
-                    status = 'Finished'
-                elif self.is_playing:
-                    status = 'Playing'
-                elif self.is_paused:
-                    status = 'Paused'
-                else:
-                    status = 'Stopped'
-                return f"OK: {status}"
+                return f"OK: {_describe_state(self.get_state())}"
             elif cmd == 'quit':
-                self.should_quit = True
-                self.stop()
+                self._quit_from_daemon()
                 return "OK: Quitting"
             elif cmd == 'volume' and len(parts) > 1:
                 try:
@@ -563,10 +1034,7 @@ class AudioPlayer:
                 return f"OK: Loop mode set to {parts[1]}" if result else "ERROR: Failed to set loop mode"
             elif cmd == 'load' and len(parts) > 1:
                 filepath = ' '.join(parts[1:])
-                self.stop()
-                result = self.load_file(filepath)
-                if result:
-                    self._send_event("song_loaded", {"file": filepath})
+                if self._load_from_daemon(filepath):
                     return f"OK: Loaded {filepath}"
                 return f"ERROR: Failed to load {filepath}"
             elif cmd == 'subscribe':
@@ -579,8 +1047,8 @@ class AudioPlayer:
     def _cleanup_daemon(self):
         """Clean up daemon resources."""
         try:
-            if hasattr(self, 'daemon_socket'):
-                self.daemon_socket.close()
+            if self.main_loop:
+                self.main_loop.quit()
             if hasattr(self, 'socket_path') and os.path.exists(self.socket_path):
                 os.unlink(self.socket_path)
         except Exception as e:
@@ -588,7 +1056,7 @@ class AudioPlayer:
     
     def _send_event(self, event_type, data):
         """Send an event to all registered listeners."""
-        if not self.event_listeners:
+        if not self.event_listeners or not self.daemon_loop:
             return
         
         event_message = json.dumps({
@@ -598,19 +1066,22 @@ class AudioPlayer:
             "timestamp": time.time()
         }) + "\n"
         
-        dead_listeners = []
-        for listener in self.event_listeners:
-            try:
-                listener.send(event_message.encode('utf-8'))
-            except Exception:
-                dead_listeners.append(listener)
-        
-        for dead in dead_listeners:
-            self.event_listeners.remove(dead)
-            try:
-                dead.close()
-            except:
-                pass
+        # Events come from GStreamer and playback threads; sockets belong to the event loop
+        try:
+            self.daemon_loop.call_soon_threadsafe(self._broadcast_event, event_type,
+                                                  event_message.encode('utf-8'))
+        except RuntimeError:
+            # Event loop already closed
+            pass
+    
+    def _broadcast_event(self, event_type, message):
+        """Queue an encoded event for every subscriber (runs on the daemon event loop)."""
+        for writer, subscriber in list(self.event_listeners.items()):
+            if not subscriber.subscribed:
+                continue
+            if writer.is_closing() or not subscriber.push(event_type, message):
+                self.event_listeners.pop(writer, None)
+                subscriber.close()
     
     def _get_file_duration(self, filepath):
         """Get the duration of an audio file using metadata module."""
@@ -653,8 +1124,7 @@ def play_audio(filepath, debug=False):
             return False
         
         try:
-            while player.is_playing and not player.should_quit:
-                time.sleep(0.1)
+            player.wait_until(lambda: not player.is_playing or player.should_quit)
         except KeyboardInterrupt:
             print("\nPlayback interrupted by user.")
         finally:
@@ -666,15 +1136,12 @@ def play_audio(filepath, debug=False):
         return False
 
 
-def send_daemon_command(command):
+def find_daemon_socket():
     """
-    Send a command to a running daemon instance.
+    Find the socket of the most recently started daemon instance.
     
-    Args:
-        command: Command string to send to the daemon.
-        
     Returns:
-        True if command was sent successfully, False otherwise.
+        Path to the daemon socket, or None if no daemon is running.
     """
     temp_dir = tempfile.gettempdir()
     socket_files = [
@@ -684,22 +1151,198 @@ def send_daemon_command(command):
     ]
     
     if not socket_files:
-        print("Error: No running daemon instance found")
+        return None
+    return max(socket_files, key=lambda x: x[1])[0]
+
+
+class DaemonClient:
+    """
+    Persistent connection to a player daemon using the JSON-lines protocol.
+    
+    Requests can be pipelined with send() and collected later with
+    receive(); request() and batch() send and wait in one call. Events
+    received while waiting (after subscribing) are collected in self.events.
+    """
+    
+    def __init__(self, socket_path=None):
+        """
+        Connect to a player daemon.
+        
+        Args:
+            socket_path: Daemon socket (default: the newest running daemon).
+            
+        Raises:
+            ConnectionError: If no daemon is running or it can't be reached.
+        """
+        self.socket_path = socket_path or find_daemon_socket()
+        if not self.socket_path:
+            raise ConnectionError("No running daemon instance found")
+        
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+        self.reader = self.sock.makefile('rb')
+        self.next_id = 1
+        self.responses = {}
+        self.events = []
+    
+    def send(self, cmd, *args):
+        """
+        Send a command without waiting for its response.
+        
+        Args:
+            cmd: Command name (e.g. 'play', 'seek', 'status').
+            *args: Command arguments.
+            
+        Returns:
+            int: Request id to pass to receive().
+        """
+        return self._send({"cmd": cmd, "args": list(args)})
+    
+    def send_batch(self, commands):
+        """
+        Send several commands to run back to back, without waiting.
+        
+        Args:
+            commands: Sequence of (cmd, *args) tuples, e.g.
+                [('load', 'song.flac'), ('seek', 30), ('play',)].
+                
+        Returns:
+            int: Request id to pass to receive().
+        """
+        return self._send({"batch": [{"cmd": cmd, "args": list(args)} for cmd, *args in commands]})
+    
+    def _send(self, request):
+        """Assign a request id and write the request line."""
+        request_id = self.next_id
+        self.next_id += 1
+        self.sock.sendall((json.dumps({"id": request_id, **request}) + "\n").encode('utf-8'))
+        return request_id
+    
+    def receive(self, request_id):
+        """
+        Wait for the response to a request.
+        
+        Args:
+            request_id: Id returned by send() or send_batch().
+            
+        Returns:
+            dict: Response with 'ok' and 'result'/'results' or 'error'.
+            
+        Raises:
+            ConnectionError: If the daemon closed the connection.
+        """
+        while request_id not in self.responses:
+            line = self.reader.readline()
+            if not line:
+                raise ConnectionError("Daemon closed the connection")
+            
+            message = json.loads(line)
+            if message.get('type') == 'event':
+                self.events.append(message)
+            else:
+                self.responses[message.get('id')] = message
+        
+        return self.responses.pop(request_id)
+    
+    def request(self, cmd, *args):
+        """
+        Send a command and wait for its response.
+        
+        Args:
+            cmd: Command name.
+            *args: Command arguments.
+            
+        Returns:
+            dict: Response with 'ok' and 'result' or 'error'.
+        """
+        return self.receive(self.send(cmd, *args))
+    
+    def batch(self, commands):
+        """
+        Run several commands back to back and wait for all results.
+        
+        Args:
+            commands: Sequence of (cmd, *args) tuples.
+            
+        Returns:
+            dict: Response with 'ok' and a 'results' list.
+        """
+        return self.receive(self.send_batch(commands))
+    
+    def close(self):
+        """Close the connection."""
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+    
+    def __enter__(self):
+        """
+        Use the client as a context manager that closes its connection on exit.
+        
+        Returns:
+            DaemonClient: This client.
+        """
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Close the connection when the with block ends.
+        
+        Args:
+            exc_type: Exception type raised in the block, if any.
+            exc_value: Exception raised in the block, if any.
+            traceback: Traceback of the exception, if any.
+        """
+        self.close()
+
+
+def send_daemon_command(command, client=None):
+    """
+    Send a command to a running daemon instance.
+    
+    Args:
+        command: Command string to send to the daemon (e.g. 'seek 30').
+        client: Optional connected DaemonClient to reuse instead of
+            opening a new connection.
+        
+    Returns:
+        True if command was sent successfully, False otherwise.
+    """
+    parts = command.strip().split(maxsplit=1)
+    if not parts:
+        print("ERROR: Empty command")
         return False
     
-    socket_path = max(socket_files, key=lambda x: x[1])[0]
+    cmd = parts[0].lower()
+    args = parts[1:]
     
     try:
-        client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        client_socket.connect(socket_path)
-        client_socket.send(command.encode('utf-8'))
-        response = client_socket.recv(1024).decode('utf-8')
-        print(response)
-        client_socket.close()
-        return response.startswith("OK:")
+        own_client = client is None
+        if own_client:
+            client = DaemonClient()
+        try:
+            response = client.request(cmd, *args)
+        finally:
+            if own_client:
+                client.close()
     except Exception as e:
         print(f"Error sending command to daemon: {e}")
         return False
+    
+    if not response.get('ok'):
+        print(f"ERROR: {response.get('error')}")
+        return False
+    
+    result = response.get('result')
+    if cmd == 'status':
+        print(f"OK: {_describe_state(result)}")
+    elif result is True:
+        print(f"OK: {cmd.title()}")
+    else:
+        print(f"OK: {result}")
+    return True
 
 
 def main():
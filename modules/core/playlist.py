@@ -6,15 +6,17 @@ import sys
 import os
 import sqlite3
 import argparse
+import threading
 from pathlib import Path
 
 # Handle imports for both package and standalone execution
 try:
-    from . import metadata
+    from . import metadata, m3u, library_db
 except ImportError:
     # Add parent directory to path for standalone execution
-    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from core import metadata
+    import _standalone
+    _standalone.setup_path()
+    from core import metadata, m3u, library_db
 
 # Default database path
 DEFAULT_DB_PATH = "walrio_library.db"
@@ -22,6 +24,203 @@ DEFAULT_DB_PATH = "walrio_library.db"
 # Supported audio extensions
 AUDIO_EXTENSIONS = {'.mp3', '.flac', '.ogg', '.oga', '.opus', '.m4a', '.mp4', '.aac', '.wv', '.ape', '.mpc', '.wav'}
 
+# Songs columns create_m3u_playlist() writes
+M3U_COLUMNS = ('url', 'title', 'artist', 'length')
+
+class Song:
+    """
+    Compact record for one queued song.
+    
+    Uses __slots__ instead of a per-song dict and interns the strings that
+    repeat across a library (artist, album, genre), so million-entry queues
+    stay small. Supports the dict-style access (song['title'],
+    song.get('artist'), song.update(...)) the queue and playlist code
+    already uses; a field that is None counts as missing. The url is
+    derived from filepath rather than stored twice.
+    """
+    
+    FIELDS = ('id', 'filepath', 'title', 'artist', 'album', 'albumartist', 'length',
+              'track', 'disc', 'year', 'genre', 'extinf', 'metadata_loaded', 'file_missing')
+    INTERNED = frozenset({'artist', 'album', 'albumartist', 'genre'})
+    
+    # Fields kept by to_saved()/from_saved(), in order
+    SAVED_FIELDS = ('filepath', 'title', 'artist', 'album', 'albumartist', 'length',
+                    'track', 'disc', 'year', 'genre', 'extinf')
+    
+    __slots__ = FIELDS + ('extra',)
+    
+    def __init__(self, **fields):
+        """
+        Initialize Song.
+        
+        Args:
+            **fields: Initial values, as accepted by update().
+        """
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.update(fields)
+    
+    @classmethod
+    def from_row(cls, row):
+        """
+        Build a Song from a database row or song dict.
+        
+        Args:
+            row: sqlite3.Row or mapping with songs table columns.
+            
+        Returns:
+            Song: New record holding the known fields of the row.
+        """
+        return cls(**{key: row[key] for key in row.keys() if key == 'url' or key in cls.FIELDS})
+    
+    @classmethod
+    def from_saved(cls, values):
+        """
+        Rebuild a Song from a tuple made by to_saved().
+        
+        Assigns the slots directly, since sessions restore whole queues at
+        once. The song is marked as not loaded, so ensure_song_metadata()
+        re-reads it (through the metadata cache) when it is needed.
+        
+        Args:
+            values: Tuple of SAVED_FIELDS values.
+            
+        Returns:
+            Song: The restored record.
+        """
+        song = cls.__new__(cls)
+        (song.filepath, song.title, artist, album, albumartist, song.length,
+         song.track, song.disc, song.year, genre, extinf) = values
+        song.artist = sys.intern(artist) if artist else artist
+        song.album = sys.intern(album) if album else album
+        song.albumartist = sys.intern(albumartist) if albumartist else albumartist
+        song.genre = sys.intern(genre) if genre else genre
+        song.extinf = tuple(extinf) if extinf else None
+        song.id = song.file_missing = song.extra = None
+        song.metadata_loaded = False
+        return song
+    
+    def to_saved(self):
+        """
+        Get the fields worth saving as a plain tuple.
+        
+        Returns:
+            tuple: Values of SAVED_FIELDS.
+        """
+        return tuple(getattr(self, name) for name in self.SAVED_FIELDS)
+    
+    @property
+    def url(self):
+        """file:// URL of the song, derived from filepath."""
+        return f"file://{self.filepath}" if self.filepath is not None else None
+    
+    def __getitem__(self, key):
+        """
+        Get a field like a dict.
+        
+        Args:
+            key: Field name.
+            
+        Returns:
+            The field value.
+            
+        Raises:
+            KeyError: If the field is missing or None.
+        """
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+    
+    def __setitem__(self, key, value):
+        """
+        Set a field like a dict; 'url' sets filepath and unknown keys go to extra.
+        
+        Args:
+            key: Field name.
+            value: New value.
+        """
+        if key == 'url':
+            key = 'filepath'
+            if isinstance(value, str) and value.startswith('file://'):
+                value = value[7:]
+        if key in self.INTERNED and isinstance(value, str):
+            value = sys.intern(value)
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+    
+    def __contains__(self, key):
+        """
+        Check whether a field is set.
+        
+        Args:
+            key: Field name.
+            
+        Returns:
+            bool: True if the field has a value other than None.
+        """
+        return self.get(key) is not None
+    
+    def get(self, key, default=None):
+        """
+        Get a field like dict.get().
+        
+        Args:
+            key: Field name.
+            default: Value returned when the field is missing or None.
+            
+        Returns:
+            The field value, or default.
+        """
+        if key == 'url':
+            value = self.url
+        elif key in self.FIELDS:
+            value = getattr(self, key)
+        else:
+            value = self.extra.get(key) if self.extra else None
+        return default if value is None else value
+    
+    def update(self, fields):
+        """
+        Set several fields at once like dict.update().
+        
+        Args:
+            fields: Mapping of field names to values.
+        """
+        for key, value in fields.items():
+            self[key] = value
+    
+    def keys(self):
+        """Get the names of the fields that are set."""
+        names = [name for name in self.FIELDS if getattr(self, name) is not None]
+        if self.filepath is not None:
+            names.append('url')
+        if self.extra:
+            names.extend(self.extra)
+        return names
+    
+    def to_dict(self):
+        """
+        Convert the record to a plain song dict.
+        
+        Returns:
+            dict: The fields that are set.
+        """
+        return {key: self.get(key) for key in self.keys()}
+    
+    def __repr__(self):
+        """
+        Return a debugging representation of the song.
+        
+        Returns:
+            str: The song's path and title.
+        """
+        return f"Song({self.filepath!r}, title={self.title!r})"
+
 def connect_to_database(db_path):
     """Connect to the SQLite database and return connection.
     
@@ -35,42 +234,41 @@ def connect_to_database(db_path):
         print(f"Error: Database not found: {db_path}")
         return None
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        # Read-only, so exporting never waits for a scan or a playing queue
+        return library_db.connect(db_path, readonly=True, row_factory=sqlite3.Row)
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
 
-def get_songs_from_database(conn, filters=None):
+def get_songs_from_database(conn, filters=None, columns=None):
     """Get songs from database based on filters.
     
     Args:
         conn: Database connection object.
         filters: Optional dict with 'artist', 'album', 'genre' keys for filtering.
+        columns: Songs columns to read (None for all of them).
         
     Returns:
-        List of song records matching the filters.
+        List of song records (dict-like database.SongRow) matching the filters.
     """
-    cursor = conn.cursor()
-    query = "SELECT * FROM songs WHERE unavailable = 0"
+    # Imported here because database.py imports this module
+    try:
+        from . import database
+    except ImportError:
+        from core import database
+    
+    where = "unavailable = 0"
     params = []
     
     if filters:
-        if 'artist' in filters and filters['artist']:
-            query += " AND (artist LIKE ? OR albumartist LIKE ?)"
-            artist_filter = f"%{filters['artist']}%"
-            params.extend([artist_filter, artist_filter])
-        if 'album' in filters and filters['album']:
-            query += " AND album LIKE ?"
-            params.append(f"%{filters['album']}%")
-        if 'genre' in filters and filters['genre']:
-            query += " AND genre LIKE ?"
-            params.append(f"%{filters['genre']}%")
-    
-    query += " ORDER BY artist, album, disc, track"
-    cursor.execute(query, params)
-    return cursor.fetchall()
+        # Text filters go through the full-text index
+        for key, columns_searched in (('artist', ('artist', 'albumartist')), ('album', ('album',)), ('genre', ('genre',))):
+            if filters.get(key):
+                condition, condition_params = database.search_condition(conn, filters[key], columns_searched)
+                where += f" AND {condition}"
+                params.extend(condition_params)
+    
+    return list(database.iter_songs(conn, columns, where, params, order_by="artist, album, disc, track"))
 
 def format_song_info(song):
     """Format song information for display.
@@ -183,93 +381,128 @@ def create_m3u_playlist(songs, playlist_path, use_absolute_paths=False, playlist
         print(f"Error creating playlist: {e}")
         return False
 
-def load_m3u_playlist(playlist_path):
+def load_m3u_playlist(playlist_path, lazy=False):
     """Load songs from M3U/Extended M3U playlist file.
     
     Args:
         playlist_path: Path to the M3U playlist file.
+        lazy: If True, don't open the audio files. Songs are built from the
+            #EXTINF data and the path only and marked with
+            'metadata_loaded': False; ensure_song_metadata() or
+            start_metadata_prefetch() fill in the full metadata later.
         
     Returns:
-        List of song dicts with metadata and file paths.
+        List of Song records with metadata and file paths.
     """
     if not os.path.exists(playlist_path):
         print(f"Error: Playlist not found: {playlist_path}")
         return []
     
     songs = []
-    playlist_dir = Path(playlist_path).parent
     
     try:
-        with open(playlist_path, 'r', encoding='utf-8') as f:
-            current_info = {}
+        for entry in m3u.iter_m3u_entries(playlist_path):
+            file_path = entry.path
             
-            for line in f:
-                line = line.strip()
-                
-                if line.startswith('#EXTINF:'):
-                    # Parse EXTINF line: #EXTINF:duration,artist - title
-                    parts = line[8:].split(',', 1)
-                    if len(parts) == 2:
-                        try:
-                            current_info['length'] = int(parts[0])
-                        except:
-                            current_info['length'] = 0
-                        
-                        # Try to parse artist - title
-                        if ' - ' in parts[1]:
-                            artist, title = parts[1].split(' - ', 1)
-                            current_info['artist'] = artist.strip()
-                            current_info['title'] = title.strip()
-                        else:
-                            current_info['title'] = parts[1].strip()
-                
-                elif line and not line.startswith('#'):
-                    # This is a file path
-                    file_path = line
-                    
-                    # Convert relative paths to absolute
-                    if not os.path.isabs(file_path):
-                        # Relative paths are relative to the playlist directory
-                        file_path = os.path.abspath(os.path.join(playlist_dir, file_path))
-                    
-                    # Extract full metadata from the audio file
-                    metadata_info = extract_metadata(file_path)
-                    
-                    if metadata_info:
-                        # Use extracted metadata but prefer M3U info for artist/title if available
-                        song = metadata_info.copy()
-                        
-                        # Override with M3U info if available (M3U might have corrected info)
-                        if current_info.get('artist'):
-                            song['artist'] = current_info['artist']
-                        if current_info.get('title'):
-                            song['title'] = current_info['title']
-                        if current_info.get('length'):
-                            song['length'] = current_info['length']
-                    else:
-                        # Fallback to basic M3U info if metadata extraction fails
-                        song = {
-                            'url': f"file://{file_path}",
-                            'filepath': file_path,
-                            'title': current_info.get('title', Path(file_path).stem),
-                            'artist': current_info.get('artist', 'Unknown Artist'),
-                            'album': 'Unknown Album',
-                            'albumartist': current_info.get('artist', 'Unknown Artist'),
-                            'length': current_info.get('length', 0),
-                            'track': 0,
-                            'disc': 0,
-                            'year': 0,
-                            'genre': 'Unknown'
-                        }
-                    
-                    songs.append(song)
-                    current_info = {}
+            # Lightweight record from the M3U info alone; extinf remembers
+            # what the playlist itself said so full metadata can't override it
+            song = Song(
+                filepath=file_path,
+                title=entry.title or Path(file_path).stem,
+                artist=entry.artist or 'Unknown Artist',
+                album='Unknown Album',
+                length=entry.duration or 0,
+                extinf=(entry.duration, entry.artist, entry.title) if entry.extinf else None,
+                metadata_loaded=False
+            )
+            
+            if not lazy:
+                ensure_song_metadata(song)
+            
+            songs.append(song)
         
         return songs
     except Exception as e:
         print(f"Error loading playlist: {e}")
         return []
 
+def ensure_song_metadata(song):
+    """Fill in full metadata for a song loaded lazily from a playlist.
+    
+    Extracts metadata from the audio file and merges it into the song
+    in place, preferring the playlist's #EXTINF artist/title/length when
+    present (the playlist might have corrected info). Songs that are already
+    complete are returned untouched, so this is cheap to call whenever a
+    song becomes current or is displayed.
+    
+    Args:
+        song: Song from load_m3u_playlist().
+        
+    Returns:
+        The same song.
+    """
+    if song.get('metadata_loaded', True):
+        return song
+    
+    file_path = song.get('filepath') or song['url'][7:]
+    extinf_length, extinf_artist, extinf_title = song.get('extinf') or (None, None, None)
+    
+    # Extract full metadata from the audio file
+    metadata_info = extract_metadata(file_path)
+    
+    if metadata_info:
+        # Use extracted metadata but prefer M3U info for artist/title if available
+        updates = metadata_info.copy()
+        
+        # Override with M3U info if available (M3U might have corrected info)
+        if extinf_artist:
+            updates['artist'] = extinf_artist
+        if extinf_title:
+            updates['title'] = extinf_title
+        if extinf_length:
+            updates['length'] = extinf_length
+    else:
+        # Fallback to basic M3U info if metadata extraction fails
+        updates = {
+            'albumartist': extinf_artist or 'Unknown Artist',
+            'track': 0,
+            'disc': 0,
+            'year': 0,
+            'genre': 'Unknown'
+        }
+    
+    updates['metadata_loaded'] = True
+    song.update(updates)
+    return song
+
+def start_metadata_prefetch(songs, start_index=0, stop_event=None):
+    """Fill in metadata for lazily loaded songs in a background thread.
+    
+    Songs are visited from start_index to the end of the list and then from
+    the beginning, so the ones about to play are ready first.
+    
+    Args:
+        songs: List of Songs from load_m3u_playlist(lazy=True).
+        start_index: Index of the first song to prefetch.
+        stop_event: Optional threading.Event that stops the prefetch early.
+        
+    Returns:
+        The started daemon thread.
+    """
+    def prefetch():
+        """Walk the song list and load missing metadata."""
+        count = len(songs)
+        for offset in range(count):
+            if stop_event is not None and stop_event.is_set():
+                return
+            index = (start_index + offset) % count
+            if index < len(songs):
+                ensure_song_metadata(songs[index])
+    
+    thread = threading.Thread(target=prefetch, daemon=True)
+    thread.start()
+    return thread
+
 def extract_metadata(file_path):
     """Extract metadata from audio file using the centralized metadata module.
     
@@ -402,9 +635,9 @@ def main():
     # Database query options
     parser.add_argument('--db-path', default=DEFAULT_DB_PATH, 
                        help=f'Path to the SQLite database file (default: {DEFAULT_DB_PATH})')
-    parser.add_argument('--artist', help='Filter by artist (partial match)')
-    parser.add_argument('--album', help='Filter by album (partial match)')
-    parser.add_argument('--genre', help='Filter by genre (partial match)')
+    parser.add_argument('--artist', help='Filter by artist (every word matches the start of a word, e.g. "beat")')
+    parser.add_argument('--album', help='Filter by album (every word matches the start of a word)')
+    parser.add_argument('--genre', help='Filter by genre (every word matches the start of a word)')
     
     # File/directory input options
     parser.add_argument('--inputs', nargs='+', help='Files or directories to include in playlist')
@@ -474,7 +707,7 @@ def main():
             filters['genre'] = args.genre
         
         # Get songs
-        songs = get_songs_from_database(conn, filters)
+        songs = get_songs_from_database(conn, filters, M3U_COLUMNS)
         conn.close()
         
         if not songs:
@@ -6,26 +6,49 @@ import sys
 import os
 import argparse
 import random
-import time
 import threading
+from itertools import islice
 from pathlib import Path
 from enum import Enum
 
 # Handle imports for both package and standalone execution
 try:
     from .player import AudioPlayer
-    from .playlist import load_m3u_playlist
+    from .playlist import load_m3u_playlist, ensure_song_metadata, start_metadata_prefetch
     from . import metadata
+    from .availability import AvailabilityIndex, PREFETCH_AHEAD, PLAYBACK_WAIT
+    from . import session
 except ImportError:
     # Add parent directory to path for standalone execution
-    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import _standalone
+    _standalone.setup_path()
     from core.player import AudioPlayer
-    from core.playlist import load_m3u_playlist
+    from core.playlist import load_m3u_playlist, ensure_song_metadata, start_metadata_prefetch
     from core import metadata
+    from core.availability import AvailabilityIndex, PREFETCH_AHEAD, PLAYBACK_WAIT
+    from core import session
+
+# Name of the saved session of this queue
+SESSION_NAME = 'queue'
 
 # Debug mode - set to False to disable debug logging for efficiency
 DEBUG_MODE = False
 
+def song_file_path(song):
+    """
+    Get the local file path of a song.
+    
+    Args:
+        song: Song record or dictionary with 'url' or 'filepath'.
+        
+    Returns:
+        str: Path of the audio file.
+    """
+    file_path = song.get('url', song.get('filepath', ''))
+    if file_path.startswith('file://'):
+        file_path = file_path[7:]
+    return file_path
+
 def debug_log(message):
     """
     Print debug message only if DEBUG_MODE is enabled.
@@ -42,6 +65,96 @@ class RepeatMode(Enum):
     TRACK = "track"
     QUEUE = "queue"
 
+class ShuffleOrder:
+    """
+    Shuffled sequence of song indices, drawn one at a time.
+    
+    Performs Fisher-Yates lazily: each index is picked when it is first
+    looked at instead of shuffling the whole pool up front, so peeking and
+    taking the next song are O(1) however large the queue is.
+    """
+    
+    __slots__ = ('_pool', '_pos', '_drawn')
+    
+    def __init__(self, indices=()):
+        """
+        Initialize ShuffleOrder.
+        
+        Args:
+            indices: Song indices to play in random order.
+        """
+        self._pool = list(indices)
+        self._pos = 0
+        self._drawn = 0  # Positions from _pos on that are already picked
+    
+    def __len__(self):
+        """
+        Get the number of indices not played yet.
+        
+        Returns:
+            int: Remaining indices in this pass.
+        """
+        return len(self._pool) - self._pos
+    
+    def upcoming(self, count):
+        """
+        Get the next indices without consuming them.
+        
+        Args:
+            count: Number of indices wanted.
+            
+        Returns:
+            list: Up to count indices, in the order they will be returned.
+        """
+        pool = self._pool
+        end = min(self._pos + count, len(pool))
+        for i in range(self._pos + self._drawn, end):
+            pick = random.randrange(i, len(pool))
+            pool[i], pool[pick] = pool[pick], pool[i]
+        self._drawn = max(self._drawn, end - self._pos)
+        return pool[self._pos:end]
+    
+    def peek(self):
+        """
+        Get the next index without consuming it.
+        
+        Returns:
+            int: The next song index (stable until popleft() is called).
+        
+        Raises:
+            IndexError: If the order is exhausted.
+        """
+        if self._pos >= len(self._pool):
+            raise IndexError("peek from an empty ShuffleOrder")
+        return self.upcoming(1)[0]
+    
+    def popleft(self):
+        """
+        Consume and return the next index.
+        
+        Returns:
+            int: The next song index.
+        """
+        index = self.peek()
+        self._pos += 1
+        self._drawn -= 1
+        return index
+    
+    def remaining(self):
+        """
+        Get every index not consumed yet.
+        
+        Returns:
+            list: The remaining indices, already drawn ones first.
+        """
+        return self._pool[self._pos:]
+    
+    def clear(self):
+        """Drop all remaining indices."""
+        self._pool = []
+        self._pos = 0
+        self._drawn = 0
+
 class QueueManager:
     """Manages audio playback queue with shuffle, repeat, and history tracking."""
     
@@ -52,8 +165,9 @@ class QueueManager:
         self.repeat_mode = RepeatMode.OFF
         self.shuffle = False
         self.playback_history = []  # Global history for universal previous
-        self.forward_queue = []  # Predicted future songs for shuffle
+        self.forward_queue = ShuffleOrder()  # Predicted future songs for shuffle
         self.forward_history = []  # Songs to return to when hitting next after previous
+        self.availability = AvailabilityIndex()  # Background file existence checks
     
     def set_repeat_mode(self, mode):
         """Set repeat mode: "off", "track", or "queue". Mode changes preserve forward queue."""
@@ -94,26 +208,62 @@ class QueueManager:
         """Get next song in shuffle mode using forward queue for consistency."""
         # If we have a forward queue, use it
         if self.forward_queue:
-            return self.forward_queue[0]
+            return self.forward_queue.peek()
         
-        # Generate new forward queue with remaining unplayed songs
-        recent_history = self.playback_history[-len(self.songs):] if len(self.playback_history) >= len(self.songs) else self.playback_history
-        unplayed = [i for i in range(len(self.songs)) 
-                   if recent_history.count(i) == 0 and i != self.current_index]
+        # Generate new forward queue with songs not played in the last len(songs) tracks
+        recent_history = set(islice(reversed(self.playback_history), len(self.songs)))
+        recent_history.add(self.current_index)
+        unplayed = [i for i in range(len(self.songs)) if i not in recent_history]
         
         if unplayed:
-            # Shuffle unplayed songs and store as forward queue
-            random.shuffle(unplayed)
-            self.forward_queue = unplayed
+            self.forward_queue = ShuffleOrder(unplayed)
             debug_log(f"_get_next_shuffle_song(): Generated forward_queue with {len(unplayed)} unplayed songs")
-            return self.forward_queue[0]
+            return self.forward_queue.peek()
         else:
             # All songs played recently, generate new random sequence
             all_indices = [i for i in range(len(self.songs)) if i != self.current_index]
-            random.shuffle(all_indices)
-            self.forward_queue = all_indices
+            self.forward_queue = ShuffleOrder(all_indices)
             debug_log(f"_get_next_shuffle_song(): All played, generated new forward_queue with {len(all_indices)} songs")
-            return self.forward_queue[0] if self.forward_queue else self.current_index
+            return self.forward_queue.peek() if self.forward_queue else self.current_index
+    
+    def upcoming_indices(self, count):
+        """
+        Predict the indices of the next songs to play.
+        
+        Args:
+            count: Number of songs to look ahead.
+            
+        Returns:
+            list: Up to count song indices, soonest first.
+        """
+        if not self.songs or self.repeat_mode == RepeatMode.TRACK:
+            return []
+        
+        upcoming = list(reversed(self.forward_history[-count:]))
+        remaining = count - len(upcoming)
+        if remaining <= 0:
+            return upcoming
+        
+        if self.is_shuffle_effective():
+            if not self.forward_queue:
+                self._get_next_shuffle_song()
+            upcoming.extend(self.forward_queue.upcoming(remaining))
+        else:
+            stop = self.current_index + 1 + remaining
+            if self.repeat_mode == RepeatMode.QUEUE:
+                upcoming.extend(i % len(self.songs) for i in range(self.current_index + 1, stop))
+            else:
+                upcoming.extend(range(self.current_index + 1, min(stop, len(self.songs))))
+        return upcoming
+    
+    def prefetch_availability(self, count=PREFETCH_AHEAD):
+        """
+        Start checking in the background whether upcoming songs' files exist.
+        
+        Args:
+            count: Number of songs to look ahead.
+        """
+        self.availability.prefetch(song_file_path(self.songs[i]) for i in self.upcoming_indices(count))
     
     def has_songs(self):
         """Check if there are songs in the queue."""
@@ -154,8 +304,8 @@ class QueueManager:
             next_idx = self._get_next_shuffle_song()
             
             # Remove used song from forward queue
-            if self.forward_queue and next_idx == self.forward_queue[0]:
-                self.forward_queue.pop(0)
+            if self.forward_queue and next_idx == self.forward_queue.peek():
+                self.forward_queue.popleft()
             
             self.current_index = next_idx
             debug_log(f"next_track(): Shuffle, moved to {self.current_index}, "
@@ -176,6 +326,8 @@ class QueueManager:
     def next_track_skip_missing(self):
         """
         Move to next track, skipping unavailable songs. For auto-progression after song ends.
+        Songs whose files haven't been checked yet count as available; playback
+        confirms them before loading.
         Returns True if there's a next available track, False if queue ended.
         """
         if not self.has_songs():
@@ -200,14 +352,13 @@ class QueueManager:
             if not self.next_track():
                 return False
             
+            # Only skip songs already known to be missing; the availability
+            # index answers from memory, so a dead mount can't stall this loop
             song = self.current_song()
-            if song:
-                file_path = song.get('url', song.get('filepath', ''))
-                if file_path.startswith('file://'):
-                    file_path = file_path[7:]
-                if os.path.exists(file_path):
-                    debug_log(f"next_track_skip_missing(): Found available song at {self.current_index}")
-                    return True
+            if song and not self.availability.is_missing(song_file_path(song)):
+                debug_log(f"next_track_skip_missing(): Found available song at {self.current_index}")
+                self.prefetch_availability()
+                return True
             attempts += 1
         
         debug_log(f"next_track_skip_missing(): No more available files in queue")
@@ -287,20 +438,18 @@ class QueueManager:
         if not self.songs:
             return False
         
-        # Get current song before shuffle
-        current_song = self.current_song()
-        
-        # Shuffle the songs list
-        random.shuffle(self.songs)
-        
-        # Find new index of current song
-        if current_song:
-            for i, song in enumerate(self.songs):
-                if song == current_song:
-                    self.current_index = i
-                    break
-        else:
-            self.current_index = 0
+        # Fisher-Yates shuffle that follows the current song as it moves,
+        # so it doesn't have to be searched for afterwards
+        songs = self.songs
+        current = self.current_index if self.current_song() is not None else -1
+        for i in range(len(songs) - 1, 0, -1):
+            j = random.randrange(i + 1)
+            songs[i], songs[j] = songs[j], songs[i]
+            if current == i:
+                current = j
+            elif current == j:
+                current = i
+        self.current_index = max(current, 0)
         
         debug_log(f"shuffle_queue(): Physically shuffled queue, current now at {self.current_index}")
         print("Queue shuffled - song order randomized")
@@ -364,12 +513,16 @@ def format_song_info(song):
     """
     Format song information for display with comprehensive metadata.
     
+    Songs loaded lazily from a playlist get their full metadata read here,
+    the first time they are displayed.
+    
     Args:
         song: Dictionary containing song metadata.
         
     Returns:
         Formatted string with song information.
     """
+    ensure_song_metadata(song)
     artist = song.get('artist') or "Unknown Artist"
     albumartist = song.get('albumartist') or artist
     title = song.get('title') or "Unknown Title"
@@ -410,25 +563,110 @@ def display_queue(queue, current_index=0):
         print(f"{marker}{i+1:3d}. {format_song_info(song)}")
     print()
 
-def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index=0):
+def save_session(queue_manager, playlist_path=None, full=True, stamp=None):
+    """
+    Save the queue so the next run can resume it.
+    
+    Args:
+        queue_manager: QueueManager to save.
+        playlist_path: Playlist the queue was loaded from, if any.
+        full: Save the songs too; False only updates position, modes and history.
+        stamp: Stamp of the playlist when it was loaded (default: its current stamp).
+    """
+    state = {
+        'current_index': queue_manager.current_index,
+        'shuffle': queue_manager.shuffle,
+        'repeat_mode': queue_manager.repeat_mode.value,
+        'history': queue_manager.playback_history,
+        'forward_history': queue_manager.forward_history,
+        'forward_queue': queue_manager.forward_queue.remaining(),
+    }
+    store = session.get_store()
+    if not full:
+        store.save_state(SESSION_NAME, **state)
+        return
+    
+    source = os.path.abspath(playlist_path) if playlist_path else None
+    if stamp is None and source:
+        stamp = session.file_stamp(source)
+    store.save(SESSION_NAME, source, stamp, songs=queue_manager.songs, **state)
+
+def restore_session(playlist_path=None):
+    """
+    Rebuild the queue saved by save_session() without reading any audio file.
+    
+    Songs keep their saved metadata for display and are re-read lazily
+    (through the metadata cache) when they are shown or played. The
+    session is discarded if its playlist changed since it was saved.
+    
+    Args:
+        playlist_path: Only resume a session of this playlist.
+        
+    Returns:
+        tuple: (QueueManager, playlist path or None), or None if there is
+               no usable session.
+    """
+    saved = session.get_store().load(SESSION_NAME)
+    if not saved or not saved['songs']:
+        return None
+    
+    source = saved['source']
+    if playlist_path is not None and source != os.path.abspath(playlist_path):
+        return None
+    if source and saved['stamp'] != session.file_stamp(source):
+        print(f"Playlist changed since the last session: {source}")
+        return None
+    
+    queue_manager = QueueManager(saved['songs'])
+    queue_manager.repeat_mode = RepeatMode(saved['repeat_mode'] or 'off')
+    queue_manager.shuffle = saved['shuffle']
+    if 0 <= saved['current_index'] < len(queue_manager.songs):
+        queue_manager.current_index = saved['current_index']
+    
+    # Drop history entries that don't fit the queue (shouldn't happen unless edited)
+    count = len(queue_manager.songs)
+    queue_manager.playback_history = [i for i in saved['history'] if 0 <= i < count]
+    queue_manager.forward_history = [i for i in saved['forward_history'] if 0 <= i < count]
+    queue_manager.forward_queue = ShuffleOrder(i for i in saved['forward_queue'] if 0 <= i < count)
+    return queue_manager, source
+
+def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index=0, gapless=True,
+                            queue_manager=None, playlist_path=None):
     """
     Play songs using QueueManager with AudioPlayer - non-blocking with command interface.
     
+    The queue is saved as a session when playback starts, on every song
+    change and when it stops, so it can be resumed with restore_session().
+    
     Args:
         songs: List of song dictionaries from playlists
         repeat_mode: Repeat mode - "off", "track", or "queue"
         shuffle: Enable shuffle mode
         start_index: Index to start playback from
+        gapless: Hand the next song to the player before the current one ends
+        queue_manager: Already set up QueueManager (e.g. from restore_session());
+            songs, repeat_mode, shuffle and start_index are then ignored
+        playlist_path: Playlist the songs come from, recorded in the session
     """
+    resumed = queue_manager is not None
+    if resumed:
+        songs = queue_manager.songs
+        start_index = queue_manager.current_index
+    
     if not songs:
         print("Queue is empty. Nothing to play.")
         return
     
-    # Create queue manager
-    queue_manager = QueueManager(songs)
-    queue_manager.set_repeat_mode(repeat_mode)
-    queue_manager.set_shuffle_mode(shuffle)
-    queue_manager.current_index = start_index
+    if not resumed:
+        # Create queue manager
+        queue_manager = QueueManager(songs)
+        queue_manager.set_repeat_mode(repeat_mode)
+        queue_manager.set_shuffle_mode(shuffle)
+        queue_manager.current_index = start_index
+    
+    # A resumed session only needs its position kept up to date
+    playlist_stamp = session.file_stamp(playlist_path) if playlist_path else None
+    save_session(queue_manager, playlist_path, full=not resumed, stamp=playlist_stamp)
     
     # Create audio player instance
     player = AudioPlayer(debug=False)
@@ -437,6 +675,45 @@ def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index
     playback_active = {'running': True, 'skip_requested': False, 'previous_requested': False}
     playback_lock = threading.Lock()
     
+    # Read metadata of lazily loaded songs in the background, upcoming songs first
+    prefetch_stop = threading.Event()
+    start_metadata_prefetch(songs, start_index, prefetch_stop)
+    queue_manager.prefetch_availability()
+    
+    def queue_next_file():
+        """
+        Pick the song to hand to the player before the current one ends.
+        
+        Runs on a GStreamer streaming thread, so it never waits: without the
+        lock or a cached availability answer, the next song is simply loaded
+        after this one ends. The queue only moves on once the player has
+        actually switched (see playback_thread()), so 'current', 'previous'
+        and the saved session keep pointing at the song still playing.
+        
+        Returns:
+            tuple or None: (path, duration) of the next song, duration 0 if unknown.
+        """
+        if not playback_lock.acquire(blocking=False):
+            return None
+        try:
+            if (not playback_active['running'] or playback_active['skip_requested']
+                    or playback_active['previous_requested']):
+                return None
+            
+            upcoming = queue_manager.upcoming_indices(1)
+            if not upcoming:
+                return None
+            song = queue_manager.songs[upcoming[0]]
+            file_path = song_file_path(song)
+            if queue_manager.availability.is_available(file_path) is not True:
+                return None
+            return file_path, song.get('length') or 0
+        finally:
+            playback_lock.release()
+    
+    if gapless:
+        player.set_next_track_callback(queue_next_file)
+    
     def playback_thread():
         """Background thread that handles actual playback."""
         try:
@@ -445,14 +722,15 @@ def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index
                 if not song:
                     break
                 
-                # Get file path
-                file_path = song.get('url', song.get('filepath', ''))
-                if file_path.startswith('file://'):
-                    file_path = file_path[7:]
+                file_path = song_file_path(song)
                 
-                # Check if file exists
-                if not os.path.exists(file_path):
-                    print(f"\nFile not found: {file_path}")
+                # Check if file exists (usually already answered by the background checks)
+                available = queue_manager.availability.is_available(file_path, timeout=PLAYBACK_WAIT)
+                if not available:
+                    if available is None:
+                        print(f"\nFile not reachable (check timed out): {file_path}")
+                    else:
+                        print(f"\nFile not found: {file_path}")
                     song['file_missing'] = True
                     
                     if not queue_manager.next_track_skip_missing():
@@ -462,6 +740,7 @@ def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index
                 # Display song info
                 print(f"\n[{queue_manager.current_index + 1}/{len(songs)}] Now playing: {format_song_info(song)}")
                 print(f"File: {file_path}")
+                save_session(queue_manager, full=False)
                 
                 # Load and play the song
                 if not player.load_file(file_path):
@@ -499,7 +778,26 @@ def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index
                                 print("Already at beginning of playback history.")
                                 manual_track_change = False  # Stay on current song
                             break
-                    time.sleep(0.1)
+                        
+                        # The player moved on to the next song by itself (gapless); follow it
+                        switched = player.current_file != os.path.abspath(file_path)
+                        if switched:
+                            queue_manager.next_track_skip_missing()
+                            file_path = player.current_file
+                    
+                    if switched:
+                        song = ensure_song_metadata(queue_manager.current_song())
+                        print(f"\n[{queue_manager.current_index + 1}/{len(songs)}] Now playing: {format_song_info(song)}")
+                        print(f"File: {file_path}")
+                        print("queue/play> ", end="", flush=True)
+                        save_session(queue_manager, full=False)
+                    
+                    # Sleep until the player state changes or a command wakes us up
+                    player.wait_until(lambda: (
+                        not player.is_playing or not playback_active['running'] or
+                        playback_active['skip_requested'] or playback_active['previous_requested'] or
+                        player.current_file != os.path.abspath(file_path)
+                    ))
                 
                 # Check if we should quit
                 if not playback_active['running']:
@@ -508,6 +806,9 @@ def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index
                 
                 # Move to next track after natural playback completion (not manual skip/previous)
                 if not manual_track_change:
+                    # A gapless switch that ended before it was followed
+                    if player.current_file != os.path.abspath(file_path):
+                        queue_manager.next_track_skip_missing()
                     if not queue_manager.next_track_skip_missing():
                         break
         
@@ -538,6 +839,7 @@ def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index
             if command in ['quit', 'q', 'stop']:
                 playback_active['running'] = False
                 player.should_quit = True
+                player.wake()
                 print("Stopping playback...")
                 break
             
@@ -549,10 +851,12 @@ def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index
                         playback_active['running'] = False
                     else:
                         print("Skipping to next track...")
+                player.wake()
             
             elif command in ['previous', 'prev', 'p']:
                 with playback_lock:
                     playback_active['previous_requested'] = True
+                player.wake()
             
             elif command == 'pause':
                 player.pause()
@@ -723,20 +1027,28 @@ def play_queue_with_manager(songs, repeat_mode="off", shuffle=False, start_index
             print("\nStopping playback...")
             playback_active['running'] = False
             player.should_quit = True
+            player.wake()
             break
         except EOFError:
             print("\nStopping playback...")
             playback_active['running'] = False
             player.should_quit = True
+            player.wake()
             break
         except Exception as e:
             print(f"Error: {e}")
     
     # Wait for playback thread to finish
+    prefetch_stop.set()
     thread.join(timeout=2.0)
+    queue_manager.availability.shutdown()
+    
+    # Save again with the metadata read while playing
+    save_session(queue_manager, playlist_path, stamp=playlist_stamp)
     print("\nPlayback finished.")
 
-def play_queue(queue, shuffle=False, repeat=False, repeat_track=False, start_index=0):
+def play_queue(queue, shuffle=False, repeat=False, repeat_track=False, start_index=0, gapless=True,
+               playlist_path=None):
     """
     Play songs in the queue with various playback options.
     
@@ -746,6 +1058,8 @@ def play_queue(queue, shuffle=False, repeat=False, repeat_track=False, start_ind
         repeat: Enable queue repeat (default: False).
         repeat_track: Enable track repeat (default: False).
         start_index: Index to start playback from (default: 0).
+        gapless: Play songs back to back without a gap (default: True).
+        playlist_path: Playlist the queue was loaded from, saved with the session.
     """
     # Determine repeat mode
     if repeat_track:
@@ -755,7 +1069,7 @@ def play_queue(queue, shuffle=False, repeat=False, repeat_track=False, start_ind
     else:
         repeat_mode = "off"
     
-    play_queue_with_manager(queue, repeat_mode, shuffle, start_index)
+    play_queue_with_manager(queue, repeat_mode, shuffle, start_index, gapless, playlist_path=playlist_path)
 
 def interactive_mode():
     """
@@ -767,6 +1081,7 @@ def interactive_mode():
     Note: For database-powered queue management, use db_queue.py instead.
     """
     queue = []
+    playlist_path = None
     
     print("\n=== Interactive Audio Queue Mode ===")
     print("Commands:")
@@ -797,7 +1112,7 @@ def interactive_mode():
                 display_queue(queue)
             elif command == 'play':
                 if queue:
-                    play_queue(queue, shuffle_mode, repeat_mode, False, 0)
+                    play_queue(queue, shuffle_mode, repeat_mode, False, 0, playlist_path=playlist_path)
                 else:
                     print("Queue is empty. Use 'playlist' to add songs first.")
             elif command == 'shuffle':
@@ -807,19 +1122,21 @@ def interactive_mode():
                 repeat_mode = not repeat_mode
                 print(f"Repeat mode: {'ON' if repeat_mode else 'OFF'}")
             elif command == 'playlist':
-                playlist_path = input("Enter playlist file path: ").strip()
-                if not os.path.exists(playlist_path):
-                    print(f"Error: Playlist file '{playlist_path}' not found.")
+                path = input("Enter playlist file path: ").strip()
+                if not os.path.exists(path):
+                    print(f"Error: Playlist file '{path}' not found.")
                     continue
                 
-                songs = load_m3u_playlist(playlist_path)
+                songs = load_m3u_playlist(path, lazy=True)
                 if songs:
                     queue = list(songs)
+                    playlist_path = path
                     print(f"Loaded {len(queue)} songs from playlist '{playlist_path}'.")
                 else:
                     print("No songs found in playlist or failed to load.")
             elif command == 'clear':
                 queue = []
+                playlist_path = None
                 print("Queue cleared.")
             elif command == 'info':
                 print("\n=== Playback Controls (available during playback) ===")
@@ -864,6 +1181,7 @@ def main():
         epilog='Examples:\n'
                '  python queue.py --playlist myplaylist.m3u --repeat\n'
                '  python queue.py --playlist myplaylist.m3u --shuffle --repeat-track\n'
+               '  python queue.py --resume\n'
                '  python queue.py --interactive',
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
@@ -876,18 +1194,36 @@ def main():
     parser.add_argument('--repeat', action='store_true', help='Enable queue repeat')
     parser.add_argument('--repeat-track', action='store_true', help='Enable track repeat')
     parser.add_argument('--start', type=int, default=0, help='Start index (0-based)')
+    parser.add_argument('--no-gapless', action='store_true', help='Disable gapless transitions between songs')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume the last session (with --playlist, only a session of that playlist)')
     
     # Interactive mode
     parser.add_argument('--interactive', action='store_true', help='Enter interactive mode')
     
     args = parser.parse_args()
     
+    # Pick up where the last run stopped
+    if args.resume:
+        restored = restore_session(args.playlist)
+        if restored:
+            queue_manager, playlist_path = restored
+            print(f"Resumed session: {len(queue_manager.songs)} songs, "
+                  f"at position {queue_manager.current_index + 1}")
+            play_queue_with_manager(queue_manager.songs, gapless=not args.no_gapless,
+                                    queue_manager=queue_manager, playlist_path=playlist_path)
+            return 0
+        if not args.playlist:
+            print("No session to resume. Use --playlist to start one.")
+            return 1
+        print("No saved session for this playlist, starting from the beginning")
+    
     # Load songs
     songs = []
     
     if args.playlist:
         # Load from playlist
-        songs = load_m3u_playlist(args.playlist)
+        songs = load_m3u_playlist(args.playlist, lazy=True)
         if not songs:
             print(f"Failed to load playlist: {args.playlist}")
             return 1
@@ -903,7 +1239,8 @@ def main():
         return 1
     
     # Start playback
-    play_queue(songs, args.shuffle, args.repeat, args.repeat_track, args.start)
+    play_queue(songs, args.shuffle, args.repeat, args.repeat_track, args.start, not args.no_gapless,
+               playlist_path=args.playlist)
     
     return 0
 
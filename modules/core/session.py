@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+save playback queues between runs so they can be resumed instantly
+"""
+import os
+import sys
+import time
+import zlib
+import marshal
+import sqlite3
+import argparse
+import logging
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional
+
+# Handle imports for both package and standalone execution
+try:
+    from .playlist import Song
+except ImportError:
+    import _standalone
+    _standalone.setup_path()
+    from core.playlist import Song
+
+logger = logging.getLogger('Session')
+
+# Environment variable overriding the session location ("off" disables saving)
+SESSION_ENV_VAR = 'WALRIO_SESSION'
+
+# Values of SESSION_ENV_VAR that disable sessions
+DISABLED_VALUES = frozenset({'0', 'off', 'no', 'false', 'none'})
+
+# Milliseconds to wait for another process writing to the session database
+BUSY_TIMEOUT_MS = 5000
+
+# zlib level for saved song lists (paths compress well; favour speed)
+COMPRESSION_LEVEL = 1
+
+
+def get_default_session_path() -> Optional[str]:
+    """
+    Get the location of the session database.
+
+    Uses $WALRIO_SESSION if set, otherwise session.db in the user's state
+    directory ($XDG_STATE_HOME/walrio or ~/.local/state/walrio).
+
+    Returns:
+        Path to the session database, or None if sessions are disabled.
+    """
+    override = os.environ.get(SESSION_ENV_VAR)
+    if override is not None:
+        if override.strip().lower() in DISABLED_VALUES:
+            return None
+        return os.path.expanduser(override)
+
+    state_home = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(state_home, 'walrio', 'session.db')
+
+
+def file_stamp(path: str) -> Optional[str]:
+    """
+    Get a stamp that changes whenever a file is modified.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        "size:mtime_ns" of the file, or None if it can't be read.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _pack(indices: Iterable[int]) -> bytes:
+    """Pack integers into a compact blob."""
+    return array('q', indices).tobytes()
+
+
+def _pack_songs(songs: Iterable[Song]) -> bytes:
+    """Pack Song records into a compressed blob."""
+    return zlib.compress(marshal.dumps([song.to_saved() for song in songs]), COMPRESSION_LEVEL)
+
+
+def _unpack_songs(blob: bytes) -> List[Song]:
+    """Unpack a blob written by _pack_songs()."""
+    return [Song.from_saved(values) for values in marshal.loads(zlib.decompress(blob))]
+
+
+def _unpack(blob: Optional[bytes]) -> array:
+    """Unpack a blob written by _pack()."""
+    values = array('q')
+    if blob:
+        values.frombytes(blob)
+    return values
+
+
+class SessionStore:
+    """
+    SQLite-backed store of saved playback queues.
+
+    Each session has a name (one per queue type and library), the source
+    it was built from with a validity stamp, the queue itself and the
+    playback state: position, shuffle and repeat modes and history. Queues
+    of song ids are stored as a packed array and queues of Song records as
+    one compressed blob of their saved fields, so restoring is a single
+    row read that never opens an audio file.
+
+    Connections are opened per thread, so the playback thread can save the
+    position while the command loop uses the same store.
+    """
+
+    def __init__(self, session_path: Optional[str] = None):
+        """
+        Initialize SessionStore.
+
+        Args:
+            session_path: Path to the session database (default: get_default_session_path()).
+        """
+        self.session_path = session_path or get_default_session_path()
+        self.enabled = self.session_path is not None
+        self._local = threading.local()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Get this thread's connection, opening it on first use."""
+        if not self.enabled:
+            return None
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+
+        try:
+            Path(self.session_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.session_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    name TEXT PRIMARY KEY,
+                    source TEXT,
+                    stamp TEXT,
+                    songs BLOB,
+                    song_ids BLOB,
+                    song_count INTEGER NOT NULL DEFAULT 0,
+                    current_index INTEGER NOT NULL DEFAULT 0,
+                    shuffle INTEGER NOT NULL DEFAULT 0,
+                    repeat_mode TEXT,
+                    history BLOB,
+                    forward_history BLOB,
+                    forward_queue BLOB,
+                    saved_at REAL
+                )
+            ''')
+        except (sqlite3.Error, OSError) as e:
+            logger.debug(f"Sessions disabled ({self.session_path}): {e}")
+            self.enabled = False
+            return None
+
+        self._local.conn = conn
+        return conn
+
+    def save(self, name: str, source: Optional[str], stamp: Optional[str],
+             songs: Optional[List[Song]] = None, song_ids: Optional[Iterable[int]] = None,
+             **state):
+        """
+        Save a whole queue, replacing the session of the same name.
+
+        Args:
+            name: Session name.
+            source: What the queue was built from (playlist or database path).
+            stamp: Validity stamp of the source at the time the queue was built.
+            songs: Queue of Song records (for playlist queues).
+            song_ids: Queue of database song ids (for database queues).
+            **state: Playback state, as accepted by save_state().
+        """
+        conn = self._connect()
+        if conn is None:
+            return
+
+        if song_ids is not None:
+            song_ids = array('q', song_ids)
+            count = len(song_ids)
+            song_ids = song_ids.tobytes()
+        else:
+            count = len(songs or ())
+        songs = _pack_songs(songs) if songs is not None else None
+
+        try:
+            conn.execute('BEGIN')
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (name, source, stamp, songs, song_ids, song_count) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (name, source, stamp, songs, song_ids, count)
+            )
+            self._update_state(conn, name, **state)
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            logger.debug(f"Could not save session '{name}': {e}")
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+
+    def save_state(self, name: str, **state):
+        """
+        Save only the playback state of an existing session.
+
+        Cheap enough to call on every track change.
+
+        Args:
+            name: Session name.
+            **state: current_index, shuffle, repeat_mode, history,
+                forward_history and forward_queue.
+        """
+        conn = self._connect()
+        if conn is None:
+            return
+
+        try:
+            self._update_state(conn, name, **state)
+        except sqlite3.Error as e:
+            logger.debug(f"Could not save session state '{name}': {e}")
+
+    def _update_state(self, conn: sqlite3.Connection, name: str, current_index: int = 0,
+                      shuffle: bool = False, repeat_mode: Optional[str] = None,
+                      history: Iterable[int] = (), forward_history: Iterable[int] = (),
+                      forward_queue: Iterable[int] = ()):
+        """Write the playback state columns of a session."""
+        conn.execute(
+            '''UPDATE sessions SET current_index = ?, shuffle = ?, repeat_mode = ?, history = ?,
+               forward_history = ?, forward_queue = ?, saved_at = ? WHERE name = ?''',
+            (current_index, int(shuffle), repeat_mode, _pack(history), _pack(forward_history),
+             _pack(forward_queue), time.time(), name)
+        )
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a saved session.
+
+        The caller checks 'stamp' against its source; songs and ids are
+        returned as saved, without touching the audio files.
+
+        Args:
+            name: Session name.
+
+        Returns:
+            Dictionary with source, stamp, songs (list of Song or None),
+            song_ids (array or None), current_index, shuffle, repeat_mode,
+            history, forward_history and forward_queue; None if there is no
+            such session.
+        """
+        conn = self._connect()
+        if conn is None:
+            return None
+
+        try:
+            row = conn.execute(
+                '''SELECT source, stamp, songs, song_ids, current_index, shuffle, repeat_mode, history,
+                          forward_history, forward_queue, saved_at
+                   FROM sessions WHERE name = ?''', (name,)
+            ).fetchone()
+            if row is None:
+                return None
+            songs = _unpack_songs(row[2]) if row[2] is not None else None
+        except (sqlite3.Error, zlib.error, ValueError, EOFError, TypeError) as e:
+            logger.debug(f"Could not load session '{name}': {e}")
+            return None
+
+        return {
+            'source': row[0],
+            'stamp': row[1],
+            'songs': songs,
+            'song_ids': _unpack(row[3]) if row[3] is not None else None,
+            'current_index': row[4],
+            'shuffle': bool(row[5]),
+            'repeat_mode': row[6],
+            'history': list(_unpack(row[7])),
+            'forward_history': list(_unpack(row[8])),
+            'forward_queue': list(_unpack(row[9])),
+            'saved_at': row[10],
+        }
+
+    def delete(self, name: str):
+        """
+        Remove a saved session.
+
+        Args:
+            name: Session name.
+        """
+        conn = self._connect()
+        if conn is None:
+            return
+        conn.execute('DELETE FROM sessions WHERE name = ?', (name,))
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """
+        List saved sessions.
+
+        Returns:
+            List of dictionaries with name, source, song_count, current_index and saved_at.
+        """
+        conn = self._connect()
+        if conn is None:
+            return []
+        rows = conn.execute(
+            'SELECT name, source, song_count, current_index, saved_at FROM sessions ORDER BY saved_at DESC'
+        ).fetchall()
+        return [dict(zip(('name', 'source', 'song_count', 'current_index', 'saved_at'), row)) for row in rows]
+
+
+# Global instance for convenience functions - lazy initialization
+_store = None
+
+def get_store() -> SessionStore:
+    """
+    Get or create the global SessionStore instance.
+
+    Returns:
+        SessionStore: The shared store.
+    """
+    global _store
+    if _store is None:
+        _store = SessionStore()
+    return _store
+
+
+def main():
+    """
+    Main function for command-line usage.
+
+    Returns:
+        int: Exit code (0 for success, 1 for failure)
+    """
+    parser = argparse.ArgumentParser(
+        description='Inspect and remove saved playback sessions',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+Examples:
+  # List saved sessions
+  python session.py --list
+
+  # Forget the playlist queue session
+  python session.py --delete queue
+
+Set {SESSION_ENV_VAR} to another path to relocate sessions, or to "off" to disable them.
+        """
+    )
+    parser.add_argument('--session-path', help='Path to the session database (default: user state directory)')
+    parser.add_argument('--list', action='store_true', help='List saved sessions')
+    parser.add_argument('--delete', metavar='NAME', help='Remove a saved session')
+
+    args = parser.parse_args()
+
+    store = SessionStore(args.session_path)
+    if not store.enabled:
+        print(f"Sessions are disabled ({SESSION_ENV_VAR}={os.environ.get(SESSION_ENV_VAR)})")
+        return 1
+
+    if args.delete:
+        store.delete(args.delete)
+        print(f"Removed session '{args.delete}'")
+    elif args.list:
+        sessions = store.list_sessions()
+        if not sessions:
+            print("No saved sessions")
+        for session in sessions:
+            saved = time.strftime('%Y-%m-%d %H:%M', time.localtime(session['saved_at'] or 0))
+            print(f"{session['name']}: {session['song_count']} songs, at #{session['current_index'] + 1}, "
+                  f"saved {saved} ({session['source'] or 'no source'})")
+    else:
+        parser.print_help()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+record play, skip and rating events without making playback wait on the library database
+"""
+import os
+import sys
+import time
+import uuid
+import sqlite3
+import argparse
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: journals of other processes can't be told apart from live ones
+    fcntl = None
+
+# Handle imports for both package and standalone execution
+try:
+    from . import library_db
+except ImportError:
+    import _standalone
+    _standalone.setup_path()
+    from core import library_db
+
+logger = logging.getLogger('Stats')
+
+# Seconds between flushes of buffered events into the songs table
+FLUSH_INTERVAL = 5.0
+
+# Buffered events that trigger a flush before the interval is up
+FLUSH_BATCH_SIZE = 256
+
+# Seconds the flusher waits for the database write lock (e.g. while a scan commits)
+BUSY_TIMEOUT = 30.0
+
+# Event kinds
+PLAY = 'play'
+SKIP = 'skip'
+RATING = 'rating'
+
+# A journal event: (sequence number, kind, song id, value); value is the
+# play time for PLAY, the rating for RATING and 0 for SKIP
+Event = Tuple[int, str, int, float]
+
+
+def get_journal_dir(db_path: str) -> str:
+    """
+    Get the directory holding the stats journals of a library database.
+
+    Args:
+        db_path: Path to the library database.
+
+    Returns:
+        str: "<database>-stats" next to the database, like SQLite's -wal file.
+    """
+    return os.path.abspath(db_path) + '-stats'
+
+
+def _segment_path(journal_dir: str, name: str, segment: int) -> str:
+    """Path of one segment of a journal."""
+    return os.path.join(journal_dir, f"{name}.{segment:06d}.journal")
+
+
+def _lock_path(journal_dir: str, name: str) -> str:
+    """Path of the file a live journal keeps locked."""
+    return os.path.join(journal_dir, f"{name}.lock")
+
+
+def _try_lock(path: str):
+    """
+    Take the lock file of a journal without waiting.
+
+    Returns:
+        The open lock file, or None if another process holds it.
+    """
+    try:
+        handle = open(path, 'a')
+    except OSError:
+        return None
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+    return handle
+
+
+def read_journal(path: str) -> List[Event]:
+    """
+    Read the events of a journal segment.
+
+    A line cut short by a crash is ignored.
+
+    Args:
+        path: Path of the segment.
+
+    Returns:
+        list: Events in the order they were recorded.
+    """
+    events = []
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except OSError:
+        return events
+    with f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if not line.endswith('\n') or len(parts) != 4:
+                continue
+            try:
+                events.append((int(parts[0]), parts[1], int(parts[2]), float(parts[3])))
+            except ValueError:
+                continue
+    return events
+
+
+def ensure_journal_table(conn: sqlite3.Connection):
+    """
+    Create the table recording how far each journal has been applied.
+
+    Args:
+        conn: Library database connection.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_journals (
+            name TEXT PRIMARY KEY,
+            applied_seq INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.commit()
+
+
+def apply_events(conn: sqlite3.Connection, name: str, events: List[Event]) -> int:
+    """
+    Apply journal events to the songs table in one transaction.
+
+    Events are folded per song first (plays and skips are summed, the last
+    rating wins), so a batch costs one UPDATE per song and a single commit.
+    The journal's applied sequence number is stored in the same
+    transaction and events at or below it are skipped, so replaying a
+    journal after a crash never counts a play twice.
+
+    Args:
+        conn: Library database connection.
+        name: Name of the journal the events come from.
+        events: Events in recording order.
+
+    Returns:
+        int: Number of events applied.
+
+    Raises:
+        sqlite3.Error: If the database can't be written; nothing is applied.
+    """
+    if not events:
+        return 0
+
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute('SELECT applied_seq FROM stats_journals WHERE name = ?', (name,)).fetchone()
+        applied_seq = row[0] if row else 0
+        events = [event for event in events if event[0] > applied_seq]
+
+        plays: Dict[int, Tuple[int, int]] = {}
+        skips: Dict[int, int] = {}
+        ratings: Dict[int, float] = {}
+        for _, kind, song_id, value in events:
+            if kind == PLAY:
+                count, last_played = plays.get(song_id, (0, 0))
+                plays[song_id] = (count + 1, max(last_played, int(value)))
+            elif kind == SKIP:
+                skips[song_id] = skips.get(song_id, 0) + 1
+            elif kind == RATING:
+                ratings[song_id] = value
+
+        conn.executemany(
+            'UPDATE songs SET playcount = playcount + ?, lastplayed = MAX(COALESCE(lastplayed, 0), ?) WHERE id = ?',
+            [(count, last_played, song_id) for song_id, (count, last_played) in plays.items()]
+        )
+        conn.executemany(
+            'UPDATE songs SET skipcount = skipcount + ? WHERE id = ?',
+            [(count, song_id) for song_id, count in skips.items()]
+        )
+        conn.executemany(
+            'UPDATE songs SET rating = ? WHERE id = ?',
+            [(rating, song_id) for song_id, rating in ratings.items()]
+        )
+        if events:
+            conn.execute('INSERT OR REPLACE INTO stats_journals (name, applied_seq) VALUES (?, ?)',
+                         (name, max(event[0] for event in events)))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return len(events)
+
+
+def recover_journals(conn: sqlite3.Connection, journal_dir: str, skip_name: Optional[str] = None) -> int:
+    """
+    Apply and remove the journals left behind by processes that exited or crashed.
+
+    Journals whose owner is still running (it holds their lock file) are
+    left alone.
+
+    Args:
+        conn: Library database connection.
+        journal_dir: Directory holding the journals.
+        skip_name: Journal of the calling process, never recovered.
+
+    Returns:
+        int: Number of events applied.
+    """
+    try:
+        filenames = os.listdir(journal_dir)
+    except OSError:
+        return 0
+
+    segments: Dict[str, List[str]] = {}
+    for filename in filenames:
+        name = filename.split('.', 1)[0]
+        if name != skip_name and (filename.endswith('.journal') or filename.endswith('.lock')):
+            segments.setdefault(name, [])
+            if filename.endswith('.journal'):
+                segments[name].append(os.path.join(journal_dir, filename))
+
+    ensure_journal_table(conn)
+    applied = 0
+    for name, paths in segments.items():
+        lock = _try_lock(_lock_path(journal_dir, name))
+        if lock is None:
+            continue  # Still in use
+        try:
+            events = []
+            for path in sorted(paths):
+                events.extend(read_journal(path))
+            applied += apply_events(conn, name, events)
+            for path in paths:
+                os.remove(path)
+            conn.execute('DELETE FROM stats_journals WHERE name = ?', (name,))
+            conn.commit()
+            os.remove(_lock_path(journal_dir, name))
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not recover stats journal '{name}': {e}")
+        finally:
+            lock.close()
+    return applied
+
+
+class StatsJournal:
+    """
+    Write-behind recorder of playback statistics.
+
+    Recording an event appends one line to an append-only journal file and
+    to an in-memory buffer, which costs a buffered write and no fsync or
+    database lock, so the playback thread never waits on SQLite. A
+    background thread folds the buffered events into the songs table in
+    one transaction every few seconds, or as soon as enough have piled up,
+    then drops the journal segments it has applied.
+
+    The journal is what makes this crash-safe: whatever was recorded but
+    not yet flushed is replayed into the database by the next journal
+    opened on the same library (see recover_journals()). Each process
+    writes its own journal, locked while it runs, so several players can
+    share a library.
+    """
+
+    def __init__(self, db_path: str, journal_dir: Optional[str] = None,
+                 flush_interval: float = FLUSH_INTERVAL):
+        """
+        Initialize StatsJournal and start its flusher thread.
+
+        Args:
+            db_path: Path to the library database.
+            journal_dir: Directory for journal files (default: get_journal_dir(db_path)).
+            flush_interval: Seconds between flushes.
+        """
+        self.db_path = db_path
+        self.journal_dir = journal_dir or get_journal_dir(db_path)
+        self.flush_interval = flush_interval
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()  # Guards the buffer and the journal file
+        self._wake = threading.Event()
+        self._buffer: List[Event] = []
+        self._seq = 0
+        self._segment = 0
+        self._file = None
+        self._lock_file = None
+        self._stopping = False
+
+        try:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._lock_file = _try_lock(_lock_path(self.journal_dir, self.name))
+            self._file = open(_segment_path(self.journal_dir, self.name, self._segment), 'a', encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"Stats journal unavailable, events are only kept in memory until flushed: {e}")
+
+        self._thread = threading.Thread(target=self._run, name='walrio-stats', daemon=True)
+        self._thread.start()
+
+    def record(self, kind: str, song_id: int, value: float = 0):
+        """
+        Record an event.
+
+        Args:
+            kind: PLAY, SKIP or RATING.
+            song_id: Database id of the song.
+            value: Play time for PLAY, rating for RATING.
+        """
+        with self._lock:
+            self._seq += 1
+            event = (self._seq, kind, int(song_id), float(value))
+            self._buffer.append(event)
+            if self._file is not None:
+                try:
+                    self._file.write(f"{event[0]}\t{kind}\t{event[2]}\t{event[3]!r}\n")
+                    self._file.flush()
+                except OSError as e:
+                    logger.warning(f"Could not write stats journal: {e}")
+                    self._file = None
+            if len(self._buffer) >= FLUSH_BATCH_SIZE:
+                self._wake.set()
+
+    def record_play(self, song_id: int, played_at: Optional[float] = None):
+        """
+        Record that a song was played to the end.
+
+        Args:
+            song_id: Database id of the song.
+            played_at: Unix time of the play (default: now).
+        """
+        self.record(PLAY, song_id, played_at if played_at is not None else time.time())
+
+    def record_skip(self, song_id: int):
+        """
+        Record that a song was skipped before finishing.
+
+        Args:
+            song_id: Database id of the song.
+        """
+        self.record(SKIP, song_id)
+
+    def record_rating(self, song_id: int, rating: float) -> bool:
+        """
+        Record a new rating for a song.
+
+        Args:
+            song_id: Database id of the song.
+            rating: Rating value (0.0 to 5.0).
+
+        Returns:
+            bool: True if recorded, False if the rating is out of range.
+        """
+        if not 0.0 <= rating <= 5.0:
+            print(f"Invalid rating: {rating}. Must be between 0.0 and 5.0")
+            return False
+        self.record(RATING, song_id, rating)
+        return True
+
+    def flush(self):
+        """Ask the flusher thread to write buffered events now."""
+        self._wake.set()
+
+    def _rotate(self) -> Optional[str]:
+        """Start a new journal segment; the lock must be held. Returns the finished segment."""
+        if self._file is None:
+            return None
+        finished = self._file.name
+        self._file.close()
+        self._segment += 1
+        try:
+            self._file = open(_segment_path(self.journal_dir, self.name, self._segment), 'a', encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"Could not write stats journal: {e}")
+            self._file = None
+        return finished
+
+    def _flush(self, conn: sqlite3.Connection, finished_segments: List[str]) -> bool:
+        """Apply the buffered events; runs on the flusher thread."""
+        with self._lock:
+            events, self._buffer = self._buffer, []
+            if events:
+                finished = self._rotate()
+                if finished is not None:
+                    finished_segments.append(finished)
+        if not events:
+            return True
+
+        try:
+            apply_events(conn, self.name, events)
+        except sqlite3.Error as e:
+            # Keep them for the next attempt; they are still in the journal
+            logger.warning(f"Could not save playback stats, will retry: {e}")
+            with self._lock:
+                self._buffer[:0] = events
+            return False
+
+        for path in finished_segments:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        finished_segments.clear()
+        return True
+
+    def _run(self):
+        """Flusher thread: recover old journals, then flush periodically until closed."""
+        try:
+            conn = library_db.connect(self.db_path, timeout=BUSY_TIMEOUT)
+            ensure_journal_table(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Playback stats can't be saved to {self.db_path}: {e}")
+            return
+
+        try:
+            recovered = recover_journals(conn, self.journal_dir, skip_name=self.name)
+            if recovered:
+                logger.info(f"Recovered {recovered} unsaved playback stats events")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not recover stats journals: {e}")
+
+        finished_segments: List[str] = []
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            stopping = self._stopping
+            flushed = self._flush(conn, finished_segments)
+            if stopping:
+                break
+
+        if flushed:
+            # Everything is in the database, so this journal can go
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                    try:
+                        os.remove(_segment_path(self.journal_dir, self.name, self._segment))
+                    except OSError:
+                        pass
+            try:
+                conn.execute('DELETE FROM stats_journals WHERE name = ?', (self.name,))
+                conn.commit()
+                os.remove(_lock_path(self.journal_dir, self.name))
+            except (sqlite3.Error, OSError):
+                pass
+        conn.close()
+
+    def close(self, timeout: float = BUSY_TIMEOUT):
+        """
+        Flush outstanding events and stop the flusher thread.
+
+        Events that can't be written within timeout stay in the journal
+        and are applied the next time the library is opened.
+
+        Args:
+            timeout: Seconds to wait for the final flush.
+        """
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self._lock_file is not None and not self._thread.is_alive():
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def main():
+    """
+    Main function for command-line usage.
+
+    Returns:
+        int: Exit code (0 for success, 1 for failure)
+    """
+    parser = argparse.ArgumentParser(
+        description='Apply playback stats left in journals by players that exited or crashed',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Save unsaved plays, skips and ratings into the library
+  python stats.py --db-path walrio_library.db
+
+Journals live in <database>-stats/ and are also recovered automatically
+whenever a player opens the library.
+        """
+    )
+    parser.add_argument('--db-path', default='walrio_library.db',
+                        help='Path to database file (default: walrio_library.db)')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        print(f"Error: Database not found: {args.db_path}")
+        return 1
+
+    try:
+        conn = library_db.connect(args.db_path, timeout=BUSY_TIMEOUT)
+        recovered = recover_journals(conn, get_journal_dir(args.db_path))
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error saving playback stats: {e}")
+        return 1
+
+    print(f"Applied {recovered} playback stats events")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,28 +5,379 @@ smart/dynamic playlist manager for database-powered playlists.
 import os
 import sys
 import json
+import functools
+import random
 import sqlite3
 import argparse
-from typing import List, Dict, Optional, Any
+from array import array
+from typing import List, Dict, Optional, Any, Iterable
 from pathlib import Path
 
 # Add parent directory for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from core.playlist import create_m3u_playlist
+from core.playlist import create_m3u_playlist, M3U_COLUMNS
+from core import database, library_db
+
+# sort_by values that shuffle the playlist ("random:<weight>" favours songs by
+# a database.SAMPLE_WEIGHTS key, e.g. random:rating)
+RANDOM_SORT = 'random'
+
+# Changed songs above which a playlist is rebuilt instead of patched
+INCREMENTAL_MAX_CHANGES = 10000
+
+# Songs columns rules and sorts may use, by the type their values are compared as
+RULE_FIELDS = {
+    'title': 'text', 'album': 'text', 'artist': 'text', 'albumartist': 'text',
+    'genre': 'text', 'composer': 'text', 'performer': 'text', 'grouping': 'text',
+    'url': 'text', 'basefilename': 'text', 'filetype': 'text',
+    'track': 'int', 'disc': 'int', 'year': 'int', 'originalyear': 'int',
+    'length': 'int', 'bitrate': 'int', 'samplerate': 'int', 'bitdepth': 'int',
+    'filesize': 'int', 'mtime': 'int', 'ctime': 'int', 'compilation': 'int',
+    'playcount': 'int', 'skipcount': 'int', 'lastplayed': 'int', 'lastseen': 'int',
+    'rating': 'real',
+}
+
+# Rule operators; LIKE and NOT LIKE only apply to text fields, IN and NOT IN
+# take a list (or comma-separated string) of values, BETWEEN a pair
+COMPARISON_OPERATORS = ('=', '!=', '>', '<', '>=', '<=')
+TEXT_OPERATORS = ('LIKE', 'NOT LIKE')
+LIST_OPERATORS = ('IN', 'NOT IN')
+RULE_OPERATORS = COMPARISON_OPERATORS + TEXT_OPERATORS + LIST_OPERATORS + ('BETWEEN',)
+
+# How deep rule groups may nest
+RULE_MAX_DEPTH = 8
+
+# Compiled rule sets kept, keyed by their JSON
+RULE_CACHE_SIZE = 256
+
+# Prepared statements sqlite3 keeps per connection (its default is 128)
+STATEMENT_CACHE_SIZE = 512
+
+# Indexes the index advisor manages are named with this prefix; it never
+# touches any other index
+AUTO_INDEX_PREFIX = 'idx_songs_auto_'
+
+# Most indexes the advisor keeps, and most columns in one of them
+AUTO_INDEX_MAX = 12
+AUTO_INDEX_MAX_COLUMNS = 4
+
+# How a rule lets an index find its songs, best first: an equality lookup, a
+# range scan, or not at all (the field is only checked)
+ACCESS_RANK = {'eq': 2, 'range': 1, 'other': 0}
+
+# Condition selecting a playlist's materialized songs, taking the playlist id
+MEMBERS_CONDITION = "id IN (SELECT song_id FROM smart_playlist_songs WHERE playlist_id = ?)"
+
+
+class CompiledRules:
+    """
+    A playlist's rules compiled to SQL.
+    
+    condition and params select the matching songs. fields names every
+    column the rules read, and paths describes how an index could find the
+    songs: one {field: 'eq' | 'range' | 'other'} dict per OR'ed branch.
+    """
+    
+    __slots__ = ('condition', 'params', 'fields', 'paths')
+    
+    def __init__(self, condition: str, params: tuple, fields: frozenset, paths: tuple):
+        """
+        Initialize CompiledRules.
+        
+        Args:
+            condition: SQL condition matching the songs.
+            params: Parameters for the condition's placeholders.
+            fields: Every field the rules read.
+            paths: One {field: access} dict per OR'ed branch.
+        """
+        self.condition = condition
+        self.params = params
+        self.fields = fields
+        self.paths = paths
+
+
+def _rule_field(name: Any) -> str:
+    """Check a rule or sort field against RULE_FIELDS and normalize it."""
+    field = str(name).strip().lower()
+    if field not in RULE_FIELDS:
+        raise ValueError(f"Unknown field: {name!r} (expected one of {', '.join(sorted(RULE_FIELDS))})")
+    return field
+
+
+def _rule_value(field: str, value: Any) -> Any:
+    """Convert a rule value to the type of its field."""
+    kind = RULE_FIELDS[field]
+    if kind == 'text':
+        return str(value)
+    try:
+        if kind == 'int':
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} compares numbers, got {value!r}")
+
+
+def _rule_values(value: Any) -> list:
+    """Get the values of an IN or BETWEEN rule."""
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [part.strip() for part in str(value).split(',') if part.strip()]
+
+
+def _compile_rule(rule: Dict[str, Any], params: list) -> tuple:
+    """
+    Compile one rule, adding its values to params.
+    
+    Returns:
+        Tuple of (condition, {field: access})
+    """
+    field = _rule_field(rule.get('field', ''))
+    operator = ' '.join(str(rule.get('operator', '')).upper().split())
+    if operator == '<>':
+        operator = '!='
+    if operator not in RULE_OPERATORS:
+        raise ValueError(f"Unknown operator: {rule.get('operator')!r} (expected one of {', '.join(RULE_OPERATORS)})")
+    if operator in TEXT_OPERATORS and RULE_FIELDS[field] != 'text':
+        raise ValueError(f"{operator} only applies to text fields, not {field}")
+    value = rule.get('value')
+    
+    if operator in LIST_OPERATORS:
+        values = _rule_values(value)
+        if not values:
+            raise ValueError(f"{operator} on {field} needs at least one value")
+        params.extend(_rule_value(field, item) for item in values)
+        access = 'range' if operator == 'IN' else 'other'
+        return f"{field} {operator} ({', '.join('?' * len(values))})", {field: access}
+    
+    if operator == 'BETWEEN':
+        values = _rule_values(value)
+        if len(values) != 2:
+            raise ValueError(f"BETWEEN on {field} needs two values, got {value!r}")
+        params.extend(_rule_value(field, item) for item in values)
+        return f"{field} BETWEEN ? AND ?", {field: 'range'}
+    
+    if operator in TEXT_OPERATORS:
+        params.append(str(value))
+        return f"{field} {operator} ?", {field: 'other'}
+    
+    params.append(_rule_value(field, value))
+    access = 'eq' if operator == '=' else 'other' if operator == '!=' else 'range'
+    return f"{field} {operator} ?", {field: access}
+
+
+def _merge_access(path: Dict[str, str], access: Dict[str, str]):
+    """Add a rule's fields to an AND'ed branch, keeping each field's best access."""
+    for field, kind in access.items():
+        if field not in path or ACCESS_RANK[kind] > ACCESS_RANK[path[field]]:
+            path[field] = kind
+
+
+def _compile_group(rules: Any, params: list, depth: int = 0) -> tuple:
+    """
+    Compile a list of rules and groups joined by their 'logic' connectors.
+    
+    Connectors follow SQL precedence (AND before OR), as the rules always
+    have; a group ({'rules': [...], 'logic': ...}) is compiled in brackets.
+    
+    Returns:
+        Tuple of (condition, paths)
+    """
+    if depth > RULE_MAX_DEPTH:
+        raise ValueError(f"Rule groups nest deeper than {RULE_MAX_DEPTH} levels")
+    if not isinstance(rules, list) or not rules:
+        raise ValueError("A rule group needs at least one rule")
+    
+    parts = []
+    paths = [{}]
+    for i, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Not a rule: {rule!r}")
+        if 'rules' in rule:
+            condition, group_paths = _compile_group(rule['rules'], params, depth + 1)
+            parts.append(f"({condition})")
+            if len(group_paths) == 1:
+                access = group_paths[0]
+            else:
+                # An OR'ed group can only be checked row by row
+                access = {field: 'other' for path in group_paths for field in path}
+        else:
+            condition, access = _compile_rule(rule, params)
+            parts.append(condition)
+        _merge_access(paths[-1], access)
+        
+        # Add logic connector if not last rule
+        if i < len(rules) - 1:
+            logic = str(rule.get('logic') or 'AND').strip().upper()
+            if logic not in ('AND', 'OR'):
+                raise ValueError(f"Unknown logic: {rule.get('logic')!r} (expected AND or OR)")
+            parts.append(logic)
+            if logic == 'OR':
+                paths.append({})
+    
+    return " ".join(parts), paths
+
+
+@functools.lru_cache(maxsize=RULE_CACHE_SIZE)
+def _compile_rules_json(rules_json: str) -> CompiledRules:
+    """Compile rules given as JSON (see compile_rules())."""
+    params = []
+    condition, paths = _compile_group(json.loads(rules_json), params)
+    fields = frozenset(field for path in paths for field in path)
+    return CompiledRules(f"unavailable = 0 AND ({condition})", tuple(params), fields,
+                         tuple(paths))
+
+
+def compile_rules(rules: List[Dict[str, Any]]) -> CompiledRules:
+    """
+    Compile playlist rules into a parameterized WHERE condition.
+    
+    Fields and operators are checked against RULE_FIELDS and
+    RULE_OPERATORS and values converted to their field's type, so only
+    the values ever reach SQL, as parameters. Rule sets are compiled once:
+    the same rules give back the same CompiledRules, and the same
+    condition text lets sqlite3 reuse its prepared statement.
+    
+    Args:
+        rules: Rules as described in SmartPlaylistManager.create_playlist()
+        
+    Returns:
+        CompiledRules for the rules
+        
+    Raises:
+        ValueError: If a rule names an unknown field, operator or logic, or
+                    a value doesn't fit its field
+    """
+    return _compile_rules_json(json.dumps(rules, sort_keys=True))
+
+
+def compile_sort(sort_by: Optional[str], sort_desc: bool = False) -> tuple:
+    """
+    Parse a sort_by value ("artist, album, disc, track", "playcount DESC").
+    
+    Args:
+        sort_by: Comma-separated fields, each optionally followed by ASC or DESC
+        sort_desc: Direction of the fields that don't give one
+        
+    Returns:
+        Tuple of (field, descending) pairs
+        
+    Raises:
+        ValueError: If a field is unknown or a direction malformed
+    """
+    terms = []
+    for part in (sort_by or '').split(','):
+        words = part.split()
+        if not words:
+            continue
+        field = _rule_field(words[0])
+        if len(words) > 2 or (len(words) == 2 and words[1].upper() not in ('ASC', 'DESC')):
+            raise ValueError(f"Bad sort: {part.strip()!r} (expected '<field> [ASC|DESC]')")
+        descending = words[1].upper() == 'DESC' if len(words) == 2 else sort_desc
+        terms.append((field, descending))
+    return tuple(terms)
+
+
+def order_clause(terms: tuple) -> str:
+    """
+    Turn compile_sort() terms into an ORDER BY clause.
+    
+    Args:
+        terms: Tuple of (field, descending) pairs from compile_sort()
+        
+    Returns:
+        The ORDER BY clause with a leading space, or '' for no terms
+    """
+    if not terms:
+        return ""
+    return " ORDER BY " + ", ".join(f"{field} DESC" if descending else field
+                                    for field, descending in terms)
+
+
+def check_limit(limit_count: Any) -> Optional[int]:
+    """
+    Check a playlist's song limit.
+    
+    Args:
+        limit_count: Limit as given by the user or stored (None, 0 or '' for no limit)
+        
+    Returns:
+        The limit as an int, or None for no limit
+        
+    Raises:
+        ValueError: If the limit isn't a positive whole number
+    """
+    if limit_count in (None, 0, ''):
+        return None
+    try:
+        limit = int(str(limit_count).strip())
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise ValueError(f"Limit must be a positive whole number, got {limit_count!r}")
+    return limit or None
+
+
+def format_rules(rules: List[Dict[str, Any]]) -> str:
+    """
+    Describe rules as one line, groups in brackets.
+    
+    Args:
+        rules: List of rule dictionaries, as stored with a playlist
+        
+    Returns:
+        The rules joined by their logic operators
+    """
+    parts = []
+    for i, rule in enumerate(rules):
+        if 'rules' in rule:
+            parts.append(f"({format_rules(rule['rules'])})")
+        else:
+            parts.append(f"{rule.get('field')} {rule.get('operator')} {rule.get('value')}")
+        if i < len(rules) - 1:
+            parts.append(str(rule.get('logic') or 'AND').upper())
+    return " ".join(parts)
+
+
+def index_name(key: tuple) -> str:
+    """
+    Name the advisor's index on some columns.
+    
+    Args:
+        key: Tuple of the index's (field, descending) columns
+        
+    Returns:
+        The index name, starting with AUTO_INDEX_PREFIX
+    """
+    return AUTO_INDEX_PREFIX + "_".join(field + ("_desc" if descending else "") for field, descending in key)
 
 
 class SmartPlaylistManager:
     """
     Manages smart playlists that generate song lists based on database queries.
+    
+    Each playlist's matching songs are materialized in smart_playlist_songs
+    along with the library version they were computed at. Generating a
+    playlist again only looks at songs changed since then in columns its
+    rules (or, for limited playlists, its sort) depend on: nothing to do if
+    there are none, the changed rows re-checked otherwise, and a full
+    rebuild only for limited playlists or large changes.
+    
+    Rules are compiled by compile_rules(), and the indexes they and the
+    playlists' sorts call for are kept up by update_indexes() whenever a
+    playlist is created, changed or deleted.
     """
     
-    def __init__(self, db_path: str = 'walrio_library.db'):
+    def __init__(self, db_path: str = 'walrio_library.db', auto_index: bool = True):
         """
         Initialize smart playlist manager.
         
         Args:
             db_path: Path to the SQLite database file
+            auto_index: Update the advised indexes when playlists change
             
         Raises:
             FileNotFoundError: If database doesn't exist
@@ -35,18 +386,35 @@ class SmartPlaylistManager:
             raise FileNotFoundError(f"Database not found: {db_path}")
         
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row
+        self.auto_index = auto_index
+        # Reads use this thread's connection; writes queue for the single writer
+        self.library = library_db.LibraryDatabase(db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        self._generated = {}  # playlist id -> (library version, sorted song ids)
         self._ensure_tables()
     
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        The calling thread's database connection.
+        
+        Returns:
+            sqlite3.Connection: Connection whose rows are sqlite3.Row.
+        """
+        return self.library.connection()
+    
     def __del__(self):
-        """Close database connection."""
-        if hasattr(self, 'conn'):
-            self.conn.close()
+        """Close database connections."""
+        if hasattr(self, 'library'):
+            self.library.close()
     
     def _ensure_tables(self):
         """Create smart_playlists table if it doesn't exist."""
-        cursor = self.conn.cursor()
+        with self.library.writer() as conn:
+            self._create_tables(conn.cursor())
+        database.ensure_change_tracking(self.conn)
+    
+    def _create_tables(self, cursor: sqlite3.Cursor):
+        """Create the smart playlist tables on the writer's cursor."""
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS smart_playlists (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -59,7 +427,19 @@ class SmartPlaylistManager:
                 modified INTEGER DEFAULT (strftime('%s', 'now'))
             )
         ''')
-        self.conn.commit()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS smart_playlist_songs (
+                playlist_id INTEGER NOT NULL,
+                song_id INTEGER NOT NULL,
+                PRIMARY KEY (playlist_id, song_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS smart_playlist_cache (
+                playlist_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
     
     def create_playlist(self, name: str, rules: List[Dict[str, Any]], 
                        sort_by: str = 'artist, album, disc, track',
@@ -71,39 +451,65 @@ class SmartPlaylistManager:
         Args:
             name: Playlist name
             rules: List of rule dictionaries with keys:
-                   - field: Column name (genre, artist, playcount, etc.)
-                   - operator: Comparison operator (=, !=, >, <, >=, <=, LIKE, NOT LIKE)
-                   - value: Value to compare against
+                   - field: Column name (a RULE_FIELDS key: genre, artist, playcount, etc.)
+                   - operator: Comparison operator (=, !=, >, <, >=, <=, LIKE, NOT LIKE,
+                     IN, NOT IN, BETWEEN)
+                   - value: Value to compare against (a list for IN, NOT IN and BETWEEN)
                    - logic: 'AND' or 'OR' (for combining with next rule)
-            sort_by: Column(s) to sort by (comma-separated)
-            sort_desc: Sort descending if True
+                   A {'rules': [...], 'logic': ...} dictionary in place of a
+                   rule groups its rules in brackets.
+            sort_by: Column(s) to sort by (comma-separated, each optionally
+                     followed by ASC or DESC), or 'random'
+            sort_desc: Sort the columns that give no direction descending if True
             limit_count: Maximum number of songs (None for unlimited)
             
         Returns:
             Playlist ID
             
+        Raises:
+            ValueError: If the rules, sort or limit are invalid
+            
         Example:
             rules = [
                 {'field': 'genre', 'operator': 'LIKE', 'value': '%Jazz%', 'logic': 'AND'},
-                {'field': 'playcount', 'operator': '>', 'value': 5}
+                {'rules': [
+                    {'field': 'playcount', 'operator': '>', 'value': 5, 'logic': 'OR'},
+                    {'field': 'rating', 'operator': '>=', 'value': 4}
+                ]}
             ]
         """
-        cursor = self.conn.cursor()
-        
         # Validate rules
         if not rules:
             raise ValueError("At least one rule is required")
+        self._validate(rules, sort_by, limit_count)
         
         # Serialize rules to JSON
         rules_json = json.dumps(rules)
         
-        cursor.execute('''
-            INSERT INTO smart_playlists (name, rules, sort_by, sort_desc, limit_count)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (name, rules_json, sort_by, 1 if sort_desc else 0, limit_count))
-        
-        self.conn.commit()
-        return cursor.lastrowid
+        with self.library.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO smart_playlists (name, rules, sort_by, sort_desc, limit_count)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, rules_json, sort_by, 1 if sort_desc else 0, limit_count))
+        playlist_id = cursor.lastrowid
+        if self.auto_index:
+            self.update_indexes()
+        return playlist_id
+    
+    def _validate(self, rules: Optional[List[Dict[str, Any]]], sort_by: Optional[str],
+                  limit_count: Optional[int]):
+        """Check the given parts of a playlist definition, raising ValueError if invalid."""
+        if rules is not None:
+            compile_rules(rules)
+        if sort_by is not None:
+            is_random, weight = self._random_sort(sort_by)
+            if not is_random:
+                compile_sort(sort_by)
+            elif weight is not None and weight not in database.SAMPLE_WEIGHTS:
+                raise ValueError(f"Unknown random weight: {weight!r} "
+                                 f"(expected one of {', '.join(database.SAMPLE_WEIGHTS)})")
+        check_limit(limit_count)
     
     def update_playlist(self, playlist_id: int, name: Optional[str] = None,
                        rules: Optional[List[Dict[str, Any]]] = None,
@@ -120,7 +526,14 @@ class SmartPlaylistManager:
             sort_by: New sort column(s) (if provided)
             sort_desc: New sort direction (if provided)
             limit_count: New limit (if provided)
+            
+        Raises:
+            ValueError: If the new rules, sort or limit are invalid
         """
+        if rules is not None and not rules:
+            raise ValueError("At least one rule is required")
+        self._validate(rules, sort_by, limit_count)
+        
         updates = []
         params = []
         
@@ -148,19 +561,30 @@ class SmartPlaylistManager:
             updates.append("modified = strftime('%s', 'now')")
             params.append(playlist_id)
             
-            cursor = self.conn.cursor()
-            cursor.execute(f'''
-                UPDATE smart_playlists
-                SET {', '.join(updates)}
-                WHERE id = ?
-            ''', params)
-            self.conn.commit()
+            with self.library.writer() as conn:
+                conn.execute(f'''
+                    UPDATE smart_playlists
+                    SET {', '.join(updates)}
+                    WHERE id = ?
+                ''', params)
+            self._invalidate(playlist_id)
+            if self.auto_index:
+                self.update_indexes()
     
     def delete_playlist(self, playlist_id: int):
         """Delete a smart playlist by ID."""
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM smart_playlists WHERE id = ?", (playlist_id,))
-        self.conn.commit()
+        with self.library.writer() as conn:
+            conn.execute("DELETE FROM smart_playlists WHERE id = ?", (playlist_id,))
+            conn.execute("DELETE FROM smart_playlist_songs WHERE playlist_id = ?", (playlist_id,))
+        self._invalidate(playlist_id)
+        if self.auto_index:
+            self.update_indexes()
+    
+    def _invalidate(self, playlist_id: int):
+        """Drop a playlist's materialized songs so they are rebuilt from its rules."""
+        with self.library.writer() as conn:
+            conn.execute("DELETE FROM smart_playlist_cache WHERE playlist_id = ?", (playlist_id,))
+        self._generated.pop(playlist_id, None)
     
     def get_playlist(self, playlist_id: int) -> Optional[Dict]:
         """Get smart playlist definition by ID.
@@ -232,76 +656,309 @@ class SmartPlaylistManager:
         
         return playlists
     
+    def _build_conditions(self, rules: List[Dict[str, Any]]) -> tuple:
+        """
+        Build the WHERE condition selecting a playlist's songs.
+        
+        Returns:
+            Tuple of (condition, parameters)
+        """
+        compiled = compile_rules(rules)
+        return compiled.condition, list(compiled.params)
+    
+    def _random_sort(self, sort_by: Optional[str]) -> tuple:
+        """
+        Check whether a sort_by value asks for random order.
+        
+        Returns:
+            Tuple of (is_random, weight or None)
+        """
+        if not sort_by:
+            return False, None
+        sort, _, weight = sort_by.strip().lower().partition(':')
+        if sort not in (RANDOM_SORT, 'random()'):
+            return False, None
+        return True, weight.strip() or None
+    
     def _build_query(self, rules: List[Dict[str, Any]], sort_by: str, 
-                     sort_desc: bool, limit_count: Optional[int]) -> tuple:
+                     sort_desc: bool, limit_count: Optional[int], columns: str = "*") -> tuple:
         """
         Build SQL query from rules.
         
         Returns:
             Tuple of (query_string, parameters)
         """
-        query = "SELECT * FROM songs WHERE unavailable = 0"
-        params = []
-        
-        if rules:
-            conditions = []
-            for i, rule in enumerate(rules):
-                field = rule['field']
-                operator = rule['operator'].upper()
-                value = rule['value']
-                
-                # Build condition
-                conditions.append(f"{field} {operator} ?")
-                params.append(value)
-                
-                # Add logic connector if not last rule
-                if i < len(rules) - 1:
-                    logic = rule.get('logic', 'AND').upper()
-                    conditions.append(logic)
-            
-            query += " AND (" + " ".join(conditions) + ")"
+        condition, params = self._build_conditions(rules)
+        query = f"SELECT {columns} FROM songs WHERE {condition}"
         
         # Add sorting
-        if sort_by:
-            query += f" ORDER BY {sort_by}"
-            if sort_desc:
-                query += " DESC"
+        if self._random_sort(sort_by)[0]:
+            query += " ORDER BY RANDOM()"
+        else:
+            query += order_clause(compile_sort(sort_by, sort_desc))
         
         # Add limit
+        limit_count = check_limit(limit_count)
         if limit_count:
-            query += f" LIMIT {limit_count}"
+            query += " LIMIT ?"
+            params.append(limit_count)
         
         return query, params
     
-    def generate_songs(self, playlist_id: int) -> List[Dict]:
+    def _referenced_columns(self, playlist: Dict) -> set:
         """
-        Generate song list from smart playlist rules.
+        Find the songs columns that decide which songs are in a playlist.
+        
+        Returns:
+            Set of column names
+        """
+        columns = {'unavailable'} | compile_rules(playlist['rules']).fields
+        if playlist['limit_count'] and not self._random_sort(playlist['sort_by'])[0]:
+            # Which songs make the cut depends on the order too
+            columns.update(field for field, _ in compile_sort(playlist['sort_by']))
+        return columns
+    
+    def _index_candidates(self, playlist: Dict) -> List[tuple]:
+        """
+        Work out the indexes that would answer a playlist's query.
+        
+        A limited, sorted playlist wants its equality fields followed by its
+        sort, so the first songs in index order are the ones it keeps.
+        Otherwise each OR'ed branch of the rules wants its equality fields
+        and one range field; a branch no index can narrow down means a full
+        scan anyway, and nothing is wanted. The other fields the rules read
+        are added after those so the index covers the query.
+        
+        Returns:
+            List of index keys, each a tuple of (field, descending) pairs
+        """
+        compiled = compile_rules(playlist['rules'])
+        is_random = self._random_sort(playlist['sort_by'])[0]
+        
+        if playlist['limit_count'] and not is_random and len(compiled.paths) == 1:
+            sort = compile_sort(playlist['sort_by'], playlist['sort_desc'])
+            if sort:
+                path = compiled.paths[0]
+                equal = sorted(field for field, kind in path.items() if kind == 'eq')
+                sort = [term for term in sort if term[0] not in equal]
+                if len({descending for _, descending in sort}) == 1:
+                    # SQLite walks an index backwards just as well
+                    sort = [(field, False) for field, _ in sort]
+                key = [(field, False) for field in equal] + sort
+                key += [(field, False) for field in sorted(path) if field not in dict(key)]
+                return [tuple(key[:AUTO_INDEX_MAX_COLUMNS])]
+        
+        candidates = []
+        for path in compiled.paths:
+            equal = sorted(field for field, kind in path.items() if kind == 'eq')
+            ranges = sorted(field for field, kind in path.items() if kind == 'range')
+            if not equal and not ranges:
+                return []
+            lead = equal + ranges[:1]
+            fields = lead + sorted(field for field in path if field not in lead)
+            candidates.append(tuple((field, False) for field in fields[:AUTO_INDEX_MAX_COLUMNS]))
+        return candidates
+    
+    def _song_indexes(self) -> Dict[str, tuple]:
+        """Get the indexes on songs, by name, with their column names."""
+        indexes = {}
+        for index in self.conn.execute("PRAGMA index_list(songs)").fetchall():
+            columns = self.conn.execute(f"PRAGMA index_info({index['name']})").fetchall()
+            indexes[index['name']] = tuple(column['name'] for column in columns)
+        return indexes
+    
+    def advised_indexes(self) -> List[str]:
+        """
+        Get the names of the indexes update_indexes() made.
+        
+        Returns:
+            Sorted list of index names
+        """
+        return sorted(name for name in self._song_indexes() if name.startswith(AUTO_INDEX_PREFIX))
+    
+    def update_indexes(self) -> tuple:
+        """
+        Create the indexes the playlists' rules and sorts call for, and drop
+        the advised ones no longer called for.
+        
+        Candidates (see _index_candidates()) are ranked by how many
+        playlists want them, and the top AUTO_INDEX_MAX kept. Candidates
+        that lead another wanted index, or one create_database() made, are
+        left out as that index answers them. The indexes only hold available
+        songs (WHERE unavailable = 0), as every playlist query asks for.
+        
+        Returns:
+            Tuple of (created index names, dropped index names)
+        """
+        wanted = {}
+        for playlist in self.list_playlists():
+            try:
+                candidates = self._index_candidates(playlist)
+            except ValueError:
+                continue  # Defined before rules were checked; it can't run either
+            for key in set(candidates):
+                wanted[key] = wanted.get(key, 0) + 1
+        
+        existing = self._song_indexes()
+        covered = [columns for name, columns in existing.items() if not name.startswith(AUTO_INDEX_PREFIX)]
+        for key in list(wanted):
+            fields = tuple(field for field, _ in key)
+            if (any(other != key and other[:len(key)] == key for other in wanted)
+                    or any(columns[:len(fields)] == fields for columns in covered)):
+                del wanted[key]
+        
+        chosen = sorted(wanted, key=lambda key: (-wanted[key], key))[:AUTO_INDEX_MAX]
+        advised = {index_name(key): key for key in chosen}
+        dropped = [name for name in existing if name.startswith(AUTO_INDEX_PREFIX) and name not in advised]
+        created = [name for name in advised if name not in existing]
+        
+        if created or dropped:
+            with self.library.writer() as conn:
+                for name in dropped:
+                    conn.execute(f"DROP INDEX IF EXISTS {name}")
+                for name in created:
+                    columns = ", ".join(f"{field} DESC" if descending else field for field, descending in advised[name])
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON songs({columns}) WHERE unavailable = 0")
+            self.conn.execute("PRAGMA optimize")
+        return created, dropped
+    
+    def refresh_playlist(self, playlist: Dict):
+        """
+        Bring a playlist's materialized songs up to date with the library.
+        
+        Args:
+            playlist: Playlist definition from get_playlist()
+        """
+        playlist_id = playlist['id']
+        version = database.get_library_version(self.conn)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT version FROM smart_playlist_cache WHERE playlist_id = ?", (playlist_id,))
+        row = cursor.fetchone()
+        if row is not None and row[0] == version:
+            return
+        
+        is_random = self._random_sort(playlist['sort_by'])[0]
+        limited = bool(playlist['limit_count']) and not is_random
+        changed = None
+        if row is not None:
+            changed = database.changed_song_ids(self.conn, row[0], self._referenced_columns(playlist),
+                                                INCREMENTAL_MAX_CHANGES + 1)
+        
+        with self.library.writer() as conn:
+            cursor = conn.cursor()
+            if changed is None or (changed and limited) or len(changed) > INCREMENTAL_MAX_CHANGES:
+                # Only limited playlists need the order; random ones keep every match
+                # and are sampled when generated
+                query, params = self._build_query(
+                    playlist['rules'],
+                    playlist['sort_by'] if limited else None,
+                    playlist['sort_desc'],
+                    playlist['limit_count'] if limited else None,
+                    columns="?, id"
+                )
+                cursor.execute("DELETE FROM smart_playlist_songs WHERE playlist_id = ?", (playlist_id,))
+                cursor.execute(f"INSERT INTO smart_playlist_songs (playlist_id, song_id) {query}", [playlist_id] + params)
+            elif changed:
+                # Re-check only the changed songs against the rules
+                condition, params = self._build_conditions(playlist['rules'])
+                for start in range(0, len(changed), database.INGEST_BATCH_SIZE):
+                    chunk = changed[start:start + database.INGEST_BATCH_SIZE]
+                    placeholders = ', '.join('?' * len(chunk))
+                    cursor.execute(
+                        f"DELETE FROM smart_playlist_songs WHERE playlist_id = ? AND song_id IN ({placeholders})",
+                        [playlist_id] + chunk
+                    )
+                    cursor.execute(
+                        f"""INSERT INTO smart_playlist_songs (playlist_id, song_id)
+                            SELECT ?, id FROM songs WHERE id IN ({placeholders}) AND {condition}""",
+                        [playlist_id] + chunk + params
+                    )
+        
+            cursor.execute("INSERT OR REPLACE INTO smart_playlist_cache (playlist_id, version) VALUES (?, ?)",
+                           (playlist_id, version))
+    
+    def song_count(self, playlist_id: int) -> int:
+        """
+        Count the songs a playlist generates, without reading them.
         
         Args:
             playlist_id: ID of smart playlist
             
         Returns:
-            List of song dictionaries matching the rules
+            Number of songs
         """
         playlist = self.get_playlist(playlist_id)
         if not playlist:
             raise ValueError(f"Playlist {playlist_id} not found")
         
-        query, params = self._build_query(
-            playlist['rules'],
-            playlist['sort_by'],
-            playlist['sort_desc'],
-            playlist['limit_count']
-        )
+        self.refresh_playlist(playlist)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM smart_playlist_songs WHERE playlist_id = ?", (playlist_id,))
+        count = cursor.fetchone()[0]
+        if playlist['limit_count']:
+            count = min(count, playlist['limit_count'])
+        return count
+    
+    def _song_ids(self, playlist: Dict) -> Iterable[int]:
+        """
+        Get the ids of a refreshed playlist's songs, in playlist order.
         
+        The sorted ids are reused until the library changes. Random
+        playlists with a limit or a weight are sampled from the materialized
+        songs by database.sample_song_ids(), which never reads every member
+        for a uniform limit; only unlimited uniform shuffles load them all.
+        """
+        playlist_id = playlist['id']
         cursor = self.conn.cursor()
-        cursor.execute(query, params)
+        is_random, weight = self._random_sort(playlist['sort_by'])
+        if is_random:
+            limit_count = playlist['limit_count']
+            if not limit_count:
+                if not weight:
+                    cursor.execute("SELECT song_id FROM smart_playlist_songs WHERE playlist_id = ?",
+                                   (playlist_id,))
+                    member_ids = [row[0] for row in cursor]
+                    random.shuffle(member_ids)
+                    return member_ids
+                cursor.execute("SELECT COUNT(*) FROM smart_playlist_songs WHERE playlist_id = ?",
+                               (playlist_id,))
+                limit_count = cursor.fetchone()[0]
+            return database.sample_song_ids(self.conn, limit_count, MEMBERS_CONDITION, [playlist_id], weight)
         
-        songs = []
-        for row in cursor.fetchall():
-            songs.append(dict(row))
+        version = database.get_library_version(self.conn)
+        generated = self._generated.get(playlist_id)
+        if generated is not None and generated[0] == version:
+            return generated[1]
+        
+        order = order_clause(compile_sort(playlist['sort_by'], playlist['sort_desc']))
+        cursor.execute(f"SELECT id FROM songs WHERE {MEMBERS_CONDITION}{order}", (playlist_id,))
+        song_ids = array('q', (row[0] for row in cursor))
+        self._generated[playlist_id] = (version, song_ids)
+        return song_ids
+    
+    def generate_songs(self, playlist_id: int, columns: Optional[Iterable[str]] = None) -> List[database.SongRow]:
+        """
+        Generate song list from smart playlist rules.
+        
+        Songs come from the playlist's materialized songs (see
+        refresh_playlist()), and only the columns asked for are read.
+        
+        Args:
+            playlist_id: ID of smart playlist
+            columns: Songs columns to read (None for all of them)
+            
+        Returns:
+            List of songs (dict-like database.SongRow) matching the rules
+        """
+        playlist = self.get_playlist(playlist_id)
+        if not playlist:
+            raise ValueError(f"Playlist {playlist_id} not found")
         
-        return songs
+        self.refresh_playlist(playlist)
+        song_ids = self._song_ids(playlist)
+        # One snapshot for every batch of rows, even while a scan commits
+        with self.library.reader() as conn:
+            return list(database.iter_songs_by_id(conn, song_ids, columns))
     
     def export_to_m3u(self, playlist_id: int, output_path: str, 
                       use_absolute_paths: bool = False) -> bool:
@@ -321,7 +978,7 @@ class SmartPlaylistManager:
             print(f"Playlist {playlist_id} not found")
             return False
         
-        songs = self.generate_songs(playlist_id)
+        songs = self.generate_songs(playlist_id, M3U_COLUMNS)
         if not songs:
             print(f"No songs match playlist rules")
             return False
@@ -350,6 +1007,7 @@ def interactive_mode(db_path: str = 'walrio_library.db'):
     print("  show <id|name> - Show playlist details and songs")
     print("  export <id|name> <file> - Export playlist to M3U")
     print("  delete <id|name> - Delete smart playlist")
+    print("  indexes - Update and list the indexes advised for the playlists")
     print("  templates - Show example playlist templates")
     print("  quit - Exit")
     
@@ -370,7 +1028,7 @@ def interactive_mode(db_path: str = 'walrio_library.db'):
                 else:
                     print(f"\n{len(playlists)} Smart Playlists:")
                     for pl in playlists:
-                        song_count = len(manager.generate_songs(pl['id']))
+                        song_count = manager.song_count(pl['id'])
                         print(f"  [{pl['id']}] {pl['name']} - {song_count} songs")
             
             elif command.startswith('show '):
@@ -391,12 +1049,12 @@ def interactive_mode(db_path: str = 'walrio_library.db'):
                 print(f"Rules:")
                 for i, rule in enumerate(playlist['rules']):
                     logic = f" {rule.get('logic', '')}" if i < len(playlist['rules']) - 1 else ""
-                    print(f"  {rule['field']} {rule['operator']} {rule['value']}{logic}")
+                    print(f"  {format_rules([rule])}{logic}")
                 print(f"Sort: {playlist['sort_by']} {'DESC' if playlist['sort_desc'] else 'ASC'}")
                 if playlist['limit_count']:
                     print(f"Limit: {playlist['limit_count']} songs")
                 
-                songs = manager.generate_songs(playlist['id'])
+                songs = manager.generate_songs(playlist['id'], ('artist', 'title', 'album', 'playcount'))
                 print(f"\n{len(songs)} songs:")
                 for i, song in enumerate(songs[:20], 1):
                     artist = song.get('artist', 'Unknown')
@@ -463,7 +1121,7 @@ def interactive_mode(db_path: str = 'walrio_library.db'):
                 rules = []
                 print("\nAdd rules (blank line to finish):")
                 print("Available fields: genre, artist, album, albumartist, year, playcount, skipcount, rating, lastplayed, length")
-                print("Operators: =, !=, >, <, >=, <=, LIKE, NOT LIKE")
+                print("Operators: =, !=, >, <, >=, <=, LIKE, NOT LIKE, IN, NOT IN, BETWEEN (separate values with commas)")
                 
                 while True:
                     field = input("  Field: ").strip()
@@ -505,7 +1163,7 @@ def interactive_mode(db_path: str = 'walrio_library.db'):
                     print("No rules added")
                     continue
                 
-                sort_by = input("\nSort by (default: artist, album, disc, track): ").strip()
+                sort_by = input("\nSort by (default: artist, album, disc, track; 'random' or 'random:rating' to shuffle): ").strip()
                 if not sort_by:
                     sort_by = 'artist, album, disc, track'
                 
@@ -516,11 +1174,22 @@ def interactive_mode(db_path: str = 'walrio_library.db'):
                 
                 try:
                     playlist_id = manager.create_playlist(name, rules, sort_by, sort_desc, limit_count)
-                    song_count = len(manager.generate_songs(playlist_id))
+                    song_count = manager.song_count(playlist_id)
                     print(f"\nCreated playlist '{name}' (ID: {playlist_id}) with {song_count} songs")
                 except Exception as e:
                     print(f"Error creating playlist: {e}")
             
+            elif command == 'indexes':
+                created, dropped = manager.update_indexes()
+                for name in created:
+                    print(f"Created {name}")
+                for name in dropped:
+                    print(f"Dropped {name}")
+                advised = manager.advised_indexes()
+                print(f"{len(advised)} advised indexes:")
+                for name in advised:
+                    print(f"  {name}")
+            
             elif command == 'templates':
                 print("\n=== Smart Playlist Templates ===")
                 print("\n1. Most Played (top 50):")
@@ -578,8 +1247,24 @@ def main():
         help='Run in interactive mode'
     )
     
+    parser.add_argument(
+        '--update-indexes',
+        action='store_true',
+        help='Create and drop indexes to suit the smart playlists\' rules and sorts'
+    )
+    
     args = parser.parse_args()
     
+    if args.update_indexes:
+        try:
+            manager = SmartPlaylistManager(args.db_path)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            return 1
+        created, dropped = manager.update_indexes()
+        print(f"Created {len(created)} indexes, dropped {len(dropped)}")
+        return 0
+    
     if args.interactive:
         return interactive_mode(args.db_path)
     else:
@@ -6,17 +6,31 @@ import os
 import sys
 import argparse
 import sqlite3
-import random
 import time
 import threading
+from array import array
+from collections import OrderedDict
 from enum import Enum
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable
 
 # Add parent directory for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from core.player import AudioPlayer
-from core import database
+from core import database, library_db
+from core.playlist import Song
+from core.availability import AvailabilityIndex, PREFETCH_AHEAD, PLAYBACK_WAIT
+from core import session
+from core.stats import StatsJournal
+
+# Columns needed to show, play and count a queued song
+QUEUE_COLUMNS = "id, url, title, artist, album, albumartist, length, track, disc"
+
+# Number of Song records kept in memory around the queue position
+SONG_CACHE_SIZE = 256
+
+# Maximum number of ids per "WHERE id IN (...)" query
+FETCH_CHUNK_SIZE = 500
 
 class RepeatMode(Enum):
     """Repeat modes for audio playback."""
@@ -29,6 +43,10 @@ class DatabaseQueue:
     """
     Audio queue manager that loads songs directly from database.
     Assumes walrio_library.db exists and is properly configured.
+    
+    The queue itself is an array of song ids (8 bytes per entry); song
+    records are fetched from the database when they are shown or played
+    and kept in a small LRU cache.
     """
     
     def __init__(self, db_path: str = 'walrio_library.db', track_stats: bool = True):
@@ -46,10 +64,13 @@ class DatabaseQueue:
             raise FileNotFoundError(f"Database not found: {db_path}. Run database.py first to create it.")
         
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row  # Enable column access by name
+        # Each thread (command loop, playback) reads on its own connection
+        self.library = library_db.LibraryDatabase(db_path)
         
-        self.queue = []
+        self.queue = array('q')  # Song ids
+        self._song_cache = OrderedDict()
+        self._song_cache_lock = threading.Lock()  # Shared by the command loop and playback threads
+        self.availability = AvailabilityIndex()  # Background file existence checks
         self.current_index = 0
         self.playback_history = []
         self.forward_history = []
@@ -57,6 +78,7 @@ class DatabaseQueue:
         self.shuffle = False
         self.repeat_mode = RepeatMode.OFF
         self.track_stats = track_stats
+        self.stats = StatsJournal(db_path)  # Saves plays and skips without blocking playback
         
         # Filters
         self.filters = {
@@ -67,10 +89,27 @@ class DatabaseQueue:
             'year': None
         }
     
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        The calling thread's database connection.
+        
+        Returns:
+            sqlite3.Connection: Connection whose rows are sqlite3.Row.
+        """
+        return self.library.connection()
+    
+    def close(self):
+        """Save outstanding playback stats and close the database connections."""
+        if hasattr(self, 'stats'):
+            self.stats.close()
+        if hasattr(self, 'library'):
+            self.library.close()
+    
     def __del__(self):
-        """Close database connection."""
-        if hasattr(self, 'conn'):
-            self.conn.close()
+        """Close database connections."""
+        if hasattr(self, 'library'):
+            self.library.close()
     
     def set_filter(self, filter_type: str, value: str):
         """Set a filter for querying songs."""
@@ -82,73 +121,229 @@ class DatabaseQueue:
         for key in self.filters:
             self.filters[key] = None
     
-    def get_all_songs(self, limit: Optional[int] = None) -> List[Dict]:
+    def _filter_clause(self) -> Tuple[str, List]:
         """
-        Get all songs from database.
+        Build the WHERE clause for the current filters.
         
-        Args:
-            limit: Optional limit on number of songs
-            
         Returns:
-            List of song dictionaries
+            Tuple of (SQL condition, parameters).
         """
-        query = "SELECT * FROM songs WHERE 1=1"
+        conditions = ["1=1"]
         params = []
         
-        # Apply filters
-        if self.filters['artist']:
-            query += " AND artist LIKE ?"
-            params.append(f"%{self.filters['artist']}%")
-        if self.filters['album']:
-            query += " AND album LIKE ?"
-            params.append(f"%{self.filters['album']}%")
-        if self.filters['albumartist']:
-            query += " AND albumartist LIKE ?"
-            params.append(f"%{self.filters['albumartist']}%")
-        if self.filters['genre']:
-            query += " AND genre LIKE ?"
-            params.append(f"%{self.filters['genre']}%")
+        # Text filters go through the full-text index
+        for column in ('artist', 'album', 'albumartist', 'genre'):
+            if self.filters[column]:
+                condition, condition_params = database.search_condition(self.conn, self.filters[column], (column,))
+                conditions.append(condition)
+                params.extend(condition_params)
         if self.filters['year']:
-            query += " AND year = ?"
+            conditions.append("year = ?")
             params.append(self.filters['year'])
         
-        if limit:
-            query += f" LIMIT {limit}"
+        return " AND ".join(conditions), params
+    
+    def _query_ids(self, query: str, params: Iterable = ()) -> array:
+        """
+        Run a query selecting song ids into a compact array.
         
+        Args:
+            query: SQL query whose first column is songs.id
+            params: Query parameters
+            
+        Returns:
+            array of song ids in query order
+        """
         cursor = self.conn.cursor()
-        cursor.execute(query, params)
+        cursor.execute(query, list(params))
+        return array('q', (row[0] for row in cursor))
+    
+    def set_queue(self, song_ids: Iterable[int]):
+        """
+        Replace the queue and start from its first song.
         
-        songs = []
-        for row in cursor.fetchall():
-            songs.append(dict(row))
+        Args:
+            song_ids: Database ids of the songs to queue
+        """
+        self.queue = array('q', song_ids)
+        self.current_index = 0
+        self.playback_history.clear()
+        self.forward_history.clear()
+    
+    def _fetch_songs(self, song_ids: Iterable[int]) -> Dict[int, Song]:
+        """
+        Get songs from the song cache, loading the ones that aren't cached yet.
+        
+        The songs are returned directly, since another thread may evict
+        them from the cache right away.
         
+        Args:
+            song_ids: Database ids of the songs needed
+            
+        Returns:
+            Dict of song id to Song for the ids still in the database
+        """
+        songs = {}
+        missing = []
+        with self._song_cache_lock:
+            for song_id in dict.fromkeys(song_ids):
+                song = self._song_cache.get(song_id)
+                if song is None:
+                    missing.append(song_id)
+                else:
+                    self._song_cache.move_to_end(song_id)
+                    songs[song_id] = song
+        
+        fetched = {}
+        cursor = self.conn.cursor()
+        for start in range(0, len(missing), FETCH_CHUNK_SIZE):
+            chunk = missing[start:start + FETCH_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(f"SELECT {QUEUE_COLUMNS} FROM songs WHERE id IN ({placeholders})", chunk)
+            for row in cursor.fetchall():
+                fetched[row['id']] = Song.from_row(row)
+        
+        if fetched:
+            with self._song_cache_lock:
+                self._song_cache.update(fetched)
+                while len(self._song_cache) > SONG_CACHE_SIZE:
+                    self._song_cache.popitem(last=False)
+            songs.update(fetched)
         return songs
     
-    def search_songs(self, search_term: str) -> List[Dict]:
+    def get_song(self, index: int) -> Optional[Song]:
         """
-        Search for songs by title, artist, or album.
+        Get the song at a queue position.
         
         Args:
-            search_term: Text to search for
+            index: Position in the queue
             
         Returns:
-            List of matching songs
+            Song record, or None if the index is out of range or the song
+            is no longer in the database.
         """
-        query = """
-            SELECT * FROM songs 
-            WHERE title LIKE ? OR artist LIKE ? OR album LIKE ? OR albumartist LIKE ?
+        if not 0 <= index < len(self.queue):
+            return None
+        
+        song_id = self.queue[index]
+        return self._fetch_songs([song_id]).get(song_id)
+    
+    @property
+    def session_name(self) -> str:
         """
-        search_pattern = f"%{search_term}%"
-        params = [search_pattern] * 4
+        Name of this library's saved session.
         
-        cursor = self.conn.cursor()
-        cursor.execute(query, params)
+        Returns:
+            str: Session name derived from the database path.
+        """
+        return f"song_queue:{os.path.abspath(self.db_path)}"
+    
+    def _database_stamp(self) -> Optional[str]:
+        """Identify the database file, so a session isn't applied to a rebuilt library."""
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return f"{stat.st_dev}:{stat.st_ino}"
+    
+    def save_session(self, full: bool = True):
+        """
+        Save the queue so the next run can resume it.
         
-        songs = []
-        for row in cursor.fetchall():
-            songs.append(dict(row))
+        Args:
+            full: Save the song ids too; False only updates position, modes and history.
+        """
+        state = {
+            'current_index': self.current_index,
+            'shuffle': self.shuffle,
+            'repeat_mode': self.repeat_mode.name,
+            'history': self.playback_history,
+            'forward_history': self.forward_history,
+        }
+        store = session.get_store()
+        if full:
+            store.save(self.session_name, os.path.abspath(self.db_path), self._database_stamp(),
+                       song_ids=self.queue, **state)
+        else:
+            store.save_state(self.session_name, **state)
+    
+    def restore_session(self) -> bool:
+        """
+        Restore the queue saved by save_session().
         
-        return songs
+        Only song ids are restored; songs are read from the database when
+        shown or played, and ids deleted since are skipped at that point.
+        
+        Returns:
+            True if a session was restored, False if there is none for this database.
+        """
+        saved = session.get_store().load(self.session_name)
+        if not saved or not saved['song_ids'] or saved['stamp'] != self._database_stamp():
+            return False
+        
+        self.set_queue(saved['song_ids'])
+        count = len(self.queue)
+        if 0 <= saved['current_index'] < count:
+            self.current_index = saved['current_index']
+        self.shuffle = saved['shuffle']
+        self.repeat_mode = RepeatMode[saved['repeat_mode']] if saved['repeat_mode'] in RepeatMode.__members__ else RepeatMode.OFF
+        self.playback_history = [i for i in saved['history'] if 0 <= i < count]
+        self.forward_history = [i for i in saved['forward_history'] if 0 <= i < count]
+        return True
+    
+    def prefetch_availability(self, count: int = PREFETCH_AHEAD):
+        """
+        Start checking in the background whether upcoming songs' files exist.
+        
+        Args:
+            count: Number of songs to look ahead
+        """
+        if not self.queue or self.repeat_mode == RepeatMode.TRACK:
+            return
+        
+        stop = self.current_index + 1 + count
+        if self.repeat_mode == RepeatMode.QUEUE:
+            indices = [i % len(self.queue) for i in range(self.current_index + 1, stop)]
+        else:
+            indices = range(self.current_index + 1, min(stop, len(self.queue)))
+        
+        songs = self._fetch_songs(self.queue[i] for i in indices)
+        paths = []
+        for i in indices:
+            song = songs.get(self.queue[i])
+            if song is not None:
+                paths.append(song.filepath)
+        self.availability.prefetch(paths)
+    
+    def get_all_songs(self, limit: Optional[int] = None,
+                      columns: Optional[Iterable[str]] = None) -> List[database.SongRow]:
+        """
+        Get all songs from database.
+        
+        Args:
+            limit: Optional limit on number of songs
+            columns: Songs columns to read (None for all of them)
+            
+        Returns:
+            List of songs (dict-like database.SongRow)
+        """
+        where, params = self._filter_clause()
+        return list(database.iter_songs(self.conn, columns, where, params, limit=limit))
+    
+    def search_songs(self, search_term: str,
+                     columns: Optional[Iterable[str]] = None) -> List[database.SongRow]:
+        """
+        Search for songs by title, artist, or album.
+        
+        Args:
+            search_term: Text to search for
+            columns: Songs columns to read (None for all of them)
+            
+        Returns:
+            List of matching songs, best matches first
+        """
+        song_ids = database.search_song_ids(self.conn, search_term)
+        return list(database.iter_songs_by_id(self.conn, song_ids, columns))
     
     def get_artists(self) -> List[str]:
         """
@@ -157,9 +352,7 @@ class DatabaseQueue:
         Returns:
             List of unique artist names sorted alphabetically.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT DISTINCT artist FROM songs WHERE artist != '' ORDER BY artist")
-        return [row[0] for row in cursor.fetchall()]
+        return database.browse_names(self.conn, 'artist')
     
     def get_albums(self) -> List[str]:
         """
@@ -168,9 +361,7 @@ class DatabaseQueue:
         Returns:
             List of unique album names sorted alphabetically.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT DISTINCT album FROM songs WHERE album != '' ORDER BY album")
-        return [row[0] for row in cursor.fetchall()]
+        return database.browse_names(self.conn, 'album')
     
     def get_genres(self) -> List[str]:
         """
@@ -179,71 +370,65 @@ class DatabaseQueue:
         Returns:
             List of unique genre names sorted alphabetically.
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT DISTINCT genre FROM songs WHERE genre != '' ORDER BY genre")
-        return [row[0] for row in cursor.fetchall()]
+        return database.browse_names(self.conn, 'genre')
     
     def load_from_filters(self):
         """Load queue from current filters."""
-        songs = self.get_all_songs()
-        if songs:
-            self.queue = songs
-            self.current_index = 0
-            print(f"Loaded {len(songs)} songs from database")
+        where, params = self._filter_clause()
+        song_ids = self._query_ids(f"SELECT id FROM songs WHERE {where}", params)
+        if song_ids:
+            self.set_queue(song_ids)
+            print(f"Loaded {len(song_ids)} songs from database")
         else:
             print("No songs match current filters")
     
-    def load_random(self, count: int = 50):
+    def load_random(self, count: int = 50, weight: Optional[str] = None):
         """
-        Load random songs from database.
+        Load random songs matching the current filters.
         
         Args:
             count: Number of random songs to load
+            weight: Favour songs by 'rating' or 'playcount' (default: uniform)
         """
-        songs = self.get_all_songs()
-        if songs:
-            selected = random.sample(songs, min(count, len(songs)))
-            self.queue = selected
-            self.current_index = 0
-            print(f"Loaded {len(selected)} random songs")
+        where, params = self._filter_clause()
+        selected = database.sample_song_ids(self.conn, count, where, params, weight)
+        if selected:
+            self.set_queue(selected)
+            print(f"Loaded {len(selected)} random songs" + (f" weighted by {weight}" if weight else ""))
         else:
             print("No songs in database")
     
     def load_album(self, album_name: str):
         """Load all songs from a specific album."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM songs WHERE album LIKE ? ORDER BY disc, track", (f"%{album_name}%",))
+        song_ids = database.search_song_ids(self.conn, album_name, ('album',), order_by="disc, track")
         
-        songs = []
-        for row in cursor.fetchall():
-            songs.append(dict(row))
-        
-        if songs:
-            self.queue = songs
-            self.current_index = 0
-            print(f"Loaded album '{album_name}' ({len(songs)} songs)")
+        if song_ids:
+            self.set_queue(song_ids)
+            print(f"Loaded album '{album_name}' ({len(song_ids)} songs)")
         else:
             print(f"No album found matching '{album_name}'")
     
     def load_artist(self, artist_name: str):
         """Load all songs from a specific artist."""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT * FROM songs WHERE artist LIKE ? OR albumartist LIKE ? ORDER BY album, disc, track",
-            (f"%{artist_name}%", f"%{artist_name}%")
-        )
-        
-        songs = []
-        for row in cursor.fetchall():
-            songs.append(dict(row))
-        
-        if songs:
-            self.queue = songs
-            self.current_index = 0
-            print(f"Loaded artist '{artist_name}' ({len(songs)} songs)")
+        song_ids = database.search_song_ids(self.conn, artist_name, ('artist', 'albumartist'),
+                                            order_by="album, disc, track")
+        
+        if song_ids:
+            self.set_queue(song_ids)
+            print(f"Loaded artist '{artist_name}' ({len(song_ids)} songs)")
         else:
             print(f"No artist found matching '{artist_name}'")
     
+    def load_search(self, search_term: str):
+        """Load all songs matching a search term."""
+        song_ids = database.search_song_ids(self.conn, search_term)
+        
+        if song_ids:
+            self.set_queue(song_ids)
+            print(f"Found {len(song_ids)} songs")
+        else:
+            print("No songs found")
+    
     def show_queue(self, context: int = 10):
         """Show current queue with context around current position."""
         if not self.queue:
@@ -254,8 +439,11 @@ class DatabaseQueue:
         start = max(0, self.current_index - context // 2)
         end = min(len(self.queue), start + context)
         
+        songs = self._fetch_songs(self.queue[start:end])
         for i in range(start, end):
-            song = self.queue[i]
+            song = songs.get(self.queue[i])
+            if song is None:
+                continue
             marker = ">" if i == self.current_index else " "
             mins, secs = divmod(int(song.get('length', 0)), 60)
             title = song.get('title', 'Unknown')
@@ -275,6 +463,9 @@ class DatabaseQueue:
             print("Queue is empty. Load songs first.")
             return
         
+        # Saved as one blob of ids, so this is cheap even for huge queues
+        self.save_session()
+        
         # Create audio player
         player = AudioPlayer(debug=False)
         
@@ -295,17 +486,24 @@ class DatabaseQueue:
                     if self.current_index >= len(self.queue):
                         break
                     
-                    song = self.queue[self.current_index]
+                    song = self.get_song(self.current_index)
+                    if song is None:
+                        print(f"\nSong {self.queue[self.current_index]} is no longer in the database")
+                        self.current_index += 1
+                        continue
                     song_id = song.get('id')
                     
-                    # Get file path
-                    file_path = song.get('url', '')
-                    if file_path.startswith('file://'):
-                        file_path = file_path[7:]
+                    file_path = song.filepath
                     
-                    # Check if file exists
-                    if not os.path.exists(file_path):
-                        print(f"\nFile not found: {file_path}")
+                    # Check if file exists without stalling on a dead drive
+                    # (usually already answered by the background checks)
+                    self.prefetch_availability()
+                    available = self.availability.is_available(file_path, timeout=PLAYBACK_WAIT)
+                    if not available:
+                        if available is None:
+                            print(f"\nFile not reachable (check timed out): {file_path}")
+                        else:
+                            print(f"\nFile not found: {file_path}")
                         self.current_index += 1
                         continue
                     
@@ -316,6 +514,7 @@ class DatabaseQueue:
                     album = song.get('album', 'Unknown')
                     print(f"\n[{self.current_index + 1}/{len(self.queue)}] Now playing: {artist} - {title} ({album}) [{mins}:{secs:02d}]")
                     print(f"File: {file_path}")
+                    self.save_session(full=False)
                     
                     # Load and play the song
                     if not player.load_file(file_path):
@@ -349,7 +548,7 @@ class DatabaseQueue:
                                     song_length = song.get('length', 0)
                                     # Count as skip if less than 80% played
                                     if song_length > 0 and elapsed < song_length * 0.8:
-                                        database.update_skipcount(self.conn, song_id)
+                                        self.stats.record_skip(song_id)
                                 
                                 self.current_index += 1
                                 break
@@ -364,7 +563,7 @@ class DatabaseQueue:
                                     elapsed = time.time() - song_start_time
                                     song_length = song.get('length', 0)
                                     if song_length > 0 and elapsed < song_length * 0.8:
-                                        database.update_skipcount(self.conn, song_id)
+                                        self.stats.record_skip(song_id)
                                 
                                 # Go to previous song
                                 if self.playback_history:
@@ -374,7 +573,12 @@ class DatabaseQueue:
                                     print("Already at beginning of playback history.")
                                     manual_skip = False
                                 break
-                        time.sleep(0.1)
+                        
+                        # Sleep until the player state changes or a command wakes us up
+                        player.wait_until(lambda: (
+                            not player.is_playing or not playback_active['running'] or
+                            playback_active['skip_requested'] or playback_active['previous_requested']
+                        ))
                     
                     if not playback_active['running']:
                         player.stop()
@@ -382,7 +586,7 @@ class DatabaseQueue:
                     
                     # Song finished naturally - update playcount
                     if self.track_stats and not manual_skip and song_id:
-                        database.update_playcount(self.conn, song_id)
+                        self.stats.record_play(song_id)
                     
                     # Move to next track after natural completion
                     if not manual_skip:
@@ -425,17 +629,20 @@ class DatabaseQueue:
                 if command in ['quit', 'q', 'stop']:
                     playback_active['running'] = False
                     player.should_quit = True
+                    player.wake()
                     print("Stopping playback...")
                     break
                 
                 elif command in ['next', 'n', 'skip']:
                     with playback_lock:
                         playback_active['skip_requested'] = True
+                    player.wake()
                     print("Skipping to next track...")
                 
                 elif command in ['previous', 'p', 'prev']:
                     with playback_lock:
                         playback_active['previous_requested'] = True
+                    player.wake()
                 
                 elif command == 'pause':
                     player.pause()
@@ -446,8 +653,8 @@ class DatabaseQueue:
                     print("Resumed")
                 
                 elif command in ['current', 'c']:
-                    if self.current_index < len(self.queue):
-                        song = self.queue[self.current_index]
+                    song = self.get_song(self.current_index)
+                    if song is not None:
                         position = player.get_position()
                         duration = player.get_duration()
                         
@@ -498,12 +705,15 @@ class DatabaseQueue:
             except KeyboardInterrupt:
                 playback_active['running'] = False
                 player.should_quit = True
+                player.wake()
                 print("\nStopping playback...")
                 break
             except Exception as e:
                 print(f"Error: {e}")
         
         thread.join(timeout=2)
+        self.availability.shutdown()
+        self.save_session(full=False)
         print("Playback finished.")
 
 
@@ -527,23 +737,23 @@ def interactive_mode(db_path: str = 'walrio_library.db', track_stats: bool = Tru
     print(f"Database: {db_path}")
     
     # Show database stats
-    cursor = queue_mgr.conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM songs")
-    total_songs = cursor.fetchone()[0]
-    cursor.execute("SELECT COUNT(DISTINCT artist) FROM songs WHERE artist != ''")
-    total_artists = cursor.fetchone()[0]
-    cursor.execute("SELECT COUNT(DISTINCT album) FROM songs WHERE album != ''")
-    total_albums = cursor.fetchone()[0]
-    
-    print(f"Library: {total_songs} songs, {total_artists} artists, {total_albums} albums")
+    summary = database.library_summary(queue_mgr.conn)
+    print(f"Library: {summary['songs']} songs, {summary['artists']} artists, {summary['albums']} albums")
     print(f"Stats tracking: {'ON' if queue_mgr.track_stats else 'OFF'}")
+    
+    saved = session.get_store().load(queue_mgr.session_name)
+    if saved and saved['song_ids']:
+        print(f"Saved session: {len(saved['song_ids'])} songs at position {saved['current_index'] + 1} "
+              f"(type 'resume' to restore it)")
+    
     print("\nCommands:")
     print("  all - Load all songs")
-    print("  random [N] - Load N random songs (default 50)")
-    print("  artist <name> - Load all songs by artist")
-    print("  album <name> - Load all songs from album")
+    print("  random [N] [rating|playcount] - Load N random songs (default 50), optionally weighted")
+    print("  artist <name> - Load all songs by artist (words match word starts, e.g. 'beat')")
+    print("  album <name> - Load all songs from album (words match word starts)")
     print("  search <term> - Search and load results")
-    print("  filter - Set filters (artist/album/genre)")
+    print("  filter - Set filters (artist/album/genre; words match word starts)")
+    print("  resume - Restore the queue saved by the last session")
     print("  show - Show current queue")
     print("  play - Play current queue")
     print("  shuffle - Toggle shuffle mode")
@@ -567,7 +777,8 @@ def interactive_mode(db_path: str = 'walrio_library.db', track_stats: bool = Tru
             elif command.startswith('random'):
                 parts = command.split()
                 count = int(parts[1]) if len(parts) > 1 else 50
-                queue_mgr.load_random(count)
+                weight = parts[2] if len(parts) > 2 else None
+                queue_mgr.load_random(count, weight)
             
             elif command.startswith('artist '):
                 artist_name = command[7:].strip()
@@ -579,20 +790,20 @@ def interactive_mode(db_path: str = 'walrio_library.db', track_stats: bool = Tru
             
             elif command.startswith('search '):
                 search_term = command[7:].strip()
-                songs = queue_mgr.search_songs(search_term)
-                if songs:
-                    queue_mgr.queue = songs
-                    queue_mgr.current_index = 0
-                    print(f"Found {len(songs)} songs")
+                queue_mgr.load_search(search_term)
+            
+            elif command == 'resume':
+                if queue_mgr.restore_session():
+                    print(f"Restored {len(queue_mgr.queue)} songs at position {queue_mgr.current_index + 1}")
                 else:
-                    print("No songs found")
+                    print("No saved session for this database")
             
             elif command == 'show':
                 queue_mgr.show_queue()
             
             elif command == 'filter':
                 print("\nAvailable filters:")
-                print("  artist, album, genre")
+                print("  artist, album, genre (every word matches the start of a word)")
                 print("Enter filter (or 'clear' to reset):")
                 filter_cmd = input("filter> ").strip().lower()
                 
@@ -638,6 +849,7 @@ def interactive_mode(db_path: str = 'walrio_library.db', track_stats: bool = Tru
         except Exception as e:
             print(f"Error: {e}")
     
+    queue_mgr.close()
     print("Goodbye!")
     return 0
 